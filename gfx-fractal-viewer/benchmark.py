@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Headless throughput benchmark for the Fractal Viewer render engine.
+
+Reports megapixels/second for each mode and iteration count, both on a
+single core and across the process pool.
+
+    python3 benchmark.py --size 600x480 --iters 100 250 500
+"""
+import argparse
+import os
+import time
+
+from render_engine import TileRenderer, View, compute_tile, split_tiles
+
+VIEWS = {
+    "mandelbrot": View("mandelbrot", -2.5, 1.0, -1.4, 1.4, 0, (-0.7, 0.27)),
+    "julia": View("julia", -2.5, 1.0, -1.4, 1.4, 0, (-0.7, 0.27)),
+}
+
+
+def run_serial(view, width, height):
+    for tile in split_tiles(width, height):
+        compute_tile(view, width, height, tile)
+
+
+def run_pool(renderer, view, width, height):
+    for _ in renderer.render(view, width, height):
+        pass
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="600x480")
+    parser.add_argument("--iters", type=int, nargs="+", default=[100, 250, 500])
+    parser.add_argument("--modes", nargs="+", default=list(VIEWS), choices=list(VIEWS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    mpix = width * height / 1e6
+
+    renderer = TileRenderer(args.workers)
+    # warm the pool so worker start-up is not billed to the first row
+    run_pool(renderer, VIEWS["mandelbrot"]._replace(max_iter=1), 64, 64)
+    print(f"{'mode':<12}{'iter':>6}{'1 core MP/s':>14}{f'{renderer.workers} cores MP/s':>16}")
+    try:
+        for mode in args.modes:
+            for iters in args.iters:
+                view = VIEWS[mode]._replace(max_iter=iters)
+                serial = timed(run_serial, view, width, height)
+                pooled = timed(run_pool, renderer, view, width, height)
+                print(f"{mode:<12}{iters:>6}{mpix / serial:>14.2f}{mpix / pooled:>16.2f}")
+    finally:
+        renderer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
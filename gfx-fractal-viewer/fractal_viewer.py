@@ -1,42 +1,15 @@
 #!/usr/bin/env python3
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, Gdk, GLib
+from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
+import cairo
 import threading
+import time
+from render_engine import (PASSES, SCHEMES, EscapeFrame, TileRenderer, View,
+                           same_geometry, seed_tiles)
 
 W, H = 600, 480
-
-def mandelbrot(cx, cy, max_iter):
-    zx, zy = 0.0, 0.0
-    for i in range(max_iter):
-        if zx*zx + zy*zy > 4.0:
-            return i
-        zx, zy = zx*zx - zy*zy + cx, 2*zx*zy + cy
-    return max_iter
-
-def julia(zx, zy, cx, cy, max_iter):
-    for i in range(max_iter):
-        if zx*zx + zy*zy > 4.0:
-            return i
-        zx, zy = zx*zx - zy*zy + cx, 2*zx*zy + cy
-    return max_iter
-
-SCHEMES = ["Fire", "Cool", "Pastel", "Rainbow"]
-
-def colorize(val, max_iter, scheme):
-    if val == max_iter: return (0, 0, 0)
-    t = val / max_iter
-    if scheme == "Fire":
-        return (int(255*min(1,3*t)), int(255*max(0,min(1,3*t-1))), int(255*max(0,3*t-2)))
-    elif scheme == "Cool":
-        return (int(255*t), int(255*(1-t)), int(255*0.8))
-    elif scheme == "Pastel":
-        import math
-        return (int(200+55*math.sin(t*6)), int(200+55*math.sin(t*6+2)), int(200+55*math.sin(t*6+4)))
-    else:
-        import colorsys
-        r,g,b = colorsys.hsv_to_rgb(t, 0.8, 1.0)
-        return (int(r*255), int(g*255), int(b*255))
+FLUSH_INTERVAL = 0.05
 
 class FractalViewerWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -49,9 +22,12 @@ class FractalViewerWindow(Gtk.ApplicationWindow):
         self.mode = "mandelbrot"
         self.julia_c = (-0.7, 0.27)
         self.scheme = "Fire"
-        self.pixel_data = None
-        self.rendering = False
+        self.frames = []
+        self.layers = []
+        self.generation = 0
+        self.renderer = TileRenderer()
         self.build_ui()
+        self.connect("close-request", self.on_close_request)
         GLib.idle_add(self.render)
 
     def build_ui(self):
@@ -100,17 +76,34 @@ class FractalViewerWindow(Gtk.ApplicationWindow):
         self.canvas.add_controller(click)
         vbox.append(self.canvas)
 
+    def on_close_request(self, win):
+        self.renderer.shutdown()
+        return False
+
     def on_mode_changed(self, combo):
         self.mode = "julia" if combo.get_active() == 1 else "mandelbrot"
         self.on_reset(None)
 
     def on_iter_changed(self, scale):
         self.max_iter = int(scale.get_value())
-        GLib.idle_add(self.render)
+        top = self.frames[-1] if self.frames else None
+        if top and top.complete and same_geometry(top.view, self.current_view()) \
+                and self.max_iter <= top.depth:
+            self.generation += 1
+            self.recolor()
+        else:
+            GLib.idle_add(self.render)
 
     def on_scheme_changed(self, combo):
         self.scheme = combo.get_active_text()
-        GLib.idle_add(self.render)
+        self.recolor()
+
+    def recolor(self):
+        for frame in self.frames:
+            frame.set_colors(self.max_iter, self.scheme)
+        self.layers = self.snapshot(self.frames)
+        self.update_info()
+        self.canvas.queue_draw()
 
     def on_reset(self, btn):
         self.x_min, self.x_max = -2.5, 1.0
@@ -119,69 +112,112 @@ class FractalViewerWindow(Gtk.ApplicationWindow):
 
     def on_click(self, gesture, n, px, py):
         button = gesture.get_current_button()
-        cx = self.x_min + (px / W) * (self.x_max - self.x_min)
-        cy = self.y_min + (py / H) * (self.y_max - self.y_min)
+        px, py = int(px), int(py)
+        sx = (self.x_max - self.x_min) / W
+        sy = (self.y_max - self.y_min) / H
+        cx = self.x_min + px * sx
+        cy = self.y_min + py * sy
         if button == 3 and self.mode == "mandelbrot":
             self.julia_c = (cx, cy)
             self.mode_combo.set_active(1)
             return
-        dx = (self.x_max - self.x_min) / 4
-        dy = (self.y_max - self.y_min) / 4
-        self.x_min, self.x_max = cx - dx, cx + dx
-        self.y_min, self.y_max = cy - dy, cy + dy
+        # zoom 2x about the clicked pixel; the new grid keeps every other
+        # sample of the old one, so those pixels are reused, not recomputed
+        self.x_min = self.x_min + (px - W // 4) * sx
+        self.x_max = self.x_min + W // 2 * sx
+        self.y_min = self.y_min + (py - H // 4) * sy
+        self.y_max = self.y_min + H // 2 * sy
         GLib.idle_add(self.render)
 
     def render(self):
-        if self.rendering:
-            return False
-        self.rendering = True
+        # a new generation makes every in-flight pass drop its remaining tiles
+        self.generation += 1
         self.info_label.set_text("Rendering...")
-        threading.Thread(target=self._render_thread, daemon=True).start()
+        threading.Thread(target=self._render_thread,
+                         args=(self.generation, self.current_view(), list(self.frames)),
+                         daemon=True).start()
         return False
 
-    def _render_thread(self):
-        scale = 2
-        sw, sh = W // scale, H // scale
-        data = bytearray(sw * sh * 3)
-        xr = (self.x_max - self.x_min) / sw
-        yr = (self.y_max - self.y_min) / sh
-        mi = self.max_iter
-        scheme = self.scheme
-        jc = self.julia_c
-        mode = self.mode
-        for py in range(sh):
-            for px in range(sw):
-                cx = self.x_min + px * xr
-                cy = self.y_min + py * yr
-                if mode == "mandelbrot":
-                    val = mandelbrot(cx, cy, mi)
-                else:
-                    val = julia(cx, cy, jc[0], jc[1], mi)
-                r, g, b = colorize(val, mi, scheme)
-                idx = (py * sw + px) * 3
-                data[idx] = r; data[idx+1] = g; data[idx+2] = b
-        self.pixel_data = (bytes(data), sw, sh, scale)
-        GLib.idle_add(self._render_done)
-
-    def _render_done(self):
-        self.rendering = False
-        self.info_label.set_text(f"Mode: {self.mode.capitalize()} | Iter: {self.max_iter} | Click to zoom")
-        self.canvas.queue_draw()
+    def current_view(self):
+        return View(self.mode, self.x_min, self.x_max, self.y_min, self.y_max,
+                    self.max_iter, self.julia_c)
+
+    def _render_thread(self, gen, view, shown):
+        cancelled = lambda: gen != self.generation
+        top = shown[-1] if shown else None
+        if top and top.step == 1 and top.complete and same_geometry(top.view, view):
+            # only the points that were still bounded get iterated further
+            frame = top.copy()
+            frame.view = view
+            jobs = self.renderer.resume(view, W, H, list(top.tiles.values()), cancelled)
+            if self._run_pass(gen, shown[:-1] + [frame], frame, jobs):
+                GLib.idle_add(self._render_done, gen)
+            return
+        sources = sorted(shown, key=lambda f: f.step)
+        prev = []
+        for step in PASSES:
+            frame = EscapeFrame(view, W // step, H // step, step)
+            seeds = seed_tiles(view, frame.width, frame.height, sources)
+            jobs = self.renderer.render(view, frame.width, frame.height, seeds, cancelled)
+            if not self._run_pass(gen, prev + [frame], frame, jobs):
+                return
+            prev = [frame]
+            sources.insert(0, frame)
+        GLib.idle_add(self._render_done, gen)
+
+    def _run_pass(self, gen, frames, frame, jobs):
+        """Fill one frame from jobs, streaming it over the previous pass; False if cancelled."""
+        last_flush = time.monotonic()
+        for result in jobs:
+            frame.set_colors(self.max_iter, self.scheme)
+            frame.add(result)
+            now = time.monotonic()
+            if len(frames) > 1 and now - last_flush >= FLUSH_INTERVAL:
+                last_flush = now
+                GLib.idle_add(self._show_frames, gen, frames, self.snapshot(frames))
+        if gen != self.generation:
+            return False
+        GLib.idle_add(self._show_frames, gen, frames, self.snapshot(frames))
+        return True
+
+    def snapshot(self, frames):
+        for f in frames:
+            f.set_colors(self.max_iter, self.scheme)
+        return [(bytes(f.rgb), f.width, f.height, None if f.complete else list(f.tiles))
+                for f in frames]
+
+    def _show_frames(self, gen, frames, layers):
+        if gen == self.generation:
+            self.frames = frames
+            self.layers = layers
+            self.canvas.queue_draw()
+        return False
+
+    def _render_done(self, gen):
+        if gen == self.generation:
+            self.update_info()
         return False
 
+    def update_info(self):
+        self.info_label.set_text(f"Mode: {self.mode.capitalize()} | Iter: {self.max_iter} | Click to zoom")
+
     def on_draw(self, area, cr, w, h):
         cr.set_source_rgb(0, 0, 0)
         cr.rectangle(0, 0, w, h)
         cr.fill()
-        if not self.pixel_data:
-            return
-        data, sw, sh, scale = self.pixel_data
-        from gi.repository import GdkPixbuf
-        pb = GdkPixbuf.Pixbuf.new_from_data(data, GdkPixbuf.Colorspace.RGB, False, 8, sw, sh, sw*3)
-        scaled = pb.scale_simple(W, H, GdkPixbuf.InterpType.NEAREST)
-        from gi.repository import Gdk
-        Gdk.cairo_set_source_pixbuf(cr, scaled, 0, 0)
-        cr.paint()
+        for data, fw, fh, tiles in self.layers:
+            pb = GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(data),
+                                                 GdkPixbuf.Colorspace.RGB, False, 8, fw, fh, fw*3)
+            cr.save()
+            cr.scale(W / fw, H / fh)
+            if tiles is not None:
+                for x, y, tw, th in tiles:
+                    cr.rectangle(x, y, tw, th)
+                cr.clip()
+            Gdk.cairo_set_source_pixbuf(cr, pb, 0, 0)
+            cr.get_source().set_filter(cairo.FILTER_NEAREST)
+            cr.paint()
+            cr.restore()
 
 class FractalViewerApp(Gtk.Application):
     def __init__(self):
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Tiled escape-time render engine for the Fractal Viewer.
+
+Escape counts are computed a whole tile at a time. With NumPy available the
+tile is iterated as one complex array and escaped points are dropped from the
+working set each step; without it a tight per-row scalar loop is used. Tiles
+are spread over a process pool sized to the CPU count and handed back as they
+finish so the canvas can fill in progressively.
+
+Colour is applied afterwards through a palette lookup table, and each tile
+keeps the z values of the points that had not escaped yet, so changing the
+scheme or raising the iteration limit never repeats finished work.
+
+A view is drawn in passes of decreasing stride (PASSES). Every pass is seeded
+with whatever pixels of earlier passes, or of the previous view, land exactly
+on its grid, so refining a pass or zooming in 2x only computes the new points.
+"""
+import colorsys
+import math
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TILE = 64
+PASSES = (8, 4, 2, 1)
+
+SCHEMES = ["Fire", "Cool", "Pastel", "Rainbow"]
+
+View = namedtuple("View", "mode x_min x_max y_min y_max max_iter julia_c")
+
+# counts: escape count per tile pixel (row-major), capped at `depth`
+# pending: tile-local indices still bounded after `depth` iterations
+# zr, zi: their z values at that point, for resuming
+TileResult = namedtuple("TileResult", "tile depth counts pending zr zi")
+
+
+def colorize(val, max_iter, scheme):
+    if val == max_iter: return (0, 0, 0)
+    t = val / max_iter
+    if scheme == "Fire":
+        return (int(255*min(1,3*t)), int(255*max(0,min(1,3*t-1))), int(255*max(0,3*t-2)))
+    elif scheme == "Cool":
+        return (int(255*t), int(255*(1-t)), int(255*0.8))
+    elif scheme == "Pastel":
+        return (int(200+55*math.sin(t*6)), int(200+55*math.sin(t*6+2)), int(200+55*math.sin(t*6+4)))
+    else:
+        r,g,b = colorsys.hsv_to_rgb(t, 0.8, 1.0)
+        return (int(r*255), int(g*255), int(b*255))
+
+
+@lru_cache(maxsize=32)
+def palette(max_iter, scheme, length):
+    """Lookup table from escape count to RGB for counts 0..length-1.
+
+    Counts at or past max_iter map to the interior colour, so a buffer
+    computed to a deeper limit can be shown at a shallower one; so does the
+    last entry, which marks points still pending in a shallower buffer.
+    """
+    limit = min(max_iter, length - 1)
+    entries = [bytes(colorize(v, max_iter, scheme)) if v < limit else b"\0\0\0"
+               for v in range(length)]
+    if np is not None:
+        return np.frombuffer(b"".join(entries), dtype=np.uint8).reshape(length, 3)
+    return entries
+
+
+def apply_palette(counts, lut):
+    """Packed RGB bytes for a run of escape counts."""
+    if np is not None:
+        return lut[counts].tobytes()
+    return b"".join(map(lut.__getitem__, counts))
+
+
+def split_tiles(width, height, size=TILE):
+    """Cover the image with tiles, ordered centre-out so the middle shows first."""
+    tiles = [(x, y, min(size, width - x), min(size, height - y))
+             for y in range(0, height, size) for x in range(0, width, size)]
+    cx, cy = width / 2, height / 2
+    tiles.sort(key=lambda t: (t[0] + t[2] / 2 - cx) ** 2 + (t[1] + t[3] / 2 - cy) ** 2)
+    return tiles
+
+
+def same_geometry(a, b):
+    """True when two views cover the same points and differ at most in max_iter."""
+    return a is not None and b is not None and a._replace(max_iter=0) == b._replace(max_iter=0)
+
+
+def _step(view, width, height):
+    return (view.x_max - view.x_min) / width, (view.y_max - view.y_min) / height
+
+
+def _iterate_numpy(z, c, idx, counts, start, stop):
+    for i in range(start, stop):
+        escaped = z.real * z.real + z.imag * z.imag > 4.0
+        if escaped.any():
+            counts[idx[escaped]] = i
+            keep = ~escaped
+            z, c, idx = z[keep], c[keep], idx[keep]
+            if not idx.size:
+                break
+        z = z * z + c
+    return z, idx
+
+
+def _iterate_point(zx, zy, ax, ay, start, stop):
+    for i in range(start, stop):
+        zx2, zy2 = zx * zx, zy * zy
+        if zx2 + zy2 > 4.0:
+            return i, zx, zy
+        zx, zy = zx2 - zy2 + ax, 2 * zx * zy + ay
+    return stop, zx, zy
+
+
+def _tile_points(view, width, height, tile, idx=None):
+    """Complex c (Mandelbrot) or starting z (Julia) for tile pixels, as (x, y).
+
+    idx selects tile-local pixels; a NumPy index array gives NumPy coordinates.
+    """
+    x0, y0, tw, th = tile
+    dx, dy = _step(view, width, height)
+    if idx is None:
+        idx = range(tw * th)
+    elif np is not None and isinstance(idx, np.ndarray):
+        return view.x_min + (x0 + idx % tw) * dx, view.y_min + (y0 + idx // tw) * dy
+    xs = [view.x_min + (x0 + i % tw) * dx for i in idx]
+    ys = [view.y_min + (y0 + i // tw) * dy for i in idx]
+    return xs, ys
+
+
+def compute_tile(view, width, height, tile, seed=None):
+    """Escape counts for one tile, iterated from scratch to view.max_iter.
+
+    seed is (idx, counts, zr, zi) for pixels already known at this depth;
+    those are copied rather than iterated.
+    """
+    x0, y0, tw, th = tile
+    n = tw * th
+    stop = view.max_iter
+    sidx, scounts, szr, szi = seed or ((), (), (), ())
+    if np is not None:
+        counts = np.full(n, stop, dtype=np.int32)
+        todo = np.arange(n)
+        if len(sidx):
+            sidx = np.asarray(sidx)
+            counts[sidx] = scounts
+            todo = np.setdiff1d(todo, sidx, assume_unique=True)
+        xs, ys = _tile_points(view, width, height, tile, todo)
+        grid = xs + 1j * ys
+        if view.mode == "mandelbrot":
+            z, c = np.zeros_like(grid), grid
+        else:
+            z, c = grid, np.full_like(grid, complex(*view.julia_c))
+        z, idx = _iterate_numpy(z, c, todo, counts, 0, stop)
+        kept = np.asarray(scounts, dtype=np.int32) == stop
+        return TileResult(tile, stop, counts,
+                          np.concatenate([idx, sidx[kept]]) if len(sidx) else idx,
+                          np.concatenate([z.real, np.asarray(szr)[kept]]),
+                          np.concatenate([z.imag, np.asarray(szi)[kept]]))
+
+    counts = [stop] * n
+    pending, zr, zi = [], [], []
+    known = set(sidx)
+    for i, c, x, y in zip(sidx, scounts, szr, szi):
+        counts[i] = c
+        if c == stop:
+            pending.append(i); zr.append(x); zi.append(y)
+    todo = [i for i in range(n) if i not in known] if known else range(n)
+    julia = view.mode != "mandelbrot"
+    jx, jy = view.julia_c
+    for i, px, py in zip(todo, *_tile_points(view, width, height, tile, todo)):
+        if julia:
+            c, zx, zy = _iterate_point(px, py, jx, jy, 0, stop)
+        else:
+            c, zx, zy = _iterate_point(0.0, 0.0, px, py, 0, stop)
+        counts[i] = c
+        if c == stop:
+            pending.append(i); zr.append(zx); zi.append(zy)
+    return TileResult(tile, stop, counts, pending, zr, zi)
+
+
+def _axis_map(src_min, src_step, src_n, dst_min, dst_step, dst_n):
+    """Source index for each destination index that lands on a source sample, else -1."""
+    out = []
+    for i in range(dst_n):
+        s = (dst_min + i * dst_step - src_min) / src_step
+        j = round(s)
+        out.append(j if 0 <= j < src_n and abs(s - j) < 1e-6 else -1)
+    return out
+
+
+def seed_tiles(view, width, height, sources, tile_size=TILE):
+    """Collect reusable pixels from earlier frames, keyed by destination tile.
+
+    sources are EscapeFrames, finest first; a pixel is taken from the first
+    one that has it. Only counts that are final at view.max_iter are reused.
+    """
+    stop = view.max_iter
+    dx, dy = _step(view, width, height)
+    known = bytearray(width * height)
+    seeds = {}
+    for src in sources:
+        sv = src.view
+        if (sv.mode, sv.julia_c) != (view.mode, view.julia_c) or not src.tiles:
+            continue
+        sdx, sdy = _step(sv, src.width, src.height)
+        xmap = _axis_map(sv.x_min, sdx, src.width, view.x_min, dx, width)
+        ymap = _axis_map(sv.y_min, sdy, src.height, view.y_min, dy, height)
+        # per destination column: (x, dest tile x0, source tile x0, source local x)
+        cols = [(x, x - x % tile_size, sx - sx % tile_size, sx % tile_size)
+                for x, sx in enumerate(xmap) if sx >= 0]
+        if not cols:
+            continue
+        by_origin = {r.tile[:2]: r for r in src.tiles.values()}
+        counts_of = {}
+        for y, sy in enumerate(ymap):
+            if sy < 0:
+                continue
+            ty, sty, sly = y - y % tile_size, sy - sy % tile_size, sy % tile_size
+            row = y * width
+            for x, tx, stx, slx in cols:
+                if known[row + x]:
+                    continue
+                res = by_origin.get((stx, sty))
+                if res is None:
+                    continue
+                counts = counts_of.get(res.tile)
+                if counts is None:
+                    counts = counts_of[res.tile] = [int(c) for c in res.counts]
+                si = sly * res.tile[2] + slx
+                c = counts[si]
+                if c < stop and c < res.depth:
+                    zr = zi = 0.0
+                elif c == res.depth == stop:
+                    k = src.pending_index(res)[si]
+                    zr, zi = float(res.zr[k]), float(res.zi[k])
+                else:
+                    continue
+                known[row + x] = 1
+                seed = seeds.get((tx, ty))
+                if seed is None:
+                    seed = seeds[(tx, ty)] = ([], [], [], [])
+                seed[0].append((y - ty) * min(tile_size, width - tx) + x - tx)
+                seed[1].append(c); seed[2].append(zr); seed[3].append(zi)
+    return {(tx, ty, min(tile_size, width - tx), min(tile_size, height - ty)): seed
+            for (tx, ty), seed in seeds.items()}
+
+
+def resume_tile(view, width, height, prev):
+    """Carry a tile's still-bounded points from prev.depth on to view.max_iter."""
+    start, stop = prev.depth, view.max_iter
+    if stop <= start or not len(prev.pending):
+        return prev._replace(depth=max(start, stop))
+    tile = prev.tile
+    if np is not None:
+        counts = prev.counts.copy()
+        idx = prev.pending
+        z = prev.zr + 1j * prev.zi
+        if view.mode == "mandelbrot":
+            xs, ys = _tile_points(view, width, height, tile, idx)
+            c = np.array(xs) + 1j * np.array(ys)
+        else:
+            c = np.full(z.shape, complex(*view.julia_c))
+        counts[idx] = stop
+        z, idx = _iterate_numpy(z, c, idx, counts, start, stop)
+        return TileResult(tile, stop, counts, idx, z.real.copy(), z.imag.copy())
+
+    counts = list(prev.counts)
+    pending, zr, zi = [], [], []
+    if view.mode == "mandelbrot":
+        cs = zip(*_tile_points(view, width, height, tile, prev.pending))
+    else:
+        cs = [view.julia_c] * len(prev.pending)
+    for i, zx, zy, (ax, ay) in zip(prev.pending, prev.zr, prev.zi, cs):
+        n, zx, zy = _iterate_point(zx, zy, ax, ay, start, stop)
+        counts[i] = n
+        if n == stop:
+            pending.append(i); zr.append(zx); zi.append(zy)
+    return TileResult(tile, stop, counts, pending, zr, zi)
+
+
+class TileRenderer:
+    """Runs tile jobs over a process pool and yields results as they finish."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            # forkserver keeps the GTK main process (and its threads) out of the workers
+            ctx = multiprocessing.get_context("forkserver")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def _collect(self, futures, cancelled):
+        """Yield finished results; once cancelled() is true, drop the rest."""
+        for fut in as_completed(futures):
+            if cancelled and cancelled():
+                for f in futures:
+                    f.cancel()
+                return
+            yield fut.result()
+
+    def render(self, view, width, height, seeds=None, cancelled=None, tile_size=TILE):
+        pool = self._executor()
+        seeds = seeds or {}
+        return self._collect([pool.submit(compute_tile, view, width, height, t, seeds.get(t))
+                              for t in split_tiles(width, height, tile_size)], cancelled)
+
+    def resume(self, view, width, height, results, cancelled=None):
+        """Deepen previously computed tiles; tiles with nothing pending finish at once."""
+        pool = self._executor()
+        return self._collect([pool.submit(resume_tile, view, width, height, r)
+                              for r in results], cancelled)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def blit(dest, dest_width, tile, rgb):
+    """Copy a tile's RGB rows into a full-frame bytearray."""
+    x0, y0, tw, th = tile
+    row = tw * 3
+    for j in range(th):
+        off = ((y0 + j) * dest_width + x0) * 3
+        dest[off:off + row] = rgb[j*row:(j+1)*row]
+
+
+class EscapeFrame:
+    """Escape counts for one view at one pass stride, kept so recolouring never iterates."""
+
+    def __init__(self, view, width, height, step=1, colors=(None, None)):
+        self.view = view
+        self.width = width
+        self.height = height
+        self.step = step
+        self.colors = colors
+        self.tiles = {}
+        self.rgb = bytearray(width * height * 3)
+        self._pending_index = {}
+
+    @property
+    def depth(self):
+        return min((r.depth for r in self.tiles.values()), default=0)
+
+    @property
+    def complete(self):
+        return len(self.tiles) == len(split_tiles(self.width, self.height))
+
+    def copy(self):
+        other = EscapeFrame(self.view, self.width, self.height, self.step, self.colors)
+        other.tiles = dict(self.tiles)
+        other.rgb = bytearray(self.rgb)
+        return other
+
+    def pending_index(self, result):
+        """Map from tile-local pixel index to its slot in result.pending."""
+        index = self._pending_index.get(result.tile)
+        if index is None or index[0] is not result:
+            index = (result, {int(i): k for k, i in enumerate(result.pending)})
+            self._pending_index[result.tile] = index
+        return index[1]
+
+    def add(self, result):
+        self.tiles[result.tile] = result
+        self._paint(result, palette(*self.colors, result.depth + 1))
+
+    def set_colors(self, max_iter, scheme):
+        """Recolour every finished tile if the palette changed."""
+        if self.colors == (max_iter, scheme):
+            return
+        self.colors = (max_iter, scheme)
+        for result in list(self.tiles.values()):
+            self._paint(result, palette(max_iter, scheme, result.depth + 1))
+
+    def _paint(self, result, lut):
+        blit(self.rgb, self.width, result.tile, apply_palette(result.counts, lut))
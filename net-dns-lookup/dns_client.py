@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""DNS client for the DNS Lookup app.
+
+Queries are built and parsed in Python (RFC 1035 wire format, with
+EDNS0 advertising a 1232-byte UDP payload) and sent straight to the
+nameservers in /etc/resolv.conf, so every record type works without `dig`
+or `nslookup`. All the questions of a lookup share one UDP socket and are
+in flight together, matched to their answers by id and question; a
+truncated answer is asked again over a non-blocking TCP connection in the
+same select loop. Unanswered queries are resent, moving on to the next
+nameserver, until ATTEMPTS sends have gone out. Names are sent, cached
+and matched in their IDNA (ASCII) form.
+
+Addresses where the system resolver knows better still go through it: A
+and AAAA for names in /etc/hosts or without a dot (resolv.conf search
+domains apply to those), and PTR for addresses in /etc/hosts. These
+answers are marked "system" and not cached.
+
+Answers are cached in an LRU keyed by (name, type) for the smallest TTL
+among their records. A name that does not exist, or has no records of
+the type, is cached for the SOA minimum the server sends (RFC 2308),
+capped at NEGATIVE_TTL.
+
+Each Answer carries its latency and how it was obtained (udp, tcp or
+cache).
+
+Run this file to time bulk lookups against a local responder.
+"""
+import collections
+import errno
+import ipaddress
+import os
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+
+PORT = 53
+TIMEOUT = 1.5           # seconds before a query is resent
+ATTEMPTS = 3
+WINDOW = 64             # queries in flight at once
+CACHE_SIZE = 2048
+MAX_TTL = 86400
+NEGATIVE_TTL = 300
+UDP_PAYLOAD = 1232
+
+TYPES = {"A": 1, "NS": 2, "CNAME": 5, "SOA": 6, "PTR": 12, "MX": 15, "TXT": 16,
+         "AAAA": 28, "SRV": 33, "CAA": 257}
+TYPE_NAMES = {v: k for k, v in TYPES.items()}
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH")
+_OPT = b"\x00" + struct.pack("!HHIH", 41, UDP_PAYLOAD, 0, 0)
+
+Record = collections.namedtuple("Record", "name type ttl text")
+
+
+class Answer(collections.namedtuple("Answer", "name type rcode records ms via error")):
+    """Result of one question; rcode is a name such as NOERROR, error a message or None."""
+
+
+def nameservers(path="/etc/resolv.conf"):
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    servers.append(parts[1].split("%")[0])
+    except OSError:
+        pass
+    return servers or ["127.0.0.1"]
+
+
+def hosts_file(path="/etc/hosts"):
+    """Names listed in a hosts file, and {reverse name: address}; names dotted and lowercased."""
+    names, reverse = set(), {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split("#", 1)[0].split()
+                if len(parts) < 2:
+                    continue
+                try:
+                    address = parts[0].split("%")[0]
+                    reverse[reverse_name(address) + "."] = address
+                except ValueError:
+                    continue
+                names.update(n.lower().rstrip(".") + "." for n in parts[1:])
+    except OSError:
+        pass
+    return names, reverse
+
+
+def ascii_name(name):
+    """name as it goes on the wire and into the cache: IDNA-encoded, lowercased, dotted."""
+    name = name.rstrip(".")
+    return (name.encode("idna").decode("ascii").lower() if name else "") + "."
+
+
+def reverse_name(address):
+    """in-addr.arpa / ip6.arpa name for an IP address."""
+    return ipaddress.ip_address(address).reverse_pointer
+
+
+def encode_name(name):
+    name = name.rstrip(".")
+    out = bytearray()
+    if name:
+        for label in name.encode("idna").split(b"."):
+            if not 0 < len(label) < 64:
+                raise ValueError(f"bad name {name}")
+            out.append(len(label))
+            out += label
+    out.append(0)
+    return bytes(out)
+
+
+def build_query(qid, name, qtype):
+    return (_HEADER.pack(qid, 0x0100, 1, 0, 0, 1) + encode_name(name)
+            + struct.pack("!HH", qtype, 1) + _OPT)
+
+
+def _read_name(data, pos):
+    """(dotted name, position after it), following compression pointers."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = data[pos]
+        if length >= 0xc0:
+            if end is None:
+                end = pos + 2
+            pos = ((length & 0x3f) << 8) | data[pos + 1]
+            jumps += 1
+            if jumps > 64:
+                raise ValueError("compression loop")
+            continue
+        pos += 1
+        if length == 0:
+            break
+        labels.append(data[pos:pos + length].decode("ascii", "replace"))
+        pos += length
+    return ".".join(labels) + ".", end if end is not None else pos
+
+
+def _rdata_text(data, rtype, start, length):
+    rdata = data[start:start + length]
+    if rtype == 1 and length == 4:
+        return socket.inet_ntop(socket.AF_INET, rdata)
+    if rtype == 28 and length == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rtype in (2, 5, 12):
+        return _read_name(data, start)[0]
+    if rtype == 15:
+        return f"{struct.unpack_from('!H', data, start)[0]} {_read_name(data, start + 2)[0]}"
+    if rtype == 16:
+        parts, pos = [], 0
+        while pos < length:
+            n = rdata[pos]
+            parts.append('"' + rdata[pos + 1:pos + 1 + n].decode("utf-8", "replace") + '"')
+            pos += 1 + n
+        return " ".join(parts)
+    if rtype == 6:
+        mname, pos = _read_name(data, start)
+        rname, pos = _read_name(data, pos)
+        return " ".join([mname, rname] + [str(v) for v in struct.unpack_from("!IIIII", data, pos)])
+    if rtype == 33:
+        prio, weight, port = struct.unpack_from("!HHH", data, start)
+        return f"{prio} {weight} {port} {_read_name(data, start + 6)[0]}"
+    return "\\# " + rdata.hex()
+
+
+def parse_response(data):
+    """(id, flags, question, answer records, SOA minimum or None) of a response."""
+    qid, flags, qdcount, ancount, nscount, _ = _HEADER.unpack_from(data)
+    pos = _HEADER.size
+    question = None
+    for _ in range(qdcount):
+        qname, pos = _read_name(data, pos)
+        qtype, _ = struct.unpack_from("!HH", data, pos)
+        pos += 4
+        question = (qname.lower(), qtype)
+    records = []
+    soa_min = None
+    for section in range(2):
+        for _ in range(ancount if section == 0 else nscount):
+            name, pos = _read_name(data, pos)
+            rtype, _, ttl, length = _RR.unpack_from(data, pos)
+            pos += _RR.size
+            if section == 0:
+                records.append(Record(name, rtype, ttl, _rdata_text(data, rtype, pos, length)))
+            elif rtype == 6:
+                _, p = _read_name(data, pos)
+                _, p = _read_name(data, p)
+                soa_min = min(ttl, struct.unpack_from("!I", data, p + 16)[0])
+            pos += length
+    return qid, flags, question, records, soa_min
+
+
+class _TcpQuery:
+    """A truncated answer asked again over TCP, driven by the resolve() select loop."""
+
+    def __init__(self, entry, server, timeout):
+        self.entry = entry
+        self.out = struct.pack("!H", len(entry[1])) + entry[1]
+        self.data = b""
+        self.deadline = time.monotonic() + timeout
+        family = socket.AF_INET6 if len(server) == 4 else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        err = self.sock.connect_ex(server)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.sock.close()
+            raise OSError(err, os.strerror(err))
+
+    def step(self, events):
+        """Advance on readiness; returns the reply once complete, else None."""
+        if events & selectors.EVENT_WRITE:
+            err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise OSError(err, os.strerror(err))
+            self.out = self.out[self.sock.send(self.out):]
+            return None
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise OSError("connection closed")
+        self.data += chunk
+        if len(self.data) >= 2:
+            need = 2 + struct.unpack_from("!H", self.data)[0]
+            if len(self.data) >= need:
+                return self.data[2:need]
+        return None
+
+
+class Resolver:
+    def __init__(self, servers=None, timeout=TIMEOUT, attempts=ATTEMPTS, cache_size=CACHE_SIZE):
+        self.servers = servers or nameservers()
+        self.hosts, self.hosts_reverse = hosts_file()
+        self.timeout = timeout
+        self.attempts = attempts
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()   # (name, type) -> (expires, Answer)
+        self._lock = threading.Lock()
+
+    def _server(self, attempt):
+        host = self.servers[attempt % len(self.servers)]
+        return (host, PORT) if ":" not in host or host.startswith("[") else (host, PORT, 0, 0)
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            answer = entry[1]
+        return answer._replace(ms=0.0, via="cache")
+
+    def _store(self, key, answer, soa_min):
+        if answer.error or answer.rcode not in ("NOERROR", "NXDOMAIN"):
+            return
+        if answer.records:
+            ttl = min(MAX_TTL, min(r.ttl for r in answer.records))
+        else:
+            ttl = min(NEGATIVE_TTL, soa_min if soa_min is not None else 0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, answer)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _system(self, qname, qtype):
+        """Answer from getaddrinfo/gethostbyaddr for the names only the system resolver knows."""
+        start = time.monotonic()
+        records = []
+        try:
+            if qtype == 12:
+                host = socket.gethostbyaddr(self.hosts_reverse[qname])[0]
+                records.append(Record(qname, 12, 0, host + "."))
+            else:
+                family = socket.AF_INET if qtype == 1 else socket.AF_INET6
+                infos = socket.getaddrinfo(qname.rstrip("."), None, family, socket.SOCK_STREAM)
+                for addr in dict.fromkeys(info[4][0] for info in infos):
+                    records.append(Record(qname, qtype, 0, addr))
+            rcode, error = "NOERROR", None
+        except (socket.herror, socket.gaierror) as e:
+            rcode, error = ("NXDOMAIN", None) if e.errno in (socket.EAI_NONAME, 1) else (None, str(e))
+        except OSError as e:
+            rcode, error = None, str(e)
+        return Answer(qname, TYPE_NAMES[qtype], rcode, records,
+                      (time.monotonic() - start) * 1000, "system", error)
+
+    def _local(self, qname, qtype):
+        if qtype == 12:
+            return qname in self.hosts_reverse
+        return qtype in (1, 28) and (qname in self.hosts or qname.count(".") == 1)
+
+    def lookup(self, name, types):
+        """Answers for name, one per type, queried together."""
+        return self.resolve([(name, t) for t in types])
+
+    def resolve(self, questions, on_answer=None):
+        """Answers for (name, type name) questions, in order; on_answer(i, answer)
+        is called from this thread as each arrives."""
+        results = [None] * len(questions)
+        waiting = collections.defaultdict(list)   # (name, type) -> question indices
+        todo = collections.deque()
+
+        def finish(key, answer):
+            for i in waiting.pop(key):
+                results[i] = answer
+                if on_answer is not None:
+                    on_answer(i, answer)
+
+        for i, (name, tname) in enumerate(questions):
+            try:
+                qname = ascii_name(name)
+            except UnicodeError as e:
+                qname, error = name, f"bad name {name}: {e}"
+            else:
+                error = None if tname in TYPES else f"unknown type {tname}"
+            key = (qname, TYPES.get(tname, 0))
+            if key in waiting:
+                waiting[key].append(i)
+                continue
+            waiting[key].append(i)
+            if error:
+                finish(key, Answer(qname, tname, None, [], 0.0, None, error))
+                continue
+            if self._local(*key):
+                finish(key, self._system(*key))
+                continue
+            cached = self._cached(key)
+            if cached is not None:
+                finish(key, cached)
+            else:
+                todo.append(key)
+
+        socks = {}
+        sel = selectors.DefaultSelector()
+        pending = {}        # id -> [key, packet, first sent, deadline, attempt]
+        tcp = {}            # socket -> _TcpQuery
+
+        def tcp_failed(query, error):
+            sel.unregister(query.sock)
+            query.sock.close()
+            del tcp[query.sock]
+            key = query.entry[0]
+            finish(key, Answer(key[0], TYPE_NAMES[key[1]], None, [],
+                               (time.monotonic() - query.entry[2]) * 1000, "tcp", error))
+
+        def retry_tcp(entry, server):
+            try:
+                query = _TcpQuery(entry, server, self.timeout * 2)
+            except OSError as e:
+                key = entry[0]
+                finish(key, Answer(key[0], TYPE_NAMES[key[1]], None, [],
+                                   (time.monotonic() - entry[2]) * 1000, "tcp", str(e)))
+                return
+            tcp[query.sock] = query
+            sel.register(query.sock, selectors.EVENT_WRITE, query)
+
+        try:
+            while todo or pending or tcp:
+                while todo and len(pending) < WINDOW:
+                    key = todo.popleft()
+                    qid = random.getrandbits(16)
+                    while qid in pending:
+                        qid = random.getrandbits(16)
+                    try:
+                        packet = build_query(qid, key[0], key[1])
+                    except (ValueError, UnicodeError) as e:
+                        finish(key, Answer(key[0], TYPE_NAMES[key[1]], None, [], 0.0, None, str(e)))
+                        continue
+                    now = time.monotonic()
+                    pending[qid] = [key, packet, now, now + self.timeout, 0]
+                    self._send(socks, sel, qid, pending[qid])
+                if not pending and not tcp:
+                    continue
+                now = time.monotonic()
+                wait = max(0.0, min([p[3] for p in pending.values()]
+                                    + [q.deadline for q in tcp.values()]) - now)
+                for sk, events in sel.select(wait):
+                    query = sk.data
+                    if query is None:
+                        self._receive(sk.fileobj, pending, finish, retry_tcp)
+                        continue
+                    try:
+                        reply = query.step(events)
+                        if reply is None:
+                            if not query.out and events & selectors.EVENT_WRITE:
+                                sel.modify(query.sock, selectors.EVENT_READ, query)
+                            continue
+                        _, flags, _, records, soa_min = parse_response(reply)
+                    except (OSError, ValueError, IndexError, struct.error) as e:
+                        tcp_failed(query, str(e))
+                        continue
+                    sel.unregister(query.sock)
+                    query.sock.close()
+                    del tcp[query.sock]
+                    self._answered(query.entry, flags, records, soa_min, "tcp", finish)
+                now = time.monotonic()
+                for query in [q for q in tcp.values() if q.deadline <= now]:
+                    tcp_failed(query, "timed out")
+                for qid, entry in list(pending.items()):
+                    if entry[3] > now:
+                        continue
+                    entry[4] += 1
+                    if entry[4] >= self.attempts:
+                        del pending[qid]
+                        key = entry[0]
+                        finish(key, Answer(key[0], TYPE_NAMES[key[1]], None, [],
+                                           (now - entry[2]) * 1000, None, "timed out"))
+                    else:
+                        entry[3] = now + self.timeout
+                        self._send(socks, sel, qid, entry)
+        finally:
+            sel.close()
+            for sock in list(socks.values()) + list(tcp):
+                sock.close()
+        return results
+
+    def _send(self, socks, sel, qid, entry):
+        server = self._server(entry[4])
+        family = socket.AF_INET6 if len(server) == 4 else socket.AF_INET
+        sock = socks.get(family)
+        if sock is None:
+            sock = socks[family] = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sel.register(sock, selectors.EVENT_READ)
+        try:
+            sock.sendto(entry[1], server)
+        except OSError:
+            entry[3] = time.monotonic()     # counts as a failed attempt
+
+    def _receive(self, sock, pending, finish, retry_tcp):
+        while True:
+            try:
+                data, addr = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMP port unreachable from a server surfaces here; its query times out
+                return
+            try:
+                qid, flags, question, records, soa_min = parse_response(data)
+            except (ValueError, IndexError, struct.error, UnicodeError):
+                continue
+            entry = pending.get(qid)
+            if entry is None or question != entry[0] or not flags & 0x8000:
+                continue
+            server = self._server(entry[4])
+            if addr[0] != server[0] or addr[1] != PORT:
+                continue
+            del pending[qid]
+            if flags & 0x0200:          # truncated: ask again over TCP
+                retry_tcp(entry, server)
+                continue
+            self._answered(entry, flags, records, soa_min, "udp", finish)
+
+    def _answered(self, entry, flags, records, soa_min, via, finish):
+        key = entry[0]
+        rcode = RCODES.get(flags & 0xf, str(flags & 0xf))
+        answer = Answer(key[0], TYPE_NAMES[key[1]], rcode, records,
+                        (time.monotonic() - entry[2]) * 1000, via, None)
+        self._store(key, answer, soa_min)
+        finish(key, answer)
+
+
+if __name__ == "__main__":
+    class Responder(threading.Thread):
+        """Answers A, AAAA, MX and TXT for *.test; big.test TXT only fits over TCP."""
+
+        def __init__(self):
+            super().__init__(daemon=True)
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.bind(("127.0.0.1", 0))
+            self.port = self.udp.getsockname()[1]
+            self.tcp = socket.socket()
+            self.tcp.bind(("127.0.0.1", self.port))
+            self.tcp.listen(16)
+            self.queries = 0
+
+        def answer(self, query, udp):
+            qid, _, _, _, _, _ = _HEADER.unpack_from(query)
+            qname, pos = _read_name(query, _HEADER.size)
+            qtype, _ = struct.unpack_from("!HH", query, pos)
+            question = query[_HEADER.size:pos + 4]
+            rdatas = []
+            if not qname.endswith(".test."):
+                return _HEADER.pack(qid, 0x8183, 1, 0, 0, 0) + question
+            if qtype == 1:
+                rdatas = [socket.inet_aton(f"10.0.{len(qname) % 256}.{i}") for i in (1, 2)]
+            elif qtype == 28:
+                rdatas = [socket.inet_pton(socket.AF_INET6, "fd00::1")]
+            elif qtype == 15:
+                rdatas = [struct.pack("!H", 10) + b"\x04mail\xc0\x0c"]
+            elif qtype == 16:
+                count = 40 if qname == "big.test." else 1
+                rdatas = [bytes([60]) + b"v=spf1 " + b"x" * 53 for _ in range(count)]
+            body = b"".join(b"\xc0\x0c" + _RR.pack(qtype, 1, 300, len(r)) + r for r in rdatas)
+            flags = 0x8180
+            if udp and len(body) > 512:
+                body, rdatas, flags = b"", [], flags | 0x0200
+            return _HEADER.pack(qid, flags, 1, len(rdatas), 0, 0) + question + body
+
+        def serve_tcp(self):
+            while True:
+                conn, _ = self.tcp.accept()
+                with conn:
+                    n = struct.unpack("!H", conn.recv(2))[0]
+                    query = conn.recv(n)
+                    reply = self.answer(query, False)
+                    conn.sendall(struct.pack("!H", len(reply)) + reply)
+
+        def run(self):
+            threading.Thread(target=self.serve_tcp, daemon=True).start()
+            while True:
+                query, addr = self.udp.recvfrom(4096)
+                self.queries += 1
+                self.udp.sendto(self.answer(query, True), addr)
+
+    responder = Responder()
+    responder.start()
+    PORT = responder.port
+    resolver = Resolver(servers=["127.0.0.1"])
+    for a in resolver.lookup("big.test", ["A", "AAAA", "MX", "TXT", "SRV"]):
+        print(f"{a.type:5} {a.rcode} via {a.via} {a.ms:.2f} ms: "
+              f"{len(a.records)} records {a.records[0].text[:40] if a.records else ''}")
+    print(resolver.lookup("missing.example", ["A"])[0][:3])
+    idn = resolver.lookup("bücher.test", ["A"])[0]
+    assert idn.name == "xn--bcher-kva.test." and idn.rcode == "NOERROR" and idn.records, idn
+    assert resolver.lookup("BÜCHER.test.", ["A"])[0].via == "cache"
+    local = resolver.lookup("localhost", ["A"])[0]
+    assert local.via == "system" and "127.0.0.1" in [r.text for r in local.records], local
+    # a truncated answer goes over TCP while the other queries keep being answered
+    mixed = Resolver(servers=["127.0.0.1"]).resolve([("big.test", "TXT")] + [(f"tcp{i}.test", "A") for i in range(50)])
+    assert mixed[0].via == "tcp" and len(mixed[0].records) == 40
+    assert all(a.rcode == "NOERROR" and a.records for a in mixed[1:])
+    print(f"IDN {idn.name} {idn.records[0].text}; localhost via {local.via}; "
+          f"TCP retry alongside {len(mixed) - 1} UDP queries ok")
+    hosts = [f"host{i}.test" for i in range(1000)]
+    questions = [(h, t) for h in hosts for t in ("A", "AAAA")]
+    start = time.perf_counter()
+    one_by_one = Resolver(servers=["127.0.0.1"])
+    for q in questions:
+        one_by_one.resolve([q])
+    print(f"one at a time: {len(questions)} queries in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for label in ("cold", "cached"):
+        sent = responder.queries
+        start = time.perf_counter()
+        answers = resolver.resolve(questions)
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for a in answers if a.records)
+        print(f"bulk {label}: {len(questions)} queries in {elapsed * 1000:.0f} ms, "
+              f"{ok} answered, {responder.queries - sent} sent to the responder")
@@ -2,15 +2,24 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import socket, subprocess, threading
+import ipaddress, threading
+from dns_client import Resolver, reverse_name
 
 QUERY_TYPES = ["A", "AAAA", "MX", "NS", "TXT", "CNAME", "PTR"]
 
+def is_address(text):
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return False
+
 class DnsLookupWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         super().__init__(application=app)
         self.set_title("DNS Lookup")
         self.set_default_size(700, 560)
+        self.resolver = Resolver()      # kept for the window so its cache carries over
         self.build_ui()
 
     def build_ui(self):
@@ -24,7 +33,7 @@ class DnsLookupWindow(Gtk.ApplicationWindow):
         query_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         query_box.append(Gtk.Label(label="Hostname:"))
         self.hostname_entry = Gtk.Entry()
-        self.hostname_entry.set_placeholder_text("e.g., google.com")
+        self.hostname_entry.set_placeholder_text("e.g., google.com (several: separate with spaces)")
         self.hostname_entry.set_hexpand(True)
         query_box.append(self.hostname_entry)
         query_box.append(Gtk.Label(label="Type:"))
@@ -59,66 +68,69 @@ class DnsLookupWindow(Gtk.ApplicationWindow):
         vbox.append(copy_btn)
 
     def on_lookup(self, btn):
-        hostname = self.hostname_entry.get_text().strip()
+        hosts = self.hostname_entry.get_text().replace(",", " ").split()
         qtype = self.type_combo.get_active_text()
-        if hostname:
+        if hosts:
             self.results_view.get_buffer().set_text("")
-            self.status_label.set_text(f"Looking up {qtype} for {hostname}...")
-            threading.Thread(target=self.do_lookup, args=(hostname, [qtype]), daemon=True).start()
+            self.status_label.set_text(f"Looking up {qtype} for {' '.join(hosts)}...")
+            threading.Thread(target=self.do_lookup, args=(hosts, [qtype]), daemon=True).start()
 
     def on_lookup_all(self, btn):
-        hostname = self.hostname_entry.get_text().strip()
-        if hostname:
+        hosts = self.hostname_entry.get_text().replace(",", " ").split()
+        if hosts:
             self.results_view.get_buffer().set_text("")
-            self.status_label.set_text(f"Looking up all record types for {hostname}...")
-            threading.Thread(target=self.do_lookup, args=(hostname, QUERY_TYPES), daemon=True).start()
+            self.status_label.set_text(f"Looking up all record types for {' '.join(hosts)}...")
+            threading.Thread(target=self.do_lookup, args=(hosts, QUERY_TYPES), daemon=True).start()
+
+    def do_lookup(self, hosts, types):
+        """Every type for every host in one batch of concurrent queries."""
+        questions = []
+        for host in hosts:
+            for qtype in types:
+                if qtype == "PTR" and is_address(host):
+                    questions.append((reverse_name(host), "PTR"))
+                elif qtype != "PTR" or not is_address(host):
+                    questions.append((host, qtype))
+        answers = dict(zip(questions, self.resolver.resolve(questions)))
+        # PTR for a hostname means: reverse-resolve its first address
+        reverse = {}
+        for host in hosts:
+            if "PTR" in types and not is_address(host):
+                a = answers.get((host, "A"))
+                if a is None:
+                    a = self.resolver.lookup(host, ["A"])[0]
+                addrs = [r.text for r in a.records if r.type == 1]
+                if addrs:
+                    reverse[host] = reverse_name(addrs[0])
+        for (host, name), answer in zip(reverse.items(), self.resolver.resolve(
+                [(name, "PTR") for name in reverse.values()])):
+            answers[(host, "PTR")] = answer
 
-    def do_lookup(self, hostname, types):
         results = []
-        for qtype in types:
-            try:
-                if qtype == "A":
-                    addrs = socket.getaddrinfo(hostname, None, socket.AF_INET)
-                    for a in addrs:
-                        results.append(f"A     {a[4][0]}")
-                elif qtype == "AAAA":
-                    addrs = socket.getaddrinfo(hostname, None, socket.AF_INET6)
-                    for a in addrs:
-                        results.append(f"AAAA  {a[4][0]}")
-                elif qtype == "PTR":
-                    try:
-                        name = socket.gethostbyaddr(hostname)[0]
-                        results.append(f"PTR   {name}")
-                    except Exception:
-                        pass
-                else:
-                    try:
-                        out = subprocess.run(
-                            ["dig", "+short", "-t", qtype, hostname],
-                            capture_output=True, text=True, timeout=5
-                        )
-                        for line in out.stdout.strip().splitlines():
-                            if line:
-                                results.append(f"{qtype:<6}{line}")
-                    except FileNotFoundError:
-                        try:
-                            out = subprocess.run(
-                                ["nslookup", "-type=" + qtype, hostname],
-                                capture_output=True, text=True, timeout=5
-                            )
-                            results.append(f"--- {qtype} ---")
-                            results.append(out.stdout)
-                        except Exception as e:
-                            results.append(f"{qtype}: {e}")
-            except Exception as e:
-                results.append(f"{qtype} error: {e}")
+        for host in hosts:
+            if len(hosts) > 1:
+                results.append(f";; {host}")
+            for qtype in types:
+                key = (reverse_name(host), "PTR") if qtype == "PTR" and is_address(host) else (host, qtype)
+                answer = answers.get(key)
+                if answer is None:
+                    continue
+                if answer.error:
+                    results.append(f"; {qtype:<5} {answer.error} ({answer.ms:.1f} ms)")
+                    continue
+                results.append(f"; {qtype:<5} {answer.rcode}, {len(answer.records)} record(s), "
+                               f"{answer.ms:.1f} ms ({answer.via})")
+                for r in answer.records:
+                    results.append(f"{qtype:<6}{r.text}")
+            if len(hosts) > 1:
+                results.append("")
 
         text = "\n".join(results) if results else "No results found"
-        GLib.idle_add(self.show_results, hostname, text)
+        GLib.idle_add(self.show_results, " ".join(hosts), text)
 
     def show_results(self, hostname, text):
         self.results_view.get_buffer().set_text(text)
-        self.status_label.set_text(f"Results for: {hostname}")
+        self.status_label.set_text(f"Results for: {hostname}  (server {', '.join(self.resolver.servers)})")
         return False
 
     def on_copy(self, btn):
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Interface traffic sampling for the Network Monitor.
+
+/proc/net/dev is kept open and re-read with one preadv() into a reused
+buffer. Every interface is sampled on every tick, so switching the
+interface shown in the window brings up its full history at once.
+
+Rates are kept per series (SERIES: bytes, packets and errors per second,
+each for receive and transmit) in tiers of ring buffers. Tier 0 holds raw
+samples at the sampling interval, which can be as short as 100 ms. Tiers
+1-3 hold 1 s, 1 min and 1 h averages. Each tier stores one flat
+array('d') per series, `length` slots per interface. All interfaces are
+written on the same tick, so a tier has a single write position, as in
+ProcHistory. Averages are time-weighted, so a tier is right whatever
+the sampling interval.
+
+Run this file to time a sample against parsing the file into dicts.
+"""
+import os
+import time
+from array import array
+
+PATH = "/proc/net/dev"
+SERIES = ("rx_bps", "tx_bps", "rx_pps", "tx_pps", "rx_eps", "tx_eps")   # errors include drops
+# (label, seconds per slot, slots); a step of 0 means the sampling interval
+TIERS = (("Live", 0, 600), ("1 s", 1, 3600), ("1 min", 60, 1440), ("1 h", 3600, 720))
+
+
+class Tier:
+    def __init__(self, label, step, length):
+        self.label = label
+        self.step = step
+        self.length = length
+        self.data = {name: array("d") for name in SERIES}
+        self.pos = 0
+        self.filled = 0
+        self.pushed = 0             # values written so far, for spotting new ones
+        self.bucket = None          # index of the step-sized period being averaged
+        self.sums = None            # per slot and series: rate * seconds so far
+        self.seconds = 0.0
+
+    def grow(self, slots):
+        blank = array("d", bytes(8 * self.length * (slots - len(self.data[SERIES[0]]) // self.length)))
+        for data in self.data.values():
+            data.extend(blank)
+
+    def push(self, rates):
+        """Write one value per slot and series: rates[series][slot]."""
+        pos, length = self.pos, self.length
+        for name, values in zip(SERIES, rates):
+            data = self.data[name]
+            for slot, v in enumerate(values):
+                data[slot * length + pos] = v
+        self.pos = (pos + 1) % length
+        if self.filled < length:
+            self.filled += 1
+        self.pushed += 1
+
+    def add(self, now, dt, rates):
+        """Fold a sample covering the dt seconds before now into the running average."""
+        bucket = int(now // self.step)
+        if self.bucket is not None and bucket != self.bucket and self.seconds > 0:
+            self.push([[s / self.seconds for s in sums] for sums in self.sums])
+            self.sums = None
+        self.bucket = bucket
+        if self.sums is None:
+            self.sums = [[0.0] * len(values) for values in rates]
+            self.seconds = 0.0
+        self.sums = [[s + v * dt for s, v in zip(sums, values)]
+                     for sums, values in zip(self.sums, rates)]
+        self.seconds += dt
+
+    def series(self, slot, name):
+        """Values of one series for one slot, oldest first."""
+        data, length, pos = self.data[name], self.length, self.pos
+        base = slot * length
+        ring = data[base + pos:base + length] + data[base:base + pos]
+        return ring[length - self.filled:]
+
+
+class NetSampler:
+    def __init__(self, path=PATH, tiers=TIERS):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buf = bytearray(16384)
+        self.tiers = [Tier(*t) for t in tiers]
+        self.slots = {}             # interface -> slot
+        self.counters = []          # per slot: the 16 counters of the last sample
+        self.latest = []            # per slot: the latest rates, in SERIES order
+        self.timestamp = None
+
+    def close(self):
+        os.close(self.fd)
+
+    def interfaces(self):
+        return list(self.slots)
+
+    def _read(self):
+        while True:
+            n = os.preadv(self.fd, [self.buf], 0)
+            if n < len(self.buf):
+                return bytes(memoryview(self.buf)[:n])
+            self.buf = bytearray(2 * len(self.buf))
+
+    def sample(self, now=None):
+        """Read the counters and update every tier; returns the interfaces seen."""
+        data = self._read()
+        now = time.monotonic() if now is None else now
+        dt = now - self.timestamp if self.timestamp is not None else 0.0
+        seen = []
+        rates = [[0.0] * len(self.counters) for _ in SERIES]
+        for line in data.split(b"\n")[2:]:
+            name, sep, rest = line.partition(b":")
+            if not sep:
+                continue
+            iface = name.strip().decode()
+            values = list(map(int, rest.split()))
+            slot = self.slots.get(iface)
+            if slot is None:
+                slot = self.slots[iface] = len(self.counters)
+                self.counters.append(values)
+                self.latest.append([0.0] * len(SERIES))
+                for r in rates:
+                    r.append(0.0)
+                for tier in self.tiers:
+                    tier.grow(len(self.counters))
+                    if tier.sums is not None:
+                        for sums in tier.sums:
+                            sums.append(0.0)
+                seen.append(iface)
+                continue
+            prev = self.counters[slot]
+            self.counters[slot] = values
+            seen.append(iface)
+            if dt <= 0:
+                continue
+            d = [v - p for v, p in zip(values, prev)]
+            # in SERIES order; counters go backwards when a driver resets them
+            latest = [max(0.0, x / dt) for x in (d[0], d[8], d[1], d[9], d[2] + d[3], d[10] + d[11])]
+            self.latest[slot] = latest
+            for r, x in zip(rates, latest):
+                r[slot] = x
+        if dt > 0:
+            for tier in self.tiers:
+                if tier.step:
+                    tier.add(now, dt, rates)
+                else:
+                    tier.push(rates)
+        self.timestamp = now
+        return seen
+
+    def totals(self, iface):
+        """(rx bytes, tx bytes, rx packets, tx packets, rx errors, tx errors) since boot."""
+        v = self.counters[self.slots[iface]]
+        return v[0], v[8], v[1], v[9], v[2] + v[3], v[10] + v[11]
+
+    def rates(self, iface):
+        """Latest rates of iface, in SERIES order."""
+        return tuple(self.latest[self.slots[iface]])
+
+    def series(self, iface, name, tier=0):
+        return self.tiers[tier].series(self.slots[iface], name)
+
+
+if __name__ == "__main__":
+    def read_net_stats():
+        """The old parser, for comparison."""
+        stats = {}
+        with open(PATH) as f:
+            for line in f:
+                parts = line.strip().split(":")
+                if len(parts) == 2:
+                    vals = parts[1].split()
+                    stats[parts[0].strip()] = {
+                        "rx_bytes": int(vals[0]), "rx_packets": int(vals[1]),
+                        "rx_errors": int(vals[2]), "tx_bytes": int(vals[8]),
+                        "tx_packets": int(vals[9]), "tx_errors": int(vals[10])}
+        return stats
+
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        read_net_stats()
+    old = (time.perf_counter() - start) / n
+    sampler = NetSampler()
+    start = time.perf_counter()
+    t = 0.0
+    for _ in range(n):
+        t += 0.1
+        sampler.sample(t)
+    new = (time.perf_counter() - start) / n
+    print(f"{len(sampler.slots)} interfaces: dict parse {old * 1e6:.0f} us, "
+          f"sample with all tiers {new * 1e6:.0f} us "
+          f"({new * 10 * 100:.2f}% of a core at 100 ms)")
+    print("tiers:", ", ".join(f"{tier.label} {tier.filled}/{tier.length}" for tier in sampler.tiers))
+    iface = sampler.interfaces()[0]
+    start = time.perf_counter()
+    for _ in range(1000):
+        sampler.series(iface, "rx_bps", 0)
+    print(f"series({iface!r}, 'rx_bps') of {len(sampler.series(iface, 'rx_bps'))} samples: "
+          f"{(time.perf_counter() - start) * 1000:.0f} us")
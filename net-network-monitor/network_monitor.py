@@ -2,31 +2,23 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import os, time, collections
-
-MAX_HISTORY = 60
-
-def read_net_stats():
-    stats = {}
-    try:
-        with open("/proc/net/dev") as f:
-            for line in f:
-                parts = line.strip().split(":")
-                if len(parts) == 2:
-                    iface = parts[0].strip()
-                    vals = parts[1].split()
-                    if len(vals) >= 9:
-                        stats[iface] = {
-                            "rx_bytes": int(vals[0]),
-                            "rx_packets": int(vals[1]),
-                            "rx_errors": int(vals[2]),
-                            "tx_bytes": int(vals[8]),
-                            "tx_packets": int(vals[9]),
-                            "tx_errors": int(vals[10]),
-                        }
-    except Exception:
-        pass
-    return stats
+import cairo
+from net_sampler import NetSampler, TIERS
+
+INTERVALS = [("100 ms", 100), ("250 ms", 250), ("500 ms", 500), ("1 s", 1000), ("2 s", 2000)]
+SHOW = [("Bytes/s", ("rx_bps", "tx_bps")), ("Packets/s", ("rx_pps", "tx_pps")),
+        ("Errors/s", ("rx_eps", "tx_eps"))]
+PX = 2          # graph pixels per sample
+BACKGROUND = (0.05, 0.05, 0.1)
+
+def nice_ceil(v):
+    """Smallest 1, 2 or 5 times a power of ten that is >= v (at least 1)."""
+    step = 1
+    while True:
+        for m in (1, 2, 5):
+            if m * step >= v:
+                return m * step
+        step *= 10
 
 class NetworkMonitorWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -34,13 +26,19 @@ class NetworkMonitorWindow(Gtk.ApplicationWindow):
         self.set_title("Network Monitor")
         self.set_default_size(800, 600)
         self.iface = None
-        self.prev_stats = None
-        self.prev_time = None
-        self.rx_history = collections.deque(maxlen=MAX_HISTORY)
-        self.tx_history = collections.deque(maxlen=MAX_HISTORY)
-        self.max_rate = 1
+        self.sampler = NetSampler()
+        self.tier = 0
+        self.show = 0
+        self.scale = 1
+        # The graph is kept in an image and scrolled, so a new sample only
+        # paints the strip it exposes; see on_draw.
+        self.surface = None
+        self.spare = None
+        self.surface_key = None
+        self.drawn = 0
         self.build_ui()
-        GLib.timeout_add(1000, self.update)
+        self.timer = GLib.timeout_add(1000, self.update)
+        self.connect("close-request", self.on_close_request)
 
     def build_ui(self):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
@@ -51,14 +49,40 @@ class NetworkMonitorWindow(Gtk.ApplicationWindow):
         ctrl = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         ctrl.append(Gtk.Label(label="Interface:"))
         self.iface_combo = Gtk.ComboBoxText()
-        stats = read_net_stats()
-        for iface in stats:
+        self.known = set()
+        seen = self.sampler.sample()
+        for iface in seen:
             self.iface_combo.append_text(iface)
-        if stats:
+            self.known.add(iface)
+        if seen:
             self.iface_combo.set_active(0)
-            self.iface = list(stats.keys())[0]
+            self.iface = seen[0]
         self.iface_combo.connect("changed", self.on_iface_changed)
         ctrl.append(self.iface_combo)
+
+        ctrl.append(Gtk.Label(label="Interval:"))
+        self.interval_combo = Gtk.ComboBoxText()
+        for label, _ in INTERVALS:
+            self.interval_combo.append_text(label)
+        self.interval_combo.set_active(3)
+        self.interval_combo.connect("changed", self.on_interval_changed)
+        ctrl.append(self.interval_combo)
+
+        ctrl.append(Gtk.Label(label="History:"))
+        self.tier_combo = Gtk.ComboBoxText()
+        for label, _, _ in TIERS:
+            self.tier_combo.append_text(label)
+        self.tier_combo.set_active(0)
+        self.tier_combo.connect("changed", self.on_tier_changed)
+        ctrl.append(self.tier_combo)
+
+        ctrl.append(Gtk.Label(label="Show:"))
+        self.show_combo = Gtk.ComboBoxText()
+        for label, _ in SHOW:
+            self.show_combo.append_text(label)
+        self.show_combo.set_active(0)
+        self.show_combo.connect("changed", self.on_show_changed)
+        ctrl.append(self.show_combo)
         vbox.append(ctrl)
 
         stats_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=20)
@@ -71,13 +95,13 @@ class NetworkMonitorWindow(Gtk.ApplicationWindow):
             stats_box.append(lbl)
         vbox.append(stats_box)
 
-        graph_frame = Gtk.Frame(label="RX (green) / TX (red) — KB/s")
+        self.graph_frame = Gtk.Frame(label="RX (green) / TX (red) — Bytes/s")
         self.graph = Gtk.DrawingArea()
         self.graph.set_size_request(760, 250)
         self.graph.set_draw_func(self.on_draw)
         self.graph.set_vexpand(True)
-        graph_frame.set_child(self.graph)
-        vbox.append(graph_frame)
+        self.graph_frame.set_child(self.graph)
+        vbox.append(self.graph_frame)
 
         details_frame = Gtk.Frame(label="Interface Details")
         self.details_view = Gtk.TextView()
@@ -89,34 +113,47 @@ class NetworkMonitorWindow(Gtk.ApplicationWindow):
         details_frame.set_child(details_scroll)
         vbox.append(details_frame)
 
+    def on_close_request(self, win):
+        GLib.source_remove(self.timer)
+        self.sampler.close()
+        return False
+
     def on_iface_changed(self, combo):
         self.iface = combo.get_active_text()
-        self.rx_history.clear()
-        self.tx_history.clear()
-        self.prev_stats = None
+        self.graph.queue_draw()
+
+    def on_interval_changed(self, combo):
+        GLib.source_remove(self.timer)
+        self.timer = GLib.timeout_add(INTERVALS[combo.get_active()][1], self.update)
+
+    def on_tier_changed(self, combo):
+        self.tier = combo.get_active()
+        self.graph.queue_draw()
+
+    def on_show_changed(self, combo):
+        self.show = combo.get_active()
+        self.graph_frame.set_label(f"RX (green) / TX (red) — {SHOW[self.show][0]}")
+        self.graph.queue_draw()
 
     def update(self):
-        stats = read_net_stats()
-        now = time.time()
-        if self.iface and self.iface in stats:
-            cur = stats[self.iface]
-            if self.prev_stats and self.prev_time:
-                dt = now - self.prev_time
-                prev = self.prev_stats
-                rx_rate = (cur["rx_bytes"] - prev["rx_bytes"]) / dt
-                tx_rate = (cur["tx_bytes"] - prev["tx_bytes"]) / dt
-                self.rx_history.append(rx_rate)
-                self.tx_history.append(tx_rate)
-                self.max_rate = max(1, max(max(self.rx_history, default=0), max(self.tx_history, default=0)))
-                self.rx_label.set_text(f"RX: {self.fmt_rate(rx_rate)}")
-                self.tx_label.set_text(f"TX: {self.fmt_rate(tx_rate)}")
-            self.rx_total_label.set_text(f"RX Total: {self.fmt_bytes(cur['rx_bytes'])}")
-            self.tx_total_label.set_text(f"TX Total: {self.fmt_bytes(cur['tx_bytes'])}")
-            details = (f"Packets RX: {cur['rx_packets']}  TX: {cur['tx_packets']}\n"
-                       f"Errors  RX: {cur['rx_errors']}  TX: {cur['tx_errors']}")
+        seen = self.sampler.sample()
+        for iface in seen:
+            if iface not in self.known:
+                self.known.add(iface)
+                self.iface_combo.append_text(iface)
+        if self.iface is None and seen:
+            self.iface_combo.set_active(0)
+        if self.iface in seen:
+            rx, tx, rx_pps, tx_pps, rx_eps, tx_eps = self.sampler.rates(self.iface)
+            rx_bytes, tx_bytes, rx_packets, tx_packets, rx_errors, tx_errors = self.sampler.totals(self.iface)
+            self.rx_label.set_text(f"RX: {self.fmt_rate(rx)}")
+            self.tx_label.set_text(f"TX: {self.fmt_rate(tx)}")
+            self.rx_total_label.set_text(f"RX Total: {self.fmt_bytes(rx_bytes)}")
+            self.tx_total_label.set_text(f"TX Total: {self.fmt_bytes(tx_bytes)}")
+            details = (f"Packets RX: {rx_packets} ({rx_pps:.0f}/s)  TX: {tx_packets} ({tx_pps:.0f}/s)\n"
+                       f"Errors  RX: {rx_errors} ({rx_eps:.1f}/s)  TX: {tx_errors} ({tx_eps:.1f}/s)")
             self.details_view.get_buffer().set_text(details)
-            self.prev_stats = cur
-            self.prev_time = now
+        if self.sampler.tiers[self.tier].pushed != self.drawn:
             self.graph.queue_draw()
         return True
 
@@ -130,27 +167,71 @@ class NetworkMonitorWindow(Gtk.ApplicationWindow):
         if b > 1e6: return f"{b/1e6:.2f} MB"
         return f"{b/1024:.1f} KB"
 
-    def on_draw(self, area, cr, w, h):
-        cr.set_source_rgb(0.05, 0.05, 0.1)
-        cr.rectangle(0, 0, w, h); cr.fill()
-        step = w / MAX_HISTORY
+    def fmt_value(self, v):
+        if self.show == 0:
+            return self.fmt_rate(v)
+        return f"{v:g}/s"
 
-        for hist, color in [(self.rx_history, (0.2, 0.8, 0.2)), (self.tx_history, (0.8, 0.2, 0.2))]:
-            if len(hist) < 2: continue
+    def draw_lines(self, cr, w, h, lines, first):
+        """Stroke each series from point `first` on; the newest point is at x = w."""
+        for values, color in zip(lines, [(0.2, 0.8, 0.2), (0.8, 0.2, 0.2)]):
+            m = len(values)
+            if m - first < 2: continue
             cr.set_source_rgb(*color)
             cr.set_line_width(1.5)
-            pts = list(hist)
-            x0 = (MAX_HISTORY - len(pts)) * step
-            cr.move_to(x0, h - (pts[0] / self.max_rate) * (h - 10) - 5)
-            for i, v in enumerate(pts[1:], 1):
-                cr.line_to(x0 + i * step, h - (v / self.max_rate) * (h - 10) - 5)
+            for i in range(first, m):
+                x = w - (m - 1 - i) * PX
+                y = h - (values[i] / self.scale) * (h - 10) - 5
+                if i == first:
+                    cr.move_to(x, y)
+                else:
+                    cr.line_to(x, y)
             cr.stroke()
 
-        cr.set_source_rgb(0.3, 0.3, 0.3)
+    def on_draw(self, area, cr, w, h):
+        # GTK 4 always repaints the whole widget, so the graph is cached in
+        # an image. A new sample scrolls the image left by PX per sample
+        # and draws only the strip it uncovers; the full graph is redrawn
+        # only when the size, scale, interface, history or series changes.
+        if self.iface not in self.known or w <= 0 or h <= 0:
+            cr.set_source_rgb(*BACKGROUND)
+            cr.rectangle(0, 0, w, h); cr.fill()
+            return
+        tier = self.sampler.tiers[self.tier]
+        n = w // PX + 2
+        lines = [self.sampler.series(self.iface, name, self.tier)[-n:] for name in SHOW[self.show][1]]
+        self.scale = nice_ceil(max(max(values, default=0) for values in lines))
+        key = (w, h, self.scale, self.iface, self.tier, self.show)
+        new = tier.pushed - self.drawn
+        m = len(lines[0])
+        if self.surface is None or key != self.surface_key or new * PX >= w or new >= m:
+            self.surface = cairo.ImageSurface(cairo.FORMAT_RGB24, w, h)
+            self.spare = None
+            scr = cairo.Context(self.surface)
+            scr.set_source_rgb(*BACKGROUND)
+            scr.paint()
+            self.draw_lines(scr, w, h, lines, 0)
+        elif new > 0:
+            if self.spare is None:
+                self.spare = cairo.ImageSurface(cairo.FORMAT_RGB24, w, h)
+            scr = cairo.Context(self.spare)
+            scr.set_source_surface(self.surface, -new * PX, 0)
+            scr.paint()
+            scr.rectangle(w - new * PX, 0, new * PX, h)
+            scr.clip()
+            scr.set_source_rgb(*BACKGROUND)
+            scr.paint()
+            self.draw_lines(scr, w, h, lines, max(0, m - new - 2))
+            self.surface, self.spare = self.spare, self.surface
+        self.surface_key = key
+        self.drawn = tier.pushed
+
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.paint()
         cr.set_font_size(10)
         cr.move_to(2, 14)
         cr.set_source_rgb(0.8, 0.8, 0.8)
-        cr.show_text(f"Max: {self.fmt_rate(self.max_rate)}")
+        cr.show_text(f"Max: {self.fmt_value(self.scale)}")
 
 class NetworkMonitorApp(Gtk.Application):
     def __init__(self):
@@ -2,43 +2,10 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import subprocess, threading, time, collections
-
-MAX_HISTORY = 60
-
-class HostMonitor:
-    def __init__(self, host):
-        self.host = host
-        self.history = collections.deque(maxlen=MAX_HISTORY)
-        self.sent = 0; self.received = 0
-        self.min_ms = float('inf'); self.max_ms = 0; self.avg_ms = 0
-
-    def ping(self):
-        self.sent += 1
-        try:
-            result = subprocess.run(
-                ["ping", "-c", "1", "-W", "2", self.host],
-                capture_output=True, text=True, timeout=3
-            )
-            if result.returncode == 0:
-                for line in result.stdout.split("\n"):
-                    if "time=" in line:
-                        ms = float(line.split("time=")[1].split()[0])
-                        self.history.append(ms)
-                        self.received += 1
-                        self.min_ms = min(self.min_ms, ms)
-                        self.max_ms = max(self.max_ms, ms)
-                        self.avg_ms = sum(self.history) / len(self.history)
-                        return ms
-            self.history.append(-1)
-            return -1
-        except Exception:
-            self.history.append(-1)
-            return -1
-
-    def packet_loss(self):
-        if self.sent == 0: return 0
-        return (self.sent - self.received) / self.sent * 100
+import threading
+from prober import Prober, MAX_HISTORY, INTERVAL
+
+COLUMNS = ["Host", "Last", "Min", "Avg", "Max", "Jitter", "p95", "Loss%", "Status"]
 
 class PingMonitorWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -46,8 +13,11 @@ class PingMonitorWindow(Gtk.ApplicationWindow):
         self.set_title("Ping Monitor")
         self.set_default_size(800, 600)
         self.monitors = {}
-        self.running = False
+        self.prober = None
+        self.posted = False
+        self.post_lock = threading.Lock()
         self.build_ui()
+        self.connect("close-request", self.on_close_request)
 
     def build_ui(self):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
@@ -63,17 +33,22 @@ class PingMonitorWindow(Gtk.ApplicationWindow):
         add_btn = Gtk.Button(label="Add Host")
         add_btn.connect("clicked", self.on_add_host)
         ctrl.append(add_btn)
+        ctrl.append(Gtk.Label(label="Every"))
+        self.interval_spin = Gtk.SpinButton.new_with_range(0.2, 60, 0.1)
+        self.interval_spin.set_digits(1)
+        self.interval_spin.set_value(INTERVAL)
+        ctrl.append(self.interval_spin)
+        ctrl.append(Gtk.Label(label="s"))
         self.start_btn = Gtk.Button(label="Start")
         self.start_btn.connect("clicked", self.on_toggle)
         ctrl.append(self.start_btn)
         vbox.append(ctrl)
 
-        for host in ["8.8.8.8", "1.1.1.1", "google.com"]:
-            self.monitors[host] = HostMonitor(host)
+        self.hosts = ["8.8.8.8", "1.1.1.1", "google.com"]
 
         self.stats_grid = Gtk.Grid()
         self.stats_grid.set_column_spacing(12); self.stats_grid.set_row_spacing(4)
-        for i, h in enumerate(["Host", "Last", "Min", "Avg", "Max", "Loss%", "Status"]):
+        for i, h in enumerate(COLUMNS):
             lbl = Gtk.Label(label=h, xalign=0)
             lbl.set_markup(f"<b>{h}</b>")
             self.stats_grid.attach(lbl, i, 0, 1, 1)
@@ -89,66 +64,85 @@ class PingMonitorWindow(Gtk.ApplicationWindow):
         vbox.append(graph_frame)
 
     def update_stats_grid(self):
-        while self.stats_grid.get_child_at(0, len(self.monitors) + 2):
-            self.stats_grid.remove_row(len(self.monitors) + 2)
-        for row_idx, (host, mon) in enumerate(self.monitors.items(), 1):
-            if host not in self.host_rows:
-                labels = []
-                for col in range(7):
-                    lbl = Gtk.Label(label="-", xalign=0)
-                    self.stats_grid.attach(lbl, col, row_idx, 1, 1)
-                    labels.append(lbl)
-                del_btn = Gtk.Button(label="×")
-                del_btn.connect("clicked", self.on_remove, host)
-                self.stats_grid.attach(del_btn, 7, row_idx, 1, 1)
-                self.host_rows[host] = labels
+        while self.stats_grid.get_child_at(0, 1):
+            self.stats_grid.remove_row(1)
+        self.host_rows = {}
+        for row_idx, host in enumerate(self.hosts, 1):
+            labels = []
+            for col in range(len(COLUMNS)):
+                lbl = Gtk.Label(label=host if col == 0 else "-", xalign=0)
+                self.stats_grid.attach(lbl, col, row_idx, 1, 1)
+                labels.append(lbl)
+            del_btn = Gtk.Button(label="×")
+            del_btn.connect("clicked", self.on_remove, host)
+            self.stats_grid.attach(del_btn, len(COLUMNS), row_idx, 1, 1)
+            self.host_rows[host] = labels
 
     def on_add_host(self, btn):
         host = self.host_entry.get_text().strip()
-        if host and host not in self.monitors:
-            self.monitors[host] = HostMonitor(host)
+        if host and host not in self.hosts:
+            self.hosts.append(host)
+            if self.prober is not None:
+                self.monitors[host] = self.prober.add(host)
             self.update_stats_grid()
             self.host_entry.set_text("")
 
     def on_remove(self, btn, host):
-        if host in self.monitors:
-            del self.monitors[host]
-            if host in self.host_rows:
-                del self.host_rows[host]
+        if host in self.hosts:
+            self.hosts.remove(host)
+            self.monitors.pop(host, None)
+            if self.prober is not None:
+                self.prober.remove(host)
             self.update_stats_grid()
+            self.graph.queue_draw()
+
+    def on_close_request(self, win):
+        if self.prober is not None:
+            self.prober.stop()
+        return False
 
     def on_toggle(self, btn):
-        if self.running:
-            self.running = False
+        if self.prober is not None:
+            self.prober.stop()
+            self.prober = None
             self.start_btn.set_label("Start")
         else:
-            self.running = True
+            self.prober = Prober(interval=self.interval_spin.get_value(), on_update=self.post_update)
+            self.monitors = {host: self.prober.add(host) for host in self.hosts}
+            self.prober.start()
             self.start_btn.set_label("Stop")
-            threading.Thread(target=self.ping_loop, daemon=True).start()
-
-    def ping_loop(self):
-        while self.running:
-            for host, mon in list(self.monitors.items()):
-                threading.Thread(target=self.do_ping, args=(mon,), daemon=True).start()
-            GLib.idle_add(self.refresh_ui)
-            time.sleep(2)
+            self.refresh_ui()
 
-    def do_ping(self, mon):
-        mon.ping()
+    def post_update(self, hosts):
+        """Called from the prober thread; one idle callback refreshes everything pending."""
+        with self.post_lock:
+            if self.posted:
+                return
+            self.posted = True
+        GLib.idle_add(self.refresh_ui)
 
     def refresh_ui(self):
+        with self.post_lock:
+            self.posted = False
         for host, mon in self.monitors.items():
             if host in self.host_rows:
                 labels = self.host_rows[host]
-                last = mon.history[-1] if mon.history else -1
-                labels[0].set_text(host)
-                labels[1].set_text(f"{last:.1f}ms" if last >= 0 else "timeout")
-                labels[2].set_text(f"{mon.min_ms:.1f}" if mon.min_ms != float('inf') else "-")
-                labels[3].set_text(f"{mon.avg_ms:.1f}" if mon.avg_ms else "-")
-                labels[4].set_text(f"{mon.max_ms:.1f}" if mon.max_ms else "-")
-                labels[5].set_text(f"{mon.packet_loss():.0f}%")
-                status = "OK" if last >= 0 else "FAIL"
-                labels[6].set_markup(f'<span foreground="{"green" if last >= 0 else "red"}">{status}</span>')
+                last = mon.last_ms
+                answered = mon.received + mon.lost
+                labels[1].set_text(f"{last:.1f}ms" if last >= 0 else ("timeout" if answered else "-"))
+                labels[2].set_text(f"{mon.min_ms:.1f}" if mon.received else "-")
+                labels[3].set_text(f"{mon.ewma_ms:.1f}" if mon.received else "-")
+                labels[4].set_text(f"{mon.max_ms:.1f}" if mon.received else "-")
+                labels[5].set_text(f"{mon.jitter_ms:.1f}" if mon.received > 1 else "-")
+                labels[6].set_text(f"{mon.percentile(95):.1f}" if mon.received else "-")
+                labels[7].set_text(f"{mon.packet_loss():.0f}%")
+                if mon.error and last < 0:
+                    labels[8].set_markup(f'<span foreground="red">{GLib.markup_escape_text(mon.error)}</span>')
+                elif answered:
+                    status = "OK" if last >= 0 else "FAIL"
+                    if last >= 0 and mon.method == "tcp":
+                        status += " (tcp)"
+                    labels[8].set_markup(f'<span foreground="{"green" if last >= 0 else "red"}">{status}</span>')
         self.graph.queue_draw()
         return False
 
@@ -157,14 +151,14 @@ class PingMonitorWindow(Gtk.ApplicationWindow):
         cr.rectangle(0, 0, w, h); cr.fill()
         colors = [(0.8,0.2,0.2), (0.2,0.8,0.2), (0.2,0.2,0.8), (0.8,0.8,0.2)]
         for idx, (host, mon) in enumerate(self.monitors.items()):
-            hist = [v for v in mon.history if v >= 0]
+            pts = list(mon.history)     # one copy; the prober thread appends to it
+            hist = [v for v in pts if v >= 0]
             if len(hist) < 2: continue
             mx = max(hist) or 1
             r, g, b = colors[idx % len(colors)]
             cr.set_source_rgb(r, g, b)
             cr.set_line_width(1.5)
             step = w / (MAX_HISTORY - 1)
-            pts = list(mon.history)
             valid_start = None
             for i, v in enumerate(pts):
                 x = i * step
@@ -181,7 +175,7 @@ class PingMonitorWindow(Gtk.ApplicationWindow):
             cr.set_font_size(10)
             cr.move_to(4, (idx + 1) * 14)
             cr.set_source_rgb(r, g, b)
-            cr.show_text(f"{host}: avg={mon.avg_ms:.1f}ms")
+            cr.show_text(f"{host}: avg={mon.ewma_ms:.1f}ms")
 
 class PingMonitorApp(Gtk.Application):
     def __init__(self):
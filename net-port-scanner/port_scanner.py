@@ -2,7 +2,8 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import socket, threading
+import threading
+from scan_engine import PortScanner, parse_targets, CONCURRENCY
 
 COMMON_PORTS = {
     21: "FTP", 22: "SSH", 23: "Telnet", 25: "SMTP", 53: "DNS",
@@ -28,11 +29,16 @@ class PortScannerWindow(Gtk.ApplicationWindow):
         vbox.append(Gtk.Label(label="Port Scanner", css_classes=["title"]))
 
         host_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
-        host_box.append(Gtk.Label(label="Host:"))
+        host_box.append(Gtk.Label(label="Hosts:"))
         self.host_entry = Gtk.Entry()
         self.host_entry.set_text("localhost")
+        self.host_entry.set_placeholder_text("host, 192.168.1.0/24, ...")
         self.host_entry.set_hexpand(True)
         host_box.append(self.host_entry)
+        host_box.append(Gtk.Label(label="Parallel:"))
+        self.window_spin = Gtk.SpinButton.new_with_range(1, 4096, 64)
+        self.window_spin.set_value(CONCURRENCY)
+        host_box.append(self.window_spin)
         vbox.append(host_box)
 
         range_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
@@ -79,6 +85,8 @@ class PortScannerWindow(Gtk.ApplicationWindow):
     def on_scan(self, btn):
         if self.scanning: return
         host = self.host_entry.get_text().strip()
+        if not host:
+            return
         mode = self.mode_combo.get_active()
         if mode == 0:
             ports = sorted(COMMON_PORTS.keys())
@@ -93,50 +101,57 @@ class PortScannerWindow(Gtk.ApplicationWindow):
         self.stop_btn.set_sensitive(True)
         self.results_view.get_buffer().set_text("")
         self.progress.set_fraction(0)
-        self.status_label.set_text(f"Scanning {host} — {len(ports)} ports...")
-        threading.Thread(target=self.scan_ports, args=(host, ports), daemon=True).start()
+        self.status_label.set_text(f"Resolving {host}...")
+        scanner = PortScanner(concurrency=int(self.window_spin.get_value()))
+        threading.Thread(target=self.scan_ports, args=(scanner, host, ports),
+                         daemon=True).start()
 
     def on_stop(self, btn):
         self.stop_requested = True
 
-    def scan_ports(self, host, ports):
-        open_ports = []
-        total = len(ports)
-        for i, port in enumerate(ports):
-            if self.stop_requested:
-                break
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(0.5)
-                result = sock.connect_ex((host, port))
-                sock.close()
-                if result == 0:
-                    service = COMMON_PORTS.get(port, "unknown")
-                    open_ports.append((port, service))
-                    GLib.idle_add(self.add_result, port, service)
-            except Exception:
-                pass
-            GLib.idle_add(self.update_progress, (i + 1) / total, i + 1, total)
-        GLib.idle_add(self.scan_done, open_ports, host)
-
-    def add_result(self, port, service):
-        buf = self.results_view.get_buffer()
-        end = buf.get_end_iter()
-        buf.insert(end, f"OPEN  {port:5d}/tcp  {service}\n")
-        return False
-
-    def update_progress(self, frac, done, total):
-        self.progress.set_fraction(frac)
+    def scan_ports(self, scanner, host, ports):
+        # parse_targets resolves host names, so it runs here rather than on the main loop
+        try:
+            targets = parse_targets(host)
+            if not targets:
+                raise ValueError("no targets")
+        except ValueError as e:
+            GLib.idle_add(self.status_label.set_text, str(e))
+            GLib.idle_add(self.scan_done, scanner, None, host)
+            return
+        GLib.idle_add(self.status_label.set_text, f"Scanning {host} — {len(ports) * len(targets)} ports...")
+        multi = len(targets) > 1
+        def on_progress(done, total, new_open):
+            GLib.idle_add(self.update_progress, done, total, new_open, multi)
+        try:
+            found = scanner.scan(targets, ports, on_progress, lambda: self.stop_requested)
+        except OSError as e:
+            found = None
+            GLib.idle_add(self.status_label.set_text, f"Scan failed: {e}")
+        GLib.idle_add(self.scan_done, scanner, found, host)
+
+    def update_progress(self, done, total, new_open, multi):
+        if new_open:
+            buf = self.results_view.get_buffer()
+            buf.insert(buf.get_end_iter(), "".join(
+                f"OPEN  {addr + '  ' if multi else ''}{port:5d}/tcp  {COMMON_PORTS.get(port, 'unknown')}\n"
+                for addr, port in new_open))
+        self.progress.set_fraction(done / total if total else 1.0)
         self.status_label.set_text(f"Scanning: {done}/{total}")
         return False
 
-    def scan_done(self, open_ports, host):
+    def scan_done(self, scanner, found, host):
         self.scanning = False
         self.scan_btn.set_sensitive(True)
         self.stop_btn.set_sensitive(False)
         self.progress.set_fraction(1.0)
+        if found is None and not self.stop_requested:
+            return False
         status = "stopped" if self.stop_requested else "complete"
-        self.status_label.set_text(f"Scan {status} — {len(open_ports)} open port(s) on {host}")
+        rate = (scanner.open + scanner.closed + scanner.filtered) / scanner.elapsed if scanner.elapsed else 0
+        self.status_label.set_text(
+            f"Scan {status} — {scanner.open} open, {scanner.closed} closed, "
+            f"{scanner.filtered} filtered on {host} ({rate:.0f} ports/s)")
         return False
 
 class PortScannerApp(Gtk.Application):
@@ -2,13 +2,11 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import urllib.request, threading, time, collections
+import threading, collections
+from throughput import SpeedTest, STREAMS
 
-TEST_URLS = [
-    "http://speed.cloudflare.com/__down?bytes=10000000",
-    "http://ipv4.download.thinkbroadband.com/10MB.zip",
-    "http://proof.ovh.net/files/10Mb.dat",
-]
+# anything answering /__down?bytes=N and /__up; `python3 throughput.py --serve` runs one locally
+TEST_SERVER = "http://speed.cloudflare.com"
 
 MAX_HISTORY = 20
 
@@ -36,15 +34,27 @@ class SpeedTestWindow(Gtk.ApplicationWindow):
         self.speed_label.set_css_classes(["speed-display"])
         vbox.append(self.speed_label)
 
-        self.unit_label = Gtk.Label(label="MB/s")
+        self.unit_label = Gtk.Label(label="Mbps")
         vbox.append(self.unit_label)
 
         self.progress = Gtk.ProgressBar()
         self.progress.set_show_text(True)
         vbox.append(self.progress)
 
+        self.streams_label = Gtk.Label(label="")
+        vbox.append(self.streams_label)
+
         ctrl = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         ctrl.set_halign(Gtk.Align.CENTER)
+        ctrl.append(Gtk.Label(label="Server:"))
+        self.server_entry = Gtk.Entry()
+        self.server_entry.set_text(TEST_SERVER)
+        self.server_entry.set_width_chars(28)
+        ctrl.append(self.server_entry)
+        ctrl.append(Gtk.Label(label="Streams:"))
+        self.streams_spin = Gtk.SpinButton.new_with_range(1, 16, 1)
+        self.streams_spin.set_value(STREAMS)
+        ctrl.append(self.streams_spin)
         self.test_btn = Gtk.Button(label="Start Speed Test")
         self.test_btn.connect("clicked", self.on_test)
         ctrl.append(self.test_btn)
@@ -68,59 +78,55 @@ class SpeedTestWindow(Gtk.ApplicationWindow):
         self.testing = True
         self.test_btn.set_sensitive(False)
         self.progress.set_fraction(0)
-        self.status_label.set_text("Testing download speed...")
-        threading.Thread(target=self.do_test, daemon=True).start()
-
-    def do_test(self):
-        best_speed = 0
-        for url in TEST_URLS:
-            try:
-                GLib.idle_add(self.update_status, f"Trying: {url[:60]}...")
-                start = time.time()
-                with urllib.request.urlopen(url, timeout=15) as resp:
-                    total = 0
-                    chunk_size = 65536
-                    while True:
-                        chunk = resp.read(chunk_size)
-                        if not chunk: break
-                        total += len(chunk)
-                        elapsed = time.time() - start
-                        if elapsed > 0:
-                            speed = total / elapsed / 1e6
-                            GLib.idle_add(self.update_live, speed, total)
-                    elapsed = time.time() - start
-                    if elapsed > 0 and total > 0:
-                        speed = total / elapsed / 1e6
-                        best_speed = max(best_speed, speed)
-                        break
-            except Exception as e:
-                GLib.idle_add(self.update_status, f"Failed: {e}")
-                continue
-        GLib.idle_add(self.test_done, best_speed)
-
-    def update_live(self, speed, total):
-        self.speed_label.set_text(f"{speed:.2f}")
-        self.progress.set_fraction(min(1.0, total / 10e6))
-        self.progress.set_text(f"{total/1e6:.1f} MB downloaded")
+        self.status_label.set_text("Measuring latency...")
+        test = SpeedTest(self.server_entry.get_text().strip().rstrip("/"),
+                         streams=int(self.streams_spin.get_value()))
+        threading.Thread(target=self.do_test, args=(test,), daemon=True).start()
+
+    def do_test(self, test):
+        try:
+            result = test.run(lambda *sample: GLib.idle_add(self.update_live, *sample))
+        except Exception as e:
+            GLib.idle_add(self.update_status, f"Failed: {e}")
+            result = None
+        GLib.idle_add(self.test_done, result)
+
+    def update_live(self, phase, fraction, per_stream, mbps, loaded_ms):
+        """One sample from the engine; they arrive at a fixed rate."""
+        self.speed_label.set_text(f"{mbps:.1f}")
+        half = 0.5 if phase == "upload" else 0.0
+        self.progress.set_fraction(half + fraction / 2)
+        self.progress.set_text(phase.capitalize())
+        self.streams_label.set_text("Streams: " + "  ".join(f"{m:.1f}" for m in per_stream) + " Mbps")
+        if loaded_ms is not None:
+            self.status_label.set_text(f"Testing {phase}... latency under load {loaded_ms:.1f} ms")
         return False
 
     def update_status(self, text):
         self.status_label.set_text(text)
         return False
 
-    def test_done(self, speed):
+    def test_done(self, result):
         self.testing = False
         self.test_btn.set_sensitive(True)
+        speed = result["download_mbps"] if result else 0
         if speed > 0:
             self.history.append(speed)
-            self.speed_label.set_text(f"{speed:.2f}")
-            self.status_label.set_text(f"Download: {speed:.2f} MB/s ({speed*8:.1f} Mbps)")
+            self.speed_label.set_text(f"{speed:.1f}")
+            loaded = result["download_loaded_ms"]
+            self.status_label.set_text(
+                f"Download: {speed:.1f} Mbps | Upload: {result['upload_mbps']:.1f} Mbps | "
+                f"Latency: {result['latency_ms']:.1f} ms idle"
+                + (f", {loaded:.1f} ms loaded" if loaded is not None else ""))
+            self.streams_label.set_text("Streams: " + "  ".join(
+                f"{m:.1f}" for m in result["download_streams"]) + " Mbps")
             avg = sum(self.history) / len(self.history)
             mx = max(self.history)
-            self.history_label.set_text(f"Tests: {len(self.history)} | Avg: {avg:.2f} MB/s | Max: {mx:.2f} MB/s")
+            self.history_label.set_text(f"Tests: {len(self.history)} | Avg: {avg:.1f} Mbps | Max: {mx:.1f} Mbps")
         else:
             self.speed_label.set_text("--")
-            self.status_label.set_text("Speed test failed — check internet connection")
+            if result is not None:
+                self.status_label.set_text("Speed test failed — check internet connection")
         self.progress.set_fraction(1.0)
         self.graph.queue_draw()
         return False
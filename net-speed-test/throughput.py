@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Throughput engine for the Speed Test app.
+
+A test runs three phases against a server speaking the Cloudflare speed
+test protocol (GET /__down?bytes=N, POST /__up):
+
+  latency   a few empty requests on an idle keep-alive connection
+  download  N parallel streams, each fetching large bodies back to back
+  upload    N parallel streams, each posting large bodies back to back
+
+Each transfer phase runs for a fixed duration. The first `warmup`
+seconds are not counted, so TCP slow start and connection setup do not
+drag the result down. While a phase runs, a separate connection keeps
+timing empty requests: the latency under load.
+
+Streams read with readinto() into one preallocated buffer per stream and
+upload from a preallocated buffer, so a transfer allocates nothing per
+chunk. Streams only bump a byte counter. The caller's thread samples the
+counters every sample interval and passes per-stream and aggregate Mbps
+to on_sample, so the UI gets a fixed rate of updates however fast the
+link is.
+
+Run `python3 throughput.py --serve [PORT]` for a local server to test
+against, or with no arguments to time a test against one started
+in-process.
+"""
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+STREAMS = 4
+DURATION = 8.0          # seconds per transfer phase, warm-up included
+WARMUP = 2.0
+SAMPLE_INTERVAL = 0.25
+BUFFER = 256 * 1024
+REQUEST_BYTES = 25_000_000
+LATENCY_PROBES = 5
+PROBE_INTERVAL = 0.2
+TIMEOUT = 10
+
+
+def _connect(base):
+    parts = urlsplit(base)
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=TIMEOUT)
+
+
+def _path(base, path):
+    prefix = urlsplit(base).path.rstrip("/")
+    return prefix + path
+
+
+class _Stream(threading.Thread):
+    def __init__(self, base, upload, stop):
+        super().__init__(daemon=True)
+        self.base = base
+        self.upload = upload
+        self.stop = stop
+        self.bytes = 0
+        self.error = None
+
+    def run(self):
+        buf = bytearray(BUFFER)
+        view = memoryview(buf)
+        conn = _connect(self.base)
+        try:
+            while not self.stop.is_set():
+                if self.upload:
+                    self._post(conn, view)
+                else:
+                    self._get(conn, view)
+        except (OSError, http.client.HTTPException) as e:
+            if not self.stop.is_set():
+                self.error = str(e) or type(e).__name__
+        finally:
+            conn.close()
+
+    def _get(self, conn, view):
+        conn.request("GET", _path(self.base, f"/__down?bytes={REQUEST_BYTES}"))
+        resp = conn.getresponse()
+        if resp.status != 200:
+            raise http.client.HTTPException(f"HTTP {resp.status}")
+        stop = self.stop
+        while True:
+            n = resp.readinto(view)
+            if not n:
+                return
+            self.bytes += n
+            if stop.is_set():
+                return
+
+    def _post(self, conn, view):
+        conn.putrequest("POST", _path(self.base, "/__up"))
+        conn.putheader("Content-Type", "application/octet-stream")
+        conn.putheader("Content-Length", str(REQUEST_BYTES))
+        conn.endheaders()
+        sent = 0
+        stop = self.stop
+        while sent < REQUEST_BYTES:
+            chunk = view[:min(BUFFER, REQUEST_BYTES - sent)]
+            conn.sock.sendall(chunk)
+            sent += len(chunk)
+            self.bytes += len(chunk)
+            if stop.is_set():
+                return
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise http.client.HTTPException(f"HTTP {resp.status}")
+
+
+class _Pinger(threading.Thread):
+    """Times empty requests on its own connection until stopped."""
+
+    def __init__(self, base, stop, count=None):
+        super().__init__(daemon=True)
+        self.base = base
+        self.stop = stop
+        self.count = count
+        self.samples = []
+
+    def run(self):
+        conn = _connect(self.base)
+        path = _path(self.base, "/__down?bytes=0")
+        try:
+            while not self.stop.is_set() and (self.count is None or len(self.samples) < self.count):
+                start = time.perf_counter()
+                conn.request("GET", path)
+                conn.getresponse().read()
+                self.samples.append((time.perf_counter() - start) * 1000)
+                if self.count is None:
+                    self.stop.wait(PROBE_INTERVAL)
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+
+    def median(self):
+        return statistics.median(self.samples) if self.samples else None
+
+
+class SpeedTest:
+    def __init__(self, base, streams=STREAMS, duration=DURATION, warmup=WARMUP,
+                 sample_interval=SAMPLE_INTERVAL):
+        self.base = base
+        self.streams = streams
+        self.duration = duration
+        self.warmup = warmup
+        self.sample_interval = sample_interval
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self, on_sample=None, phases=("latency", "download", "upload")):
+        """Run the phases; returns a dict of results (Mbps, ms) or None if cancelled.
+
+        on_sample(phase, fraction done, per-stream Mbps, aggregate Mbps,
+        latest loaded latency in ms or None) is called from this thread once
+        per sample interval.
+        """
+        result = {}
+        if "latency" in phases:
+            pinger = _Pinger(self.base, self._cancel, LATENCY_PROBES)
+            pinger.run()
+            if not pinger.samples:
+                raise OSError(f"no response from {self.base}")
+            result["latency_ms"] = pinger.median()
+        for phase in ("download", "upload"):
+            if phase not in phases:
+                continue
+            measured = self._transfer(phase == "upload", phase, on_sample)
+            if measured is None:
+                return None
+            mbps, per_stream, loaded = measured
+            result[f"{phase}_mbps"] = mbps
+            result[f"{phase}_streams"] = per_stream
+            result[f"{phase}_loaded_ms"] = loaded
+        return result
+
+    def _transfer(self, upload, phase, on_sample):
+        stop = threading.Event()
+        streams = [_Stream(self.base, upload, stop) for _ in range(self.streams)]
+        pinger = _Pinger(self.base, stop)
+        start = time.monotonic()
+        for s in streams:
+            s.start()
+        pinger.start()
+        last = [0] * len(streams)
+        last_time = start
+        base_bytes = None
+        base_time = None
+        warmup = min(self.warmup, self.duration / 2)
+        try:
+            while True:
+                if self._cancel.wait(self.sample_interval):
+                    return None
+                now = time.monotonic()
+                counts = [s.bytes for s in streams]
+                dt = now - last_time
+                rates = [(c - p) * 8 / dt / 1e6 for c, p in zip(counts, last)]
+                last, last_time = counts, now
+                if base_bytes is None and now - start >= warmup:
+                    base_bytes, base_time = counts, now
+                if on_sample is not None:
+                    latest = pinger.samples[-1] if pinger.samples else None
+                    on_sample(phase, min(1.0, (now - start) / self.duration), rates, sum(rates), latest)
+                if now - start >= self.duration:
+                    break
+                if all(not s.is_alive() for s in streams):
+                    errors = [s.error for s in streams if s.error]
+                    raise OSError(errors[0] if errors else "all streams ended")
+        finally:
+            stop.set()
+        if now <= base_time:           # too short to leave anything after the warm-up
+            base_bytes, base_time = [0] * len(streams), start
+        span = now - base_time
+        per_stream = [(c - b) * 8 / span / 1e6 for c, b in zip(counts, base_bytes)]
+        return sum(per_stream), per_stream, pinger.median()
+
+
+def serve(port=8080, host="127.0.0.1"):
+    """A ThreadingHTTPServer answering /__down and /__up; returns it, already serving."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    zeros = bytes(BUFFER)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if not self.path.split("?")[0].endswith("/__down"):
+                self.send_error(404)
+                return
+            try:
+                n = int(self.path.split("bytes=", 1)[1].split("&")[0])
+            except (IndexError, ValueError):
+                n = 0
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(n))
+            self.end_headers()
+            view = memoryview(zeros)
+            while n > 0:
+                k = min(n, len(zeros))
+                self.wfile.write(view[:k])
+                n -= k
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length", 0))
+            buf = memoryview(bytearray(BUFFER))
+            while n > 0:
+                k = self.rfile.readinto(buf[:min(n, BUFFER)])
+                if not k:
+                    break
+                n -= k
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass            # clients drop connections mid-body when a phase ends
+
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+        serve(port, "0.0.0.0")
+        print(f"serving /__down and /__up on port {port}")
+        threading.Event().wait()
+    server = serve(0)
+    base = f"http://127.0.0.1:{server.server_port}"
+    for streams in (1, 4):
+        samples = []
+        test = SpeedTest(base, streams=streams, duration=3.0, warmup=1.0)
+        cpu = time.process_time()
+        result = test.run(lambda *sample: samples.append(sample))
+        cpu = time.process_time() - cpu
+        print(f"{streams} stream(s): latency {result['latency_ms']:.2f} ms, "
+              f"down {result['download_mbps']:.0f} Mbps "
+              f"({' '.join(f'{m:.0f}' for m in result['download_streams'])}), "
+              f"up {result['upload_mbps']:.0f} Mbps, loaded latency "
+              f"{result['download_loaded_ms'] or 0:.2f}/{result['upload_loaded_ms'] or 0:.2f} ms, "
+              f"{len(samples)} samples, {cpu:.1f} s CPU (client and server)")
@@ -2,13 +2,19 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import urllib.request, threading, time
+import threading
+from url_pool import UrlChecker
 
 class UrlCheckerWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         super().__init__(application=app)
         self.set_title("URL Checker")
         self.set_default_size(800, 600)
+        self.posted = []            # results from the checker waiting for the main loop
+        self.post_lock = threading.Lock()
+        self.counts = [0, 0, 0]     # ok, warnings, errors
+        self.total = 0
+        self.done = 0
         self.build_ui()
 
     def build_ui(self):
@@ -33,6 +39,9 @@ class UrlCheckerWindow(Gtk.ApplicationWindow):
         self.check_btn = Gtk.Button(label="Check All URLs")
         self.check_btn.connect("clicked", self.on_check)
         ctrl.append(self.check_btn)
+        load_btn = Gtk.Button(label="Load List…")
+        load_btn.connect("clicked", self.on_load)
+        ctrl.append(load_btn)
         self.progress = Gtk.ProgressBar()
         self.progress.set_hexpand(True)
         ctrl.append(self.progress)
@@ -58,6 +67,21 @@ class UrlCheckerWindow(Gtk.ApplicationWindow):
         results_frame.set_child(results_scroll)
         vbox.append(results_frame)
 
+    def on_load(self, btn):
+        dialog = Gtk.FileDialog(); dialog.open(self, None, self.on_file)
+
+    def on_file(self, dialog, result):
+        try:
+            f = dialog.open_finish(result)
+        except GLib.Error:
+            return                  # dismissed
+        if not f: return
+        path = f.get_path()
+        try:
+            with open(path) as fp: self.url_view.get_buffer().set_text(fp.read())
+        except (OSError, UnicodeDecodeError) as e:
+            self.status_label.set_text(f"Cannot read {path}: {getattr(e, 'strerror', None) or e}")
+
     def on_check(self, btn):
         buf = self.url_view.get_buffer()
         text = buf.get_text(buf.get_start_iter(), buf.get_end_iter(), True)
@@ -66,63 +90,55 @@ class UrlCheckerWindow(Gtk.ApplicationWindow):
         self.check_btn.set_sensitive(False)
         self.results_buf.set_text("")
         self.progress.set_fraction(0)
+        self.counts = [0, 0, 0]
+        self.total, self.done = len(urls), 0
         self.status_label.set_text(f"Checking {len(urls)} URL(s)...")
         threading.Thread(target=self.check_urls, args=(urls,), daemon=True).start()
 
     def check_urls(self, urls):
-        results = [None] * len(urls)
-        lock = threading.Lock()
-        done = [0]
-
-        def check_one(i, url):
-            t0 = time.time()
-            try:
-                req = urllib.request.Request(url, method="HEAD",
-                    headers={"User-Agent": "URL-Checker/1.0"})
-                with urllib.request.urlopen(req, timeout=10) as resp:
-                    elapsed = time.time() - t0
-                    ct = resp.headers.get("Content-Type", "")
-                    results[i] = (url, resp.status, elapsed, ct, [])
-            except urllib.error.HTTPError as e:
-                elapsed = time.time() - t0
-                results[i] = (url, e.code, elapsed, "", [])
-            except Exception as e:
-                elapsed = time.time() - t0
-                results[i] = (url, 0, elapsed, "", [str(e)])
-            with lock:
-                done[0] += 1
-                GLib.idle_add(self.update_progress, done[0] / len(urls))
-            if all(r is not None for r in results):
-                GLib.idle_add(self.show_results, results)
-
-        threads = [threading.Thread(target=check_one, args=(i, url), daemon=True)
-                   for i, url in enumerate(urls)]
-        for t in threads:
-            t.start()
-
-    def update_progress(self, frac):
-        self.progress.set_fraction(frac)
+        UrlChecker().check(urls, self.post_result)
+        GLib.idle_add(self.check_done)
+
+    def post_result(self, i, result):
+        """Queue a result for the main loop; one idle callback shows everything queued."""
+        with self.post_lock:
+            queued = bool(self.posted)
+            self.posted.append(result)
+        if not queued:
+            GLib.idle_add(self.flush_results)
+
+    def flush_results(self):
+        with self.post_lock:
+            results, self.posted = self.posted, []
+        self.show_results(results)
         return False
 
     def show_results(self, results):
-        self.results_buf.set_text("")
-        ok_count = warn_count = error_count = 0
         for url, status, elapsed, ct, errors in results:
             end = self.results_buf.get_end_iter()
             if 200 <= status < 300:
-                tag = "ok"; ok_count += 1; indicator = "OK  "
+                tag = "ok"; self.counts[0] += 1; indicator = "OK  "
             elif 400 <= status < 600:
                 tag = "warn" if status < 500 else "error"
-                if status < 500: warn_count += 1
-                else: error_count += 1
+                if status < 500: self.counts[1] += 1
+                else: self.counts[2] += 1
                 indicator = "FAIL"
             else:
-                tag = "error"; error_count += 1; indicator = "ERR "
+                tag = "error"; self.counts[2] += 1; indicator = "ERR "
             line = f"{indicator} {status:3d}  {elapsed*1000:.0f}ms  {url[:60]}\n"
             self.results_buf.insert_with_tags_by_name(end, line, tag)
             if errors:
                 end = self.results_buf.get_end_iter()
                 self.results_buf.insert_with_tags_by_name(end, f"       {errors[0]}\n", "error")
+        self.done += len(results)
+        self.progress.set_fraction(self.done / self.total)
+        ok_count, warn_count, error_count = self.counts
+        self.status_label.set_text(f"Checked {self.done}/{self.total}: {ok_count} OK, "
+                                   f"{warn_count} warnings, {error_count} errors")
+
+    def check_done(self):
+        self.flush_results()
+        ok_count, warn_count, error_count = self.counts
         self.status_label.set_text(f"Done: {ok_count} OK, {warn_count} warnings, {error_count} errors")
         self.check_btn.set_sensitive(True)
         return False
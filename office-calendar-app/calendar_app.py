@@ -2,7 +2,13 @@
 import gi
 gi.require_version("Gtk", "4.0")
 from gi.repository import Gtk, GLib
-import json, os, datetime, calendar as cal
+import os, sys, datetime, calendar as cal
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.CalendarApp")
 DATA_FILE = os.path.join(DATA_DIR, "events.json")
@@ -17,13 +23,13 @@ class CalendarAppWindow(Gtk.ApplicationWindow):
         self.selected_date = self.today
         self.build_ui()
         self.draw_calendar()
+        self.connect("close-request", self.on_close_request)
 
     def load_events(self):
-        try:
-            with open(DATA_FILE) as f: return json.load(f)
-        except Exception: return {}
-    def save_events(self):
-        with open(DATA_FILE, "w") as f: json.dump(self.events, f)
+        self.store = journal_store.JournalStore(DATA_FILE, {})
+        return self.store.data
+    def on_close_request(self, win):
+        self.store.close(); return False
 
     def build_ui(self):
         hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
@@ -103,15 +109,15 @@ class CalendarAppWindow(Gtk.ApplicationWindow):
         title = self.event_title.get_text().strip()
         if not title: return
         day_str = self.selected_date.isoformat()
-        if day_str not in self.events: self.events[day_str] = []
-        self.events[day_str].append({"title": title, "time": self.event_time.get_text()})
-        self.save_events(); self.event_title.set_text(""); self.event_time.set_text("")
+        if day_str not in self.events: self.store.set((day_str,), [])
+        self.store.append((day_str,), {"title": title, "time": self.event_time.get_text()})
+        self.event_title.set_text(""); self.event_time.set_text("")
         self.load_day_events(self.selected_date); self.draw_calendar()
 
     def on_del_event(self, btn, date, idx):
         day_str = date.isoformat()
         if day_str in self.events and idx < len(self.events[day_str]):
-            self.events[day_str].pop(idx); self.save_events()
+            self.store.delete((day_str, idx))
             self.load_day_events(date); self.draw_calendar()
 
     def on_prev_month(self, btn):
@@ -2,7 +2,13 @@
 import gi
 gi.require_version("Gtk", "4.0")
 from gi.repository import Gtk, Gdk
-import json, os
+import os, sys
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.ContactBook")
 DATA_FILE = os.path.join(DATA_DIR, "contacts.json")
@@ -38,14 +44,13 @@ class ContactBookWindow(Gtk.ApplicationWindow):
         export_btn = Gtk.Button(label="Export VCard"); export_btn.connect("clicked", self.on_export); btn_row2.append(export_btn)
         right.append(btn_row2); hbox.append(right)
         self.refresh_list(None)
+        self.connect("close-request", self.on_close_request)
 
     def load(self):
-        try:
-            with open(DATA_FILE) as f: return json.load(f)
-        except Exception: return []
-    def save_all(self):
-        os.makedirs(DATA_DIR, exist_ok=True)
-        with open(DATA_FILE, "w") as f: json.dump(self.contacts, f)
+        self.store = journal_store.JournalStore(DATA_FILE, [])
+        return self.store.data
+    def on_close_request(self, win):
+        self.store.close(); return False
 
     def refresh_list(self, *a):
         q = self.search.get_text().lower() if self.search else ""
@@ -63,17 +68,18 @@ class ContactBookWindow(Gtk.ApplicationWindow):
         self.avatar.queue_draw()
 
     def on_new(self, btn):
-        self.contacts.append({"name":"New Contact","phone":"","email":"","address":"","groups":""}); self.save_all(); self.refresh_list(None)
+        self.store.append((), {"name":"New Contact","phone":"","email":"","address":"","groups":""}); self.refresh_list(None)
 
     def on_delete(self, btn):
         if self.selected is not None:
-            self.contacts.pop(self.selected); self.selected = None; self.save_all(); self.refresh_list(None)
+            self.store.delete((self.selected,)); self.selected = None; self.refresh_list(None)
 
     def on_field_changed(self, entry, key):
         if self.selected is not None: self.contacts[self.selected][key] = entry.get_text()
 
     def on_save(self, btn):
-        self.save_all(); self.refresh_list(None)
+        if self.selected is not None: self.store.set((self.selected,), dict(self.contacts[self.selected]))
+        self.refresh_list(None)
 
     def on_export(self, btn):
         if self.selected is None: return
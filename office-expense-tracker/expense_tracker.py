@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import json, os, datetime, math
+import os, sys, datetime, math
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.ExpenseTracker")
 DATA_FILE = os.path.join(DATA_DIR, "expenses.json")
@@ -17,17 +23,15 @@ class ExpenseTrackerWindow(Gtk.ApplicationWindow):
         self.expenses = self.load_expenses()
         self.build_ui()
         self.refresh()
+        self.connect("close-request", self.on_close_request)
 
     def load_expenses(self):
-        try:
-            with open(DATA_FILE) as f:
-                return json.load(f)
-        except Exception:
-            return []
+        self.store = journal_store.JournalStore(DATA_FILE, [])
+        return self.store.data
 
-    def save_expenses(self):
-        with open(DATA_FILE, "w") as f:
-            json.dump(self.expenses, f)
+    def on_close_request(self, win):
+        self.store.close()
+        return False
 
     def build_ui(self):
         paned = Gtk.Paned(orientation=Gtk.Orientation.VERTICAL)
@@ -91,8 +95,7 @@ class ExpenseTrackerWindow(Gtk.ApplicationWindow):
             return
         exp = {"date": self.date_entry.get_text(), "amount": amount,
                "category": self.cat_combo.get_active_text(), "description": self.desc_entry.get_text()}
-        self.expenses.append(exp)
-        self.save_expenses()
+        self.store.append((), exp)
         self.amount_entry.set_text(""); self.desc_entry.set_text("")
         self.refresh()
 
@@ -2,7 +2,13 @@
 import gi
 gi.require_version("Gtk", "4.0")
 from gi.repository import Gtk
-import json, os, random, datetime
+import os, sys, random, datetime
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.Flashcards")
 DATA_FILE = os.path.join(DATA_DIR, "decks.json")
@@ -13,13 +19,13 @@ class FlashcardsWindow(Gtk.ApplicationWindow):
         os.makedirs(DATA_DIR, exist_ok=True)
         self.decks = self.load(); self.current_deck = None; self.study_cards = []; self.study_idx = 0; self.showing_front = True
         self.build_ui(); self.refresh_decks()
+        self.connect("close-request", self.on_close_request)
 
     def load(self):
-        try:
-            with open(DATA_FILE) as f: return json.load(f)
-        except Exception: return {}
-    def save(self):
-        with open(DATA_FILE, "w") as f: json.dump(self.decks, f)
+        self.store = journal_store.JournalStore(DATA_FILE, {})
+        return self.store.data
+    def on_close_request(self, win):
+        self.store.close(); return False
 
     def build_ui(self):
         hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0); self.set_child(hbox)
@@ -76,7 +82,7 @@ class FlashcardsWindow(Gtk.ApplicationWindow):
     def on_add_deck(self, btn):
         name = self.deck_entry.get_text().strip()
         if name and name not in self.decks:
-            self.decks[name] = []; self.save(); self.refresh_decks(); self.deck_entry.set_text("")
+            self.store.set((name,), []); self.refresh_decks(); self.deck_entry.set_text("")
 
     def on_deck_selected(self, listbox, row):
         if row: self.current_deck = row._deck_name; self.refresh_cards()
@@ -96,13 +102,13 @@ class FlashcardsWindow(Gtk.ApplicationWindow):
         if not self.current_deck: return
         front = self.front_entry.get_text().strip(); back = self.back_entry.get_text().strip()
         if front and back:
-            self.decks[self.current_deck].append({"front": front, "back": back, "ease": 2, "due": 0})
-            self.save(); self.front_entry.set_text(""); self.back_entry.set_text(""); self.refresh_cards()
+            self.store.append((self.current_deck,), {"front": front, "back": back, "ease": 2, "due": 0})
+            self.front_entry.set_text(""); self.back_entry.set_text(""); self.refresh_cards()
 
     def on_start_study(self, btn):
         if not self.current_deck: return
         now = datetime.date.today().toordinal()
-        deck = self.decks[self.current_deck]
+        self.study_deck = self.current_deck; deck = self.decks[self.study_deck]
         due = [c for c in deck if c.get("due", 0) <= now]
         self.study_cards = due if due else deck[:]
         random.shuffle(self.study_cards); self.study_idx = 0; self.showing_front = True
@@ -125,10 +131,11 @@ class FlashcardsWindow(Gtk.ApplicationWindow):
     def on_rate(self, btn, score):
         if not self.study_cards or self.study_idx >= len(self.study_cards): return
         card = self.study_cards[self.study_idx]
+        idx = next(i for i, c in enumerate(self.decks[self.study_deck]) if c is card)
         delay = {1: 1, 2: 3, 3: 7}.get(score, 1)
         card["due"] = datetime.date.today().toordinal() + delay
         card["ease"] = max(1, min(4, card.get("ease", 2) + (score - 2)))
-        self.save(); self.study_idx += 1; self.show_card()
+        self.store.set((self.study_deck, idx), dict(card)); self.study_idx += 1; self.show_card()
 
 class FlashcardsApp(Gtk.Application):
     def __init__(self): super().__init__(application_id="com.pens.Flashcards")
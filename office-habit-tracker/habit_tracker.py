@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import json, os, datetime
+import os, sys, datetime
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.HabitTracker")
 DATA_FILE = os.path.join(DATA_DIR, "habits.json")
@@ -18,17 +24,15 @@ class HabitTrackerWindow(Gtk.ApplicationWindow):
         self.view_month = datetime.date.today().replace(day=1)
         self.build_ui()
         self.refresh()
+        self.connect("close-request", self.on_close_request)
 
     def load_data(self):
-        try:
-            with open(DATA_FILE) as f:
-                return json.load(f)
-        except Exception:
-            return {"habits": [], "completions": {}}
+        self.store = journal_store.JournalStore(DATA_FILE, {"habits": [], "completions": {}})
+        return self.store.data
 
-    def save_data(self):
-        with open(DATA_FILE, "w") as f:
-            json.dump(self.data, f)
+    def on_close_request(self, win):
+        self.store.close()
+        return False
 
     def build_ui(self):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
@@ -75,8 +79,7 @@ class HabitTrackerWindow(Gtk.ApplicationWindow):
     def on_add_habit(self, btn):
         name = self.habit_entry.get_text().strip()
         if name and name not in self.data["habits"]:
-            self.data["habits"].append(name)
-            self.save_data()
+            self.store.append(("habits",), name)
             self.refresh()
             self.habit_entry.set_text("")
 
@@ -107,16 +110,14 @@ class HabitTrackerWindow(Gtk.ApplicationWindow):
     def on_habit_toggled(self, cb, habit):
         key = f"{self.today}:{habit}"
         if cb.get_active():
-            self.data["completions"][key] = True
+            self.store.set(("completions", key), True)
         elif key in self.data["completions"]:
-            del self.data["completions"][key]
-        self.save_data()
+            self.store.delete(("completions", key))
         self.grid_area.queue_draw()
         self.refresh_stats()
 
     def on_delete_habit(self, btn, habit):
-        self.data["habits"].remove(habit)
-        self.save_data()
+        self.store.delete(("habits", self.data["habits"].index(habit)))
         self.refresh()
 
     def on_prev_month(self, btn):
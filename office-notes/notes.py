@@ -1,21 +1,61 @@
 #!/usr/bin/env python3
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib, Gdk
-import json, os, time
+from gi.repository import Gtk, GLib, Gdk, Gio, GObject
+import hashlib, json, os, threading, time
+from note_index import NoteIndex, NoteWriter, write_atomic
 
 NOTES_DIR = os.path.expanduser("~/.local/share/com.pens.Notes")
+SAVE_DELAY_MS = 1000
+
+class NoteItem(GObject.Object):
+    def __init__(self, nid):
+        super().__init__()
+        self.nid = nid
+
+class NoteListModel(GObject.Object, Gio.ListModel):
+    """The ids shown in the note list; rows are built only for those on screen."""
+
+    def __init__(self):
+        super().__init__()
+        self.ids = []
+
+    def do_get_item_type(self):
+        return NoteItem.__gtype__
+
+    def do_get_n_items(self):
+        return len(self.ids)
+
+    def do_get_item(self, position):
+        if position >= len(self.ids):
+            return None
+        return NoteItem(self.ids[position])
+
+    def set_ids(self, ids):
+        old = len(self.ids)
+        self.ids = ids
+        self.items_changed(0, old, len(ids))
 
 class NotesWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         super().__init__(application=app)
         self.set_title("Notes")
         self.set_default_size(900, 640)
-        self.notes = {}
+        self.index = None
         self.current_id = None
+        self.current_note = None
+        self.saved_digest = None    # of the current note as last written
+        self.save_source = None
+        self.loading = False
+        self.deleted = set()
+        self.bound_rows = {}        # id -> row widget, for the rows on screen
+        self.sync_thread = None
+        self.closing = False
+        self.writer = NoteWriter()
         os.makedirs(NOTES_DIR, exist_ok=True)
         self.build_ui()
         self.load_all_notes()
+        self.connect("close-request", self.on_close_request)
 
     def build_ui(self):
         hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
@@ -39,9 +79,14 @@ class NotesWindow(Gtk.ApplicationWindow):
         left.append(self.search_entry)
 
         scroll = Gtk.ScrolledWindow(); scroll.set_vexpand(True)
-        self.note_list = Gtk.ListBox()
-        self.note_list.set_selection_mode(Gtk.SelectionMode.SINGLE)
-        self.note_list.connect("row-selected", self.on_note_selected)
+        self.note_model = NoteListModel()
+        self.note_selection = Gtk.SingleSelection(model=self.note_model, autoselect=False, can_unselect=True)
+        self.note_selection.connect("notify::selected", self.on_note_selected)
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_row_setup)
+        factory.connect("bind", self.on_row_bind)
+        factory.connect("unbind", self.on_row_unbind)
+        self.note_list = Gtk.ListView(model=self.note_selection, factory=factory)
         scroll.set_child(self.note_list)
         left.append(scroll)
         hbox.append(left)
@@ -100,92 +145,164 @@ class NotesWindow(Gtk.ApplicationWindow):
             buf.apply_tag_by_name(tag_name, start, end)
 
     def load_all_notes(self):
-        for fn in os.listdir(NOTES_DIR):
-            if fn.endswith(".json"):
-                try:
-                    with open(os.path.join(NOTES_DIR, fn)) as f:
-                        note = json.load(f)
-                        self.notes[note["id"]] = note
-                except Exception:
-                    pass
+        # lists what the index already holds; notes added or changed since are
+        # indexed on a thread and appear batch by batch
+        self.index = NoteIndex(NOTES_DIR)
+        self.refresh_list()
+        on_batch = lambda *batch: GLib.idle_add(self.on_indexed, *batch)
+        self.sync_thread = threading.Thread(target=self.index.sync,
+                                            args=(on_batch, lambda: self.closing), daemon=True)
+        self.sync_thread.start()
+
+    def on_indexed(self, stored, deleted, done, total):
+        if self.index is None: return False
+        self.index.apply({nid: m for nid, m in stored.items() if nid not in self.deleted}, deleted)
         self.refresh_list()
+        if done < total:
+            self.status_label.set_text(f"Indexing notes… {done}/{total}")
+        else:
+            self.status_label.set_text(f"Note: {self.current_id}" if self.current_id
+                                       else "Select or create a note")
+        return False
+
+    def on_close_request(self, win):
+        self.closing = True
+        self.sync_thread.join()
+        self.save_note()
+        self.writer.close()
+        # notes written since their last on_saved are reindexed at the next start
+        self.index.close()
+        self.index = None
+        return False
+
+    def schedule_save(self):
+        """Save once, SAVE_DELAY_MS after the first unsaved edit."""
+        if self.loading or not self.current_id or self.save_source is not None: return
+        self.save_source = GLib.timeout_add(SAVE_DELAY_MS, self.on_save_timeout)
+
+    def on_save_timeout(self):
+        self.save_source = None
+        self.save_note()
+        return False
+
+    def digest(self, note):
+        return hashlib.blake2b(json.dumps([note["title"], note["content"], note["tags"]]).encode(),
+                               digest_size=16).digest()
 
     def save_note(self):
+        if self.save_source is not None:
+            GLib.source_remove(self.save_source)
+            self.save_source = None
         if not self.current_id: return
-        note = self.notes.get(self.current_id, {})
+        note = self.current_note
         buf = self.content_buf
         note["content"] = buf.get_text(buf.get_start_iter(), buf.get_end_iter(), True)
         note["title"] = self.title_entry.get_text() or "Untitled"
         note["tags"] = [t.strip() for t in self.tags_entry.get_text().split(",") if t.strip()]
+        digest = self.digest(note)
+        if digest == self.saved_digest: return
+        self.saved_digest = digest
         note["modified"] = time.time()
-        self.notes[self.current_id] = note
+        saved = dict(note)
         path = os.path.join(NOTES_DIR, f"{self.current_id}.json")
-        with open(path, "w") as f:
-            json.dump(note, f)
-        self.refresh_list()
+        self.writer.write(path, saved, lambda: GLib.idle_add(self.on_saved, saved))
+
+    def on_saved(self, note):
+        if self.index is None or note["id"] in self.deleted: return False
+        self.index.update(note)
+        # relabel the row in place: replacing its item would drop the selection
+        row = self.bound_rows.get(note["id"])
+        if row is not None:
+            self.fill_row(row, note["id"])
+        return False
 
     def on_new(self, btn):
         import uuid
         nid = str(uuid.uuid4())[:8]
         note = {"id": nid, "title": "New Note", "content": "", "tags": [], "created": time.time(), "modified": time.time()}
-        self.notes[nid] = note
+        self.save_note()
         path = os.path.join(NOTES_DIR, f"{nid}.json")
-        with open(path, "w") as f:
-            json.dump(note, f)
+        write_atomic(path, json.dumps(note))
+        self.index.update(note)
         self.refresh_list()
-        self.load_note(nid)
+        self.load_note(nid, note)
 
     def on_delete(self, btn):
         if not self.current_id: return
+        if self.save_source is not None:
+            GLib.source_remove(self.save_source)
+            self.save_source = None
         path = os.path.join(NOTES_DIR, f"{self.current_id}.json")
-        try: os.remove(path)
-        except Exception: pass
-        del self.notes[self.current_id]
+        self.writer.delete(path)
+        self.deleted.add(self.current_id)
+        self.index.remove(self.current_id)
         self.current_id = None
+        self.current_note = None
+        self.loading = True
         self.title_entry.set_text("")
         self.content_buf.set_text("")
+        self.loading = False
         self.refresh_list()
 
     def refresh_list(self):
-        q = self.search_entry.get_text().lower()
-        while self.note_list.get_row_at_index(0):
-            self.note_list.remove(self.note_list.get_row_at_index(0))
-        for nid, note in sorted(self.notes.items(), key=lambda x: -x[1].get("modified", 0)):
-            if q and q not in note["title"].lower() and q not in note["content"].lower():
-                continue
-            row = Gtk.ListBoxRow()
-            vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
-            vbox.set_margin_top(4); vbox.set_margin_start(6); vbox.set_margin_bottom(4)
-            title_lbl = Gtk.Label(label=note["title"], xalign=0)
-            title_lbl.set_markup(f"<b>{note['title'][:30]}</b>")
-            preview = note["content"][:50].replace("\n", " ")
-            preview_lbl = Gtk.Label(label=preview, xalign=0)
-            vbox.append(title_lbl); vbox.append(preview_lbl)
-            row.set_child(vbox)
-            row._note_id = nid
-            self.note_list.append(row)
+        # search results come ranked; with no query, newest first
+        ids = self.index.search(self.search_entry.get_text())
+        self.note_model.set_ids(ids)
+        # keep the open note highlighted
+        if self.current_id in ids:
+            self.note_selection.set_selected(ids.index(self.current_id))
+
+    def on_row_setup(self, factory, item):
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
+        vbox.set_margin_top(4); vbox.set_margin_start(6); vbox.set_margin_bottom(4)
+        vbox.append(Gtk.Label(xalign=0)); vbox.append(Gtk.Label(xalign=0))
+        item.set_child(vbox)
+
+    def on_row_bind(self, factory, item):
+        nid = item.get_item().nid
+        self.bound_rows[nid] = item.get_child()
+        self.fill_row(item.get_child(), nid)
+
+    def on_row_unbind(self, factory, item):
+        nid = item.get_item().nid
+        if self.bound_rows.get(nid) is item.get_child():
+            del self.bound_rows[nid]
+
+    def fill_row(self, row, nid):
+        title, preview, _ = self.index.meta[nid]
+        title_lbl = row.get_first_child()
+        title_lbl.set_markup(f"<b>{GLib.markup_escape_text(title[:30])}</b>")
+        title_lbl.get_next_sibling().set_label(preview)
 
     def on_search(self, entry):
         self.refresh_list()
 
-    def on_note_selected(self, listbox, row):
-        if row:
+    def on_note_selected(self, selection, pspec):
+        item = selection.get_selected_item()
+        if item and item.nid != self.current_id:
             self.save_note()
-            self.load_note(row._note_id)
+            self.load_note(item.nid)
 
-    def load_note(self, nid):
+    def load_note(self, nid, note=None):
+        if note is None:
+            note = self.index.read(nid)
+            if note is None: return
+        note.setdefault("tags", [])
         self.current_id = nid
-        note = self.notes[nid]
+        self.current_note = note
+        self.saved_digest = self.digest(note)
+        self.loading = True
         self.title_entry.set_text(note["title"])
         self.content_buf.set_text(note["content"])
-        self.tags_entry.set_text(", ".join(note.get("tags", [])))
+        self.tags_entry.set_text(", ".join(note["tags"]))
+        self.loading = False
         self.status_label.set_text(f"Note: {nid}")
 
     def on_title_changed(self, entry):
-        GLib.timeout_add(500, self.save_note)
+        self.schedule_save()
 
     def on_content_changed(self, *args):
-        GLib.timeout_add(1000, self.save_note)
+        self.schedule_save()
 
 class NotesApp(Gtk.Application):
     def __init__(self):
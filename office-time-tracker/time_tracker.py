@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import json, os, time, datetime, math
+import os, sys, time, datetime, math
+
+try:
+    import journal_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import journal_store
 
 DATA_DIR = os.path.expanduser("~/.local/share/com.pens.TimeTracker")
 DATA_FILE = os.path.join(DATA_DIR, "data.json")
@@ -18,17 +24,15 @@ class TimeTrackerWindow(Gtk.ApplicationWindow):
         self.session_start = None
         self.build_ui()
         GLib.timeout_add(1000, self.update_timer)
+        self.connect("close-request", self.on_close_request)
 
     def load_data(self):
-        try:
-            with open(DATA_FILE) as f:
-                return json.load(f)
-        except Exception:
-            return {"projects": {}, "sessions": []}
+        self.store = journal_store.JournalStore(DATA_FILE, {"projects": {}, "sessions": []})
+        return self.store.data
 
-    def save_data(self):
-        with open(DATA_FILE, "w") as f:
-            json.dump(self.data, f)
+    def on_close_request(self, win):
+        self.store.close()
+        return False
 
     def build_ui(self):
         paned = Gtk.Paned(orientation=Gtk.Orientation.HORIZONTAL)
@@ -94,8 +98,7 @@ class TimeTrackerWindow(Gtk.ApplicationWindow):
     def on_add_project(self, btn):
         name = self.proj_entry.get_text().strip()
         if name and name not in self.data["projects"]:
-            self.data["projects"][name] = {"total_seconds": 0}
-            self.save_data()
+            self.store.set(("projects", name), {"total_seconds": 0})
             self.refresh_projects()
             self.proj_entry.set_text("")
 
@@ -128,13 +131,12 @@ class TimeTrackerWindow(Gtk.ApplicationWindow):
     def stop_timer(self):
         if self.session_start and self.active_project:
             elapsed = time.time() - self.session_start
-            proj = self.data["projects"].get(self.active_project, {})
+            proj = dict(self.data["projects"].get(self.active_project, {}))
             proj["total_seconds"] = proj.get("total_seconds", 0) + elapsed
-            self.data["projects"][self.active_project] = proj
+            self.store.set(("projects", self.active_project), proj)
             session = {"project": self.active_project, "start": self.session_start,
                        "duration": elapsed, "date": datetime.date.today().isoformat()}
-            self.data["sessions"].append(session)
-            self.save_data()
+            self.store.append(("sessions",), session)
             self.session_start = None
             self.refresh_totals()
             self.chart.queue_draw()
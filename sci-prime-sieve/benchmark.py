@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Factorization benchmark for the Check Number panel.
+
+Factors a fixed corpus of semiprimes p*q, grouped by the bit length of the
+smaller factor, plus the same numbers padded past 60 digits with a large
+prime cofactor. Reports the median and worst time per group.
+
+    python3 benchmark.py --bits 16 20 24 28 --count 20
+"""
+import argparse
+import random
+import statistics
+import time
+
+from primality import factorize, next_prime
+
+BIG = next_prime(10 ** 60)
+
+
+def corpus(bits, count, seed):
+    rng = random.Random(seed * 1000 + bits)
+    out = []
+    for _ in range(count):
+        p = next_prime(rng.getrandbits(bits) | (1 << (bits - 1)))
+        q = next_prime(rng.getrandbits(bits + 4) | (1 << (bits + 3)))
+        out.append((p, q))
+    return out
+
+
+def run(numbers):
+    times = []
+    for n, expected in numbers:
+        start = time.perf_counter()
+        got = factorize(n)
+        times.append(time.perf_counter() - start)
+        if got != expected:
+            raise SystemExit(f"wrong factors for {n}: {got}")
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bits", type=int, nargs="+", default=[16, 20, 24, 28])
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'factor bits':<12}{'digits':>8}{'median ms':>12}{'max ms':>10}")
+    for bits in args.bits:
+        pairs = corpus(bits, args.count, args.seed)
+        for label, extra in (("p*q", 1), ("p*q*big", BIG)):
+            numbers = [(p * q * extra, sorted(f for f in (p, q, extra) if f > 1)) for p, q in pairs]
+            digits = len(str(numbers[0][0]))
+            med, worst = run(numbers)
+            print(f"{bits:<4}{label:<8}{digits:>8}{med * 1000:>12.2f}{worst * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
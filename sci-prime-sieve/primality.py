@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Primality testing and factorization for the Check Number panel.
+
+Miller-Rabin with the first thirteen prime bases is deterministic for every
+n below 3.3 * 10^24 and a strong probable-prime test above that. Composites
+are stripped of small factors with a 2-3-5 wheel and then split with
+Brent's variant of Pollard's rho. neighbours() finds the primes either
+side of a number from the sieved primes where they reach.
+
+Run this file to check neighbours() at the ends of the sieve.
+"""
+import math
+import random
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+WHEEL_LIMIT = 1000
+_WHEEL = (4, 2, 4, 2, 4, 6, 2, 6)   # steps from 7 over numbers coprime to 30
+
+
+@lru_cache(maxsize=4096)
+def is_prime(n):
+    if n < 2:
+        return False
+    for p in MR_BASES:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2; r += 1
+    for a in MR_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _wheel(limit):
+    yield 2; yield 3; yield 5
+    d, i = 7, 0
+    while d <= limit:
+        yield d
+        d += _WHEEL[i]
+        i = (i + 1) % 8
+
+
+def _brent(n, rng):
+    """A non-trivial factor of the odd composite n."""
+    while True:
+        y, c, m = rng.randrange(1, n), rng.randrange(1, n), 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            # the batched gcd overshot; step back one at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def factorize(n, seed=None):
+    """Prime factors of n >= 2, ascending, with multiplicity."""
+    factors = []
+    for p in _wheel(WHEEL_LIMIT):
+        if p * p > n:
+            break
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+    rng = random.Random(seed)
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_prime(m):
+            factors.append(m)
+            continue
+        root = math.isqrt(m)
+        if root * root == m:
+            stack += [root, root]
+            continue
+        d = _brent(m, rng)
+        stack += [d, m // d]
+    return sorted(factors)
+
+
+def next_prime(n):
+    """Smallest prime greater than n."""
+    if n < 2:
+        return 2
+    n += 1 + n % 2
+    while not is_prime(n):
+        n += 2
+    return n
+
+
+def prev_prime(n):
+    """Largest prime smaller than n, or None."""
+    if n <= 2:
+        return None
+    if n == 3:
+        return 2
+    n -= 1 + n % 2
+    while not is_prime(n):
+        n -= 2
+    return n
+
+
+def neighbours(n, primes, covered):
+    """Primes either side of n, or None for a missing previous one.
+
+    primes holds every prime up to covered, in order: bisect it where it
+    reaches and test beyond it.
+    """
+    if primes and n <= primes[-1]:
+        i = bisect_left(primes, n)
+        j = bisect_right(primes, n)
+        prev_p = primes[i - 1] if i > 0 else None
+        return prev_p, primes[j] if j < len(primes) else next_prime(n)
+    if primes and n - 1 <= covered:
+        prev_p = primes[-1]
+    else:
+        prev_p = prev_prime(n)
+    return prev_p, next_prime(n)
+
+
+if __name__ == "__main__":
+    primes = [2, 3, 5, 7, 11, 13, 17, 19]
+    assert neighbours(1, primes, 20) == (None, 2)
+    assert neighbours(12, primes, 20) == (11, 13)
+    assert neighbours(19, primes, 20) == (17, 23)      # the largest sieved prime
+    assert neighbours(20, primes, 20) == (19, 23)      # past the last prime, within the sieve
+    assert neighbours(21, primes, 20) == (19, 23)
+    assert neighbours(30, primes, 20) == (29, 31)      # beyond the sieve
+    assert neighbours(5, [], 0) == (3, 7)
+    print("neighbours ok")
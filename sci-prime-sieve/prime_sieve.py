@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import math, threading
+import threading, time
+from primality import factorize, is_prime, neighbours
+from sieve_engine import SieveStats, segments
+
+MAX_LIMIT = 10_000_000_000
+KEEP_LIMIT = 10_000_000     # primes kept in memory for the Check Number panel
+PROGRESS_INTERVAL = 0.1
 
 class PrimeSieveWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -12,8 +18,10 @@ class PrimeSieveWindow(Gtk.ApplicationWindow):
         self.primes = []
         self.limit = 200
         self.sieve_data = []
+        self.generation = 0
+        self.check_generation = 0
         self.build_ui()
-        self.run_sieve(200)
+        self.start_sieve(200)
 
     def build_ui(self):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
@@ -26,7 +34,7 @@ class PrimeSieveWindow(Gtk.ApplicationWindow):
         ctrl_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         ctrl_box.set_halign(Gtk.Align.CENTER)
         ctrl_box.append(Gtk.Label(label="Find primes up to:"))
-        self.limit_spin = Gtk.SpinButton.new_with_range(10, 1000000, 10)
+        self.limit_spin = Gtk.SpinButton.new_with_range(10, MAX_LIMIT, 10)
         self.limit_spin.set_value(200)
         ctrl_box.append(self.limit_spin)
         go_btn = Gtk.Button(label="Run Sieve")
@@ -36,6 +44,8 @@ class PrimeSieveWindow(Gtk.ApplicationWindow):
 
         self.status_label = Gtk.Label(label="")
         vbox.append(self.status_label)
+        self.progress = Gtk.ProgressBar()
+        vbox.append(self.progress)
 
         grid_frame = Gtk.Frame(label="Sieve Grid (green=prime, dark=composite)")
         scroll = Gtk.ScrolledWindow()
@@ -77,45 +87,58 @@ class PrimeSieveWindow(Gtk.ApplicationWindow):
         hbox.append(check_frame)
         vbox.append(hbox)
 
-    def run_sieve(self, limit):
+    def start_sieve(self, limit):
+        # a newer run makes the older thread stop at its next segment
+        self.generation += 1
+        self.status_label.set_text("Computing...")
+        self.progress.set_fraction(0)
+        threading.Thread(target=self.run_sieve, args=(limit, self.generation), daemon=True).start()
+
+    def run_sieve(self, limit, gen):
+        stats = SieveStats(limit, keep_limit=KEEP_LIMIT)
+        last = time.monotonic()
+        for low, seg in segments(limit):
+            if gen != self.generation:
+                return
+            stats.feed(low, seg)
+            now = time.monotonic()
+            if now - last >= PROGRESS_INTERVAL:
+                last = now
+                GLib.idle_add(self.show_progress, gen, stats.checked, limit, stats.lines())
+        GLib.idle_add(self.sieve_done, gen, limit, stats)
+
+    def show_progress(self, gen, checked, limit, lines):
+        if gen == self.generation:
+            self.progress.set_fraction(checked / limit)
+            self.status_label.set_text(f"Sieving... {checked:,} / {limit:,}")
+            self.stats_view.get_buffer().set_text("\n".join(lines))
+        return False
+
+    def sieve_done(self, gen, limit, stats):
+        if gen != self.generation:
+            return False
         self.limit = limit
-        n = limit + 1
-        sieve = [True] * n
-        sieve[0] = sieve[1] = False
-        for i in range(2, int(math.sqrt(limit)) + 1):
-            if sieve[i]:
-                for j in range(i*i, n, i):
-                    sieve[j] = False
-        self.sieve_data = sieve
-        self.primes = [i for i, v in enumerate(sieve) if v]
-
-        n_primes = len(self.primes)
-        density = n_primes / limit * 100 if limit > 0 else 0
-        twin = sum(1 for i in range(len(self.primes)-1) if self.primes[i+1] - self.primes[i] == 2)
-        mersenne = [p for p in self.primes if (p + 1) & p == 0 and p > 1]
-        gaps = [self.primes[i+1] - self.primes[i] for i in range(min(len(self.primes)-1, 1000))]
-        max_gap = max(gaps) if gaps else 0
-
-        lines = [
-            f"Primes found:     {n_primes}",
-            f"Largest prime:    {self.primes[-1] if self.primes else 'N/A'}",
-            f"Prime density:    {density:.2f}%",
-            f"Twin prime pairs: {twin}",
-            f"Max prime gap:    {max_gap}",
-            f"Mersenne primes:  {mersenne[:8]}",
-            f"\nFirst 20: {self.primes[:20]}",
-        ]
+        self.primes = stats.kept
+        size = min(limit + 1, 1001)
+        self.sieve_data = bytearray(size)
+        for p in self.primes:
+            if p >= size:
+                break
+            self.sieve_data[p] = 1
+        lines = stats.lines()
+        if limit > KEEP_LIMIT:
+            lines.insert(1, f"(kept for lookups up to {KEEP_LIMIT:,})")
         self.stats_view.get_buffer().set_text("\n".join(lines))
-        self.status_label.set_text(f"Found {n_primes} primes up to {limit}")
+        self.progress.set_fraction(1)
+        self.status_label.set_text(f"Found {stats.count} primes up to {limit}")
         size = min(limit + 1, 1000)
         cell = max(4, 740 // min(size, 100))
         self.grid_area.set_size_request(cell * min(size, 100) + 2, cell * ((size + 99) // 100) + 20)
         self.grid_area.queue_draw()
+        return False
 
     def on_run(self, btn):
-        limit = int(self.limit_spin.get_value())
-        self.status_label.set_text("Computing...")
-        threading.Thread(target=lambda: GLib.idle_add(self.run_sieve, limit), daemon=True).start()
+        self.start_sieve(int(self.limit_spin.get_value()))
 
     def draw_grid(self, area, cr, w, h):
         cr.set_source_rgb(0.08, 0.08, 0.12); cr.rectangle(0, 0, w, h); cr.fill()
@@ -148,50 +171,33 @@ class PrimeSieveWindow(Gtk.ApplicationWindow):
         except ValueError:
             self.check_result.set_text("Enter a valid integer")
             return
+        self.check_generation += 1
+        self.check_result.set_text("Checking...")
+        threading.Thread(target=self.check_number, args=(n, self.check_generation),
+                         daemon=True).start()
 
-        def is_prime_miller(n):
-            if n < 2: return False
-            if n == 2: return True
-            if n % 2 == 0: return False
-            d, r = n - 1, 0
-            while d % 2 == 0:
-                d //= 2; r += 1
-            for a in [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]:
-                if a >= n: continue
-                x = pow(a, d, n)
-                if x == 1 or x == n - 1: continue
-                for _ in range(r - 1):
-                    x = pow(x, 2, n)
-                    if x == n - 1: break
-                else:
-                    return False
-            return True
-
-        prime = is_prime_miller(n)
-        if prime:
+    def check_number(self, n, gen):
+        if is_prime(n):
             lines = [f"{n} IS PRIME"]
         else:
-            factors = []
-            temp = n
-            d = 2
-            while d * d <= temp:
-                while temp % d == 0:
-                    factors.append(d)
-                    temp //= d
-                d += 1
-            if temp > 1:
-                factors.append(temp)
+            factors = factorize(n) if n >= 2 else []
             lines = [f"{n} is NOT prime", f"Factors: {' × '.join(map(str, factors))}"]
 
         if n > 0:
-            prev_prime = max((p for p in self.primes if p < n), default=None)
-            next_prime = min((p for p in self.primes if p > n), default=None)
-            if prev_prime:
-                lines.append(f"Previous prime: {prev_prime}")
-            if next_prime:
-                lines.append(f"Next prime: {next_prime}")
-
-        self.check_result.set_text("\n".join(lines))
+            prev_p, next_p = self.neighbours(n)
+            if prev_p:
+                lines.append(f"Previous prime: {prev_p}")
+            if next_p:
+                lines.append(f"Next prime: {next_p}")
+        GLib.idle_add(self.show_check, gen, "\n".join(lines))
+
+    def neighbours(self, n):
+        return neighbours(n, self.primes, min(self.limit, KEEP_LIMIT))
+
+    def show_check(self, gen, text):
+        if gen == self.check_generation:
+            self.check_result.set_text(text)
+        return False
 
 class PrimeSieveApp(Gtk.Application):
     def __init__(self):
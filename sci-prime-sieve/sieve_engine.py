@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Segmented Sieve of Eratosthenes for the Prime Sieve app.
+
+Only odd numbers are stored, one byte each, in segments sized to fit the L1
+cache. Multiples are struck out with slice assignment, so the inner loop runs
+in C. Statistics are folded in per segment with bytes-level operations, which
+keeps memory flat and lets the sieve stream well past what a full table
+could hold.
+"""
+import math
+from array import array
+from itertools import compress, islice
+
+SEGMENT_BYTES = 32 * 1024  # odd numbers per segment; 64K integers of range
+
+
+def base_primes(limit):
+    """Odd primes up to limit, from a plain odd-only sieve."""
+    if limit < 3:
+        return []
+    size = (limit - 1) // 2  # index i <-> 2i + 1, for 3..limit
+    flags = bytearray([1]) * (size + 1)
+    flags[0] = 0
+    for i in range(1, (math.isqrt(limit) - 1) // 2 + 1):
+        if flags[i]:
+            p = 2 * i + 1
+            start = p * p // 2
+            flags[start::p] = bytes(len(range(start, size + 1, p)))
+    return [2 * i + 1 for i in compress(range(size + 1), flags)]
+
+
+def segments(limit, segment_bytes=SEGMENT_BYTES):
+    """Yield (low, flags) covering the odd numbers 1..limit.
+
+    flags[i] is 1 when low + 2*i is prime; low is always odd.
+    """
+    primes = base_primes(math.isqrt(limit))
+    zeros = memoryview(bytes(segment_bytes))
+    low = 1
+    while low <= limit:
+        n = min(segment_bytes, (limit - low) // 2 + 1)
+        high = low + 2 * n  # exclusive
+        seg = bytearray([1]) * n
+        for p in primes:
+            pp = p * p
+            if pp >= high:
+                break
+            if pp >= low:
+                start = pp
+            else:
+                start = (low + p - 1) // p * p
+                if start % 2 == 0:
+                    start += p
+            idx = (start - low) // 2
+            if idx < n:
+                seg[idx::p] = zeros[:(n - 1 - idx) // p + 1]
+        if low == 1:
+            seg[0] = 0
+        yield low, seg
+        low = high
+
+
+class SieveStats:
+    """Running prime statistics, updated one segment at a time."""
+
+    def __init__(self, limit, keep_limit=0, first=20):
+        self.limit = limit
+        self.keep_limit = keep_limit
+        self.first_n = first
+        self.count = 1 if limit >= 2 else 0
+        self.largest = 2 if limit >= 2 else None
+        self.twins = 0
+        self.max_gap = 1 if limit >= 3 else 0
+        self.first = [2] if limit >= 2 else []
+        self.kept = array('Q', self.first)
+        self.mersenne = [2 ** k - 1 for k in range(2, limit.bit_length() + 1)
+                         if 2 ** k - 1 <= limit]
+        self.mersenne_found = []
+        self.checked = 2
+        self._last_flag = 0    # was the odd number just before this segment prime?
+        self._run = None       # composite odds since the last odd prime
+
+    def feed(self, low, seg):
+        n = len(seg)
+        high = low + 2 * n
+        self.checked = min(high - 1, self.limit)
+        found = seg.count(1)
+        if found:
+            self.count += found
+            first = seg.find(1)
+            last = seg.rfind(1)
+            self.largest = low + 2 * last
+            if self._run is not None:
+                self.max_gap = max(self.max_gap, 2 * (self._run + first + 1))
+            if last > first:
+                # widen the best gap while a longer run of composites exists inside
+                best = max(self.max_gap // 2 - 1, 0)
+                while seg.find(bytes(best + 1), first, last) != -1:
+                    best += 1
+                self.max_gap = max(self.max_gap, 2 * (best + 1))
+            self._run = n - 1 - last
+            bits = int.from_bytes(seg, "little")
+            self.twins += (bits & (bits >> 8)).bit_count()
+            if self._last_flag and seg[0]:
+                self.twins += 1
+            if len(self.first) < self.first_n:
+                self.first.extend(islice(compress(range(low, high, 2), seg),
+                                         self.first_n - len(self.first)))
+        elif self._run is not None:
+            self._run += n
+        self._last_flag = seg[-1]
+        for m in self.mersenne:
+            if low <= m < high and seg[(m - low) // 2]:
+                self.mersenne_found.append(m)
+        if low < self.keep_limit:
+            self.kept.extend(compress(range(low, min(high, self.keep_limit + 1), 2), seg))
+
+    def lines(self):
+        density = self.count / self.checked * 100 if self.checked > 0 else 0
+        return [
+            f"Primes found:     {self.count}",
+            f"Largest prime:    {self.largest if self.largest else 'N/A'}",
+            f"Prime density:    {density:.2f}%",
+            f"Twin prime pairs: {self.twins}",
+            f"Max prime gap:    {self.max_gap}",
+            f"Mersenne primes:  {self.mersenne_found[:8]}",
+            f"\nFirst {self.first_n}: {self.first}",
+        ]
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Journaled JSON storage for the office apps.
+
+The apps keep their data as one JSON document (DATA_FILE) and used to
+rewrite all of it on every edit. JournalStore keeps that file as a
+snapshot and records each edit as one line in a journal next to it
+(DATA_FILE + ".journal"):
+
+    ["set", ["completions", "2024-05-01:Run"], true]
+    ["del", ["habits", 3]]
+    ["append", ["sessions"], {"project": "Docs", ...}]
+
+An edit costs one short line, whatever the size of the document. Edits
+are applied to JournalStore.data at once and written by a background
+thread FLUSH_DELAY after the first unwritten one, all in one write and
+one fsync. flush() waits for the writes; close() compacts and stops.
+
+Once the journal holds COMPACT_AFTER edits, the document is written to a
+temporary file, fsynced and renamed over the snapshot, and a fresh
+journal is started. Journals begin with the inode number of the snapshot
+they extend. A journal left behind by a compaction that crashed between
+the two renames names the old inode and is ignored, so its edits are
+never applied twice. A torn last line is cut off when loading. A crash
+at any point leaves either the old or the new snapshot, plus the edits
+flushed before it.
+
+When a write fails (a full disk, an I/O error), the journal on disk is
+left as it was and nothing more is appended to it, since later edits
+would follow a gap. The next edit, or close(), queues a snapshot of the
+whole document instead, and the journal starts afresh after it.
+
+The document is read, and the journal replayed, on first access to
+JournalStore.data.
+
+Run this file to time an edit against rewriting the whole file, and to
+check that a torn journal loads and a failed write loses nothing.
+"""
+import copy
+import json
+import os
+import threading
+
+FLUSH_DELAY = 0.5
+COMPACT_AFTER = 1000
+
+
+def _apply(data, op):
+    kind, keys = op[0], op[1]
+    if kind == "append":
+        for k in keys:
+            data = data[k]
+        data.append(op[2])
+        return
+    for k in keys[:-1]:
+        data = data[k]
+    if kind == "set":
+        data[keys[-1]] = op[2]
+    elif kind == "del":
+        del data[keys[-1]]
+    else:
+        raise ValueError(f"unknown journal entry {kind!r}")
+
+
+def _fsync_dir(path):
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace(path, text):
+    """Atomically make path hold text; returns the new file's inode."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        inode = os.fstat(f.fileno()).st_ino
+    os.replace(tmp, path)
+    _fsync_dir(path)
+    return inode
+
+
+class JournalStore:
+    def __init__(self, path, default, flush_delay=FLUSH_DELAY, compact_after=COMPACT_AFTER):
+        """default: the document to start from when path does not exist or cannot be read."""
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.default = default
+        self.flush_delay = flush_delay
+        self.compact_after = compact_after
+        self._data = None
+        self._entries = 0           # edits in the journal since the last snapshot
+        self._queue = []            # ("line", text) or ("snapshot", text), oldest first
+        self._queued = 0
+        self._written = 0
+        self._urgent = False
+        self._closing = False
+        self._lost = False          # a write failed and no snapshot is queued since
+        self._gap = False           # writer: the journal misses edits until a snapshot
+        self._cond = threading.Condition()
+        self._fd = None             # journal, opened by the writer
+        self._thread = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._load()
+        return self._data
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self._data = json.load(f)
+            inode = os.stat(self.path).st_ino
+        except (OSError, ValueError):
+            self._data = copy.deepcopy(self.default)
+            self._queue_item(("snapshot", json.dumps(self._data)))
+            return
+        try:
+            with open(self.journal_path, "rb") as f:
+                header = f.readline()
+                if json.loads(header).get("snapshot") != inode:
+                    return              # written before the last compaction
+                good = len(header)
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    _apply(self._data, op)
+                    good += len(line)
+                    self._entries += 1
+        except (OSError, ValueError, AttributeError):
+            return
+        if good < os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, good)    # a write cut short by a crash
+        self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND)
+
+    # --- Edits ---
+
+    def set(self, keys, value):
+        """data[k0][k1]...[kn] = value"""
+        self._record(["set", list(keys), value])
+
+    def delete(self, keys):
+        """del data[k0][k1]...[kn]"""
+        self._record(["del", list(keys)])
+
+    def append(self, keys, value):
+        """data[k0]...[kn].append(value)"""
+        self._record(["append", list(keys), value])
+
+    def _record(self, op):
+        _apply(self.data, op)
+        self._entries += 1
+        line = json.dumps(op, separators=(",", ":")) + "\n"
+        if self._entries >= self.compact_after or not self._queue_item(("line", line)):
+            self.compact()
+
+    def compact(self):
+        """Queue a snapshot of the document and start a new journal after it."""
+        self._entries = 0
+        self._queue_item(("snapshot", json.dumps(self.data)))
+
+    def _queue_item(self, item):
+        """Queue item for the writer; a line is refused while a snapshot is needed."""
+        with self._cond:
+            if item[0] == "snapshot":
+                self._lost = False
+            elif self._lost:
+                return False
+            self._queue.append(item)
+            self._queued += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    # --- Writer ---
+
+    def flush(self):
+        """Write everything queued so far and wait until it is on disk."""
+        with self._cond:
+            target = self._queued
+            self._urgent = True
+            self._cond.notify()
+            while self._written < target and self._thread is not None:
+                self._cond.wait()
+
+    def close(self):
+        if self._data is not None and (self._entries or self._lost):
+            self.compact()
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._urgent and not self._closing:
+                    self._cond.wait_for(lambda: self._urgent or self._closing, self.flush_delay)
+                items, self._queue = self._queue, []
+                self._urgent = False
+                if not items and self._closing:
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+            try:
+                self._write(items)
+                lost = False
+            except OSError as e:
+                print(f"{self.path}: {e}", flush=True)
+                self._gap = lost = True
+                if self._fd is not None:
+                    try:
+                        os.close(self._fd)
+                    except OSError:
+                        pass
+                    self._fd = None
+            with self._cond:
+                self._lost = self._lost or lost
+                self._written += len(items)
+                self._cond.notify_all()
+
+    def _write(self, items):
+        lines = []
+        for kind, text in items:
+            if kind == "line":
+                if not self._gap:
+                    lines.append(text)
+                continue
+            # the old journal only matters until the snapshot replaces it
+            self._append(lines)
+            lines = []
+            inode = _replace(self.path, text)
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._new_journal(inode)
+            self._gap = False
+        self._append(lines)
+
+    def _new_journal(self, inode):
+        _replace(self.journal_path, json.dumps({"snapshot": inode}) + "\n")
+        self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND)
+
+    def _append(self, lines):
+        if not lines:
+            return
+        if self._fd is None:
+            self._new_journal(os.stat(self.path).st_ino)
+        os.write(self._fd, "".join(lines).encode())
+        os.fsync(self._fd)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory(dir="/var/tmp") as tmp:
+        path = os.path.join(tmp, "habits.json")
+        habits = [f"habit {i}" for i in range(20)]
+        doc = {"habits": habits,
+               "completions": {f"2020-01-01:{h}:{d}": True for d in range(1000) for h in habits}}
+        with open(path, "w") as f:
+            json.dump(doc, f)
+        edits = 200
+
+        start = time.perf_counter()
+        for i in range(edits):
+            doc["completions"][f"today:{i}"] = True
+            with open(path, "w") as f:
+                json.dump(doc, f)
+        old = (time.perf_counter() - start) / edits
+
+        store = JournalStore(path, {})
+        start = time.perf_counter()
+        store.data
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(edits):
+            store.set(("completions", f"new:{i}"), True)
+        queued = (time.perf_counter() - start) / edits
+        start = time.perf_counter()
+        store.flush()
+        flushed = time.perf_counter() - start
+        journal = os.path.getsize(store.journal_path)
+        for i in range(edits // 2):
+            store.delete(("completions", f"new:{i}"))
+        store.append(("habits",), "habit 20")
+        store.flush()
+        expected = copy.deepcopy(store.data)
+
+        with open(store.journal_path, "ab") as f:
+            f.write(b'["set",["completions","torn')   # a write cut short
+        reloaded = JournalStore(path, {})
+        assert reloaded.data == expected
+        start = time.perf_counter()
+        store.close()
+        closed = time.perf_counter() - start
+        assert JournalStore(path, {}).data == expected
+
+        store = JournalStore(path, {})
+        for i in range(5):
+            store.set(("completions", f"kept:{i}"), True)
+        store.flush()
+        write = os.write
+
+        def full_disk(fd, data):
+            raise OSError(28, "No space left on device")
+        os.write = full_disk
+        store.set(("completions", "failed"), True)
+        store.flush()
+        os.write = write
+        store.set(("completions", "after"), True)
+        store.flush()
+        assert JournalStore(path, {}).data == store.data    # as after a crash here
+        print(f"{len(doc['completions'])} completions, {os.path.getsize(path) / 1e6:.1f} MB: "
+              f"json.dump per edit {old * 1000:.1f} ms; journal {queued * 1e6:.0f} us per edit "
+              f"on the caller's thread, {flushed * 1000:.1f} ms to flush {edits} edits "
+              f"({journal} bytes); load {load * 1000:.0f} ms, compacting close {closed * 1000:.0f} ms; "
+              f"torn journal reloads intact, failed write recovered")
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""Single-pass /proc snapshot engine shared by the process and memory viewers.
+
+Each refresh lists /proc once and, per PID, reads only /proc/<pid>/stat and
+/proc/<pid>/statm. The files are kept open between refreshes and re-read
+with pread into reusable buffers, so a steady-state refresh costs two
+syscalls per process. Fields that do not change for the life of a process
+(cmdline, owner uid) are cached per (pid, starttime) and only re-read when
+the command name changes, i.e. after an exec.
+
+With io=True the snapshot also holds /proc/<pid>/io open and fills the
+read_bytes/write_bytes columns (-1 where the file is not readable, which is
+the case for other users' processes). ProcHistory turns consecutive tables
+into per-process rates and keeps the last few samples of each in ring
+buffers for sparklines.
+
+The result is a ProcTable: parallel array columns, one row per process.
+
+Run this file directly to time a refresh on the current machine.
+"""
+import os
+import resource
+import time
+from array import array
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+STATE_NAMES = {
+    "R": "running", "S": "sleeping", "D": "disk sleep", "Z": "zombie",
+    "T": "stopped", "t": "tracing stop", "X": "dead", "I": "idle",
+    "P": "parked", "W": "waking",
+}
+
+# fields of /proc/<pid>/stat after "pid (comm) ", zero-based
+_STATE, _PPID, _UTIME, _STIME, _THREADS, _START = 0, 1, 11, 12, 17, 19
+
+
+def state_label(code):
+    return f"{code} ({STATE_NAMES.get(code, 'unknown')})"
+
+
+class ProcTable:
+    """Column-oriented process table; row i is the same process in every column."""
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.pid = array("l")
+        self.ppid = array("l")
+        self.threads = array("l")
+        self.rss_kb = array("q")
+        self.vsize_kb = array("q")
+        self.shared_kb = array("q")
+        self.cpu_ticks = array("q")     # utime + stime
+        self.starttime = array("q")
+        self.state = bytearray()
+        self.uid = array("l")
+        self.read_bytes = array("q")    # -1 when /proc/<pid>/io is unreadable
+        self.write_bytes = array("q")
+        self.name = []
+        self.cmdline = []
+        self._index = None
+
+    def __len__(self):
+        return len(self.pid)
+
+    def index(self, pid):
+        """Row number for pid, or None."""
+        if self._index is None:
+            self._index = {p: i for i, p in enumerate(self.pid)}
+        return self._index.get(pid)
+
+    def row(self, i):
+        return {
+            "pid": self.pid[i], "ppid": self.ppid[i], "name": self.name[i],
+            "state": state_label(chr(self.state[i])), "threads": self.threads[i],
+            "rss_kb": self.rss_kb[i], "vsize_kb": self.vsize_kb[i],
+            "shared_kb": self.shared_kb[i], "cpu_ticks": self.cpu_ticks[i],
+            "uid": self.uid[i], "starttime": self.starttime[i],
+            "cmdline": self.cmdline[i],
+        }
+
+    def order_by(self, column, reverse=True):
+        """Row numbers sorted by a column."""
+        col = getattr(self, column)
+        return sorted(range(len(self)), key=col.__getitem__, reverse=reverse)
+
+
+class _Entry:
+    __slots__ = ("head", "starttime", "name", "cmdline", "uid", "stat_fd", "statm_fd", "io_fd")
+
+    def __init__(self, head, starttime, name, cmdline, uid, stat_fd, statm_fd, io_fd=-1):
+        self.head = head            # b"pid (comm)", to spot an exec cheaply
+        self.starttime = starttime
+        self.name = name
+        self.cmdline = cmdline
+        self.uid = uid
+        self.stat_fd = stat_fd      # -1 when over the open-file budget
+        self.statm_fd = statm_fd
+        self.io_fd = io_fd          # -1 when not held or not readable
+
+
+class ProcSnapshot:
+    """Produces ProcTables, reusing open files and cached fields between calls.
+
+    Not thread-safe; give each thread its own snapshot or serialise refresh().
+    """
+
+    def __init__(self, proc="/proc", max_open=None, io=False):
+        self.proc = proc
+        self.io = io
+        self._stat_buf = bytearray(4096)
+        self._statm_buf = bytearray(256)
+        self._io_buf = bytearray(512)
+        self._entries = {}
+        if max_open is None:
+            soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            # two or three files per process; leave room for the rest of the app
+            max_open = max(0, (soft - 256) // (3 if io else 2))
+        self.max_open = max_open
+        self._open = 0
+
+    def _close(self, entry):
+        if entry.stat_fd >= 0:
+            os.close(entry.stat_fd)
+            os.close(entry.statm_fd)
+            self._open -= 1
+        if entry.io_fd >= 0:
+            os.close(entry.io_fd)
+        entry.stat_fd = entry.statm_fd = entry.io_fd = -1
+
+    def _cmdline(self, pid, name):
+        try:
+            fd = os.open(f"{self.proc}/{pid}/cmdline", os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return name
+        try:
+            raw = os.read(fd, 4096)
+        except OSError:
+            raw = b""
+        finally:
+            os.close(fd)
+        cmd = raw.replace(b"\0", b" ").strip().decode("utf-8", "replace")
+        return cmd[:80] if cmd else name
+
+    def _read_io(self, fd):
+        """Bytes read into the io buffer from fd, or -1."""
+        if fd < 0:
+            return -1
+        try:
+            return os.preadv(fd, [self._io_buf], 0)
+        except OSError:
+            return -1
+
+    def _read_new(self, pid, entry):
+        """Open and read stat/statm (and io) for a pid without held files.
+
+        Returns (entry, stat length, statm length, io length); entry is new
+        unless the cached one still describes the same process. Raises
+        OSError when the process is gone.
+        """
+        base = f"{self.proc}/{pid}/"
+        stat_fd = os.open(base + "stat", os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            statm_fd = os.open(base + "statm", os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            os.close(stat_fd)
+            raise
+        try:
+            n = os.preadv(stat_fd, [self._stat_buf], 0)
+            m = os.preadv(statm_fd, [self._statm_buf], 0)
+        except OSError:
+            os.close(stat_fd); os.close(statm_fd)
+            raise
+        buf = self._stat_buf
+        r = buf.rfind(b")", 0, n)
+        head = bytes(buf[:r + 1])
+        starttime = int(buf[r + 2:n].split(None, _START + 1)[_START])
+        if entry is None or entry.starttime != starttime:
+            comm = head[head.find(b"(") + 1:-1].decode("utf-8", "replace")
+            try:
+                uid = os.fstat(stat_fd).st_uid
+            except OSError:
+                uid = -1
+            entry = _Entry(head, starttime, comm, self._cmdline(pid, comm), uid, -1, -1)
+        io_fd = -1
+        if self.io:
+            try:
+                io_fd = os.open(base + "io", os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                pass
+        k = self._read_io(io_fd)
+        if self._open < self.max_open:
+            entry.stat_fd, entry.statm_fd = stat_fd, statm_fd
+            entry.io_fd = io_fd if k >= 0 else -1
+            self._open += 1
+            if k < 0 and io_fd >= 0:
+                os.close(io_fd)
+        else:
+            os.close(stat_fd); os.close(statm_fd)
+            if io_fd >= 0:
+                os.close(io_fd)
+        return entry, n, m, k
+
+    def refresh(self):
+        table = ProcTable(time.monotonic())
+        entries = self._entries
+        sbuf, mbuf = self._stat_buf, self._statm_buf
+        ibuf = self._io_buf
+        sbufs, mbufs = [sbuf], [mbuf]
+        preadv = os.preadv
+        io = self.io
+        reads, writes = [], []
+        pids, ppids, states, threads = [], [], bytearray(), []
+        cpu, starts, vsize, rss, shared = [], [], [], [], []
+        uids, names, cmdlines = [], [], []
+        live = {}
+        for name in os.listdir(self.proc):
+            if not name.isdigit():
+                continue
+            pid = int(name)
+            entry = entries.get(pid)
+            n = -1
+            if entry is not None and entry.stat_fd >= 0:
+                try:
+                    n = preadv(entry.stat_fd, sbufs, 0)
+                    m = preadv(entry.statm_fd, mbufs, 0)
+                except OSError:
+                    # ESRCH: the held files belong to a process that exited,
+                    # and the pid may already name a new one
+                    self._close(entry)
+                    n = -1
+            if n < 0:
+                try:
+                    entry, n, m, k = self._read_new(pid, entry)
+                except OSError:
+                    continue
+            elif io:
+                k = self._read_io(entry.io_fd)
+            r = sbuf.rfind(b")", 0, n)
+            head = entry.head
+            if r + 1 != len(head) or not sbuf.startswith(head):
+                # exec keeps the pid and start time but replaces comm and cmdline
+                entry.head = head = bytes(sbuf[:r + 1])
+                entry.name = head[head.find(b"(") + 1:-1].decode("utf-8", "replace")
+                entry.cmdline = self._cmdline(pid, entry.name)
+            live[pid] = entry
+            f = sbuf[r + 2:n].split(None, _START + 1)
+            statm = mbuf[:m].split(None, 3)
+
+            pids.append(pid)
+            ppids.append(int(f[_PPID]))
+            states.append(f[_STATE][0])
+            threads.append(int(f[_THREADS]))
+            cpu.append(int(f[_UTIME]) + int(f[_STIME]))
+            starts.append(entry.starttime)
+            vsize.append(int(statm[0]))
+            rss.append(int(statm[1]))
+            shared.append(int(statm[2]))
+            uids.append(entry.uid)
+            names.append(entry.name)
+            cmdlines.append(entry.cmdline)
+            if io and k > 0:
+                # rchar wchar syscr syscw read_bytes write_bytes ..., "key: value"
+                t = ibuf[:k].split(None, 12)
+                reads.append(int(t[9]))
+                writes.append(int(t[11]))
+            else:
+                reads.append(-1)
+                writes.append(-1)
+
+        for pid, entry in entries.items():
+            if live.get(pid) is not entry:
+                self._close(entry)
+        self._entries = live
+
+        table.pid.extend(pids)
+        table.ppid.extend(ppids)
+        table.state = states
+        table.threads.extend(threads)
+        table.cpu_ticks.extend(cpu)
+        table.starttime.extend(starts)
+        table.vsize_kb.extend(v * PAGE_KB for v in vsize)
+        table.rss_kb.extend(v * PAGE_KB for v in rss)
+        table.shared_kb.extend(v * PAGE_KB for v in shared)
+        table.uid.extend(uids)
+        table.read_bytes.extend(reads)
+        table.write_bytes.extend(writes)
+        table.name = names
+        table.cmdline = cmdlines
+        return table
+
+    def close(self):
+        for entry in self._entries.values():
+            self._close(entry)
+        self._entries.clear()
+
+
+class ProcHistory:
+    """Per-process rates between consecutive tables, with a ring of recent samples.
+
+    update(table) adds the cpu_pct, read_bps, write_bps and rss_growth
+    columns (array('d'), aligned with the table's rows) and appends them to
+    each process's history. Histories live in one flat array per series,
+    `length` slots per process; every process is sampled on the same tick,
+    so all rings share a single write position. Slots of exited processes
+    are recycled.
+    """
+
+    SERIES = ("cpu_pct", "read_bps", "write_bps", "rss_growth")
+
+    def __init__(self, length=60):
+        self.length = length
+        self.data = {name: array("d") for name in self.SERIES}
+        self._slots = {}            # (pid, starttime) -> slot
+        self._free = []
+        self._filled = array("l")   # valid samples per slot
+        self._pos = 0
+        self._prev = None
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._filled[slot] = 0
+            else:
+                slot = len(self._filled)
+                self._filled.append(0)
+                blank = array("d", bytes(8 * self.length))
+                for data in self.data.values():
+                    data.extend(blank)
+            self._slots[key] = slot
+        return slot
+
+    def update(self, table):
+        prev = self._prev
+        rows = len(table)
+        dt = table.timestamp - prev.timestamp if prev is not None else 0.0
+        cpu = array("d", bytes(8 * rows))
+        reads = array("d", bytes(8 * rows))
+        writes = array("d", bytes(8 * rows))
+        growth = array("d", bytes(8 * rows))
+        series = (cpu, reads, writes, growth)
+        if dt > 0:
+            tick_pct = 100.0 / CLK_TCK / dt
+            for i in range(rows):
+                j = prev.index(table.pid[i])
+                if j is None or prev.starttime[j] != table.starttime[i]:
+                    continue
+                cpu[i] = (table.cpu_ticks[i] - prev.cpu_ticks[j]) * tick_pct
+                growth[i] = (table.rss_kb[i] - prev.rss_kb[j]) / dt
+                if table.read_bytes[i] >= 0 and prev.read_bytes[j] >= 0:
+                    reads[i] = (table.read_bytes[i] - prev.read_bytes[j]) / dt
+                    writes[i] = (table.write_bytes[i] - prev.write_bytes[j]) / dt
+        table.cpu_pct, table.read_bps, table.write_bps, table.rss_growth = series
+
+        live = set()
+        pos, length, filled = self._pos, self.length, self._filled
+        slots = self._slots
+        cpu_h, read_h, write_h, growth_h = (self.data[name] for name in self.SERIES)
+        for i, key in enumerate(zip(table.pid, table.starttime)):
+            live.add(key)
+            slot = slots.get(key)
+            if slot is None:
+                slot = self._slot(key)
+            at = slot * length + pos
+            cpu_h[at] = cpu[i]
+            read_h[at] = reads[i]
+            write_h[at] = writes[i]
+            growth_h[at] = growth[i]
+            if filled[slot] < length:
+                filled[slot] += 1
+        for key in [k for k in self._slots if k not in live]:
+            self._free.append(self._slots.pop(key))
+        self._pos = (pos + 1) % length
+        self._prev = table
+        return table
+
+    def samples(self, pid, starttime, name="cpu_pct"):
+        """Recorded values of one series for a process, oldest first."""
+        slot = self._slots.get((pid, starttime))
+        if slot is None:
+            return []
+        data, length, base = self.data[name], self.length, slot * self.length
+        n = self._filled[slot]
+        return [data[base + (self._pos - n + k) % length] for k in range(n)]
+
+
+if __name__ == "__main__":
+    snap = ProcSnapshot(io=True)
+    history = ProcHistory()
+    start = time.perf_counter()
+    table = snap.refresh()
+    cold = time.perf_counter() - start
+    times = []
+    for _ in range(20):
+        start = time.perf_counter()
+        table = history.update(snap.refresh())
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"{len(table)} processes: cold {cold * 1000:.2f} ms, "
+          f"warm median {times[len(times) // 2] * 1000:.2f} ms with io and history")
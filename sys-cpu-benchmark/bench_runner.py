@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""Benchmark workloads and the runner behind CPU Benchmark.
+
+Each workload runs a few untimed warm-up rounds and then N timed
+repetitions; results carry median, p95 and standard deviation. A workload can
+also be run on every core at once through a process pool to measure scaling.
+Scores are normalized against a reference machine profile (1000 = reference).
+
+Sweeps characterize the memory subsystem instead: each one measures a
+throughput or latency across working-set sizes from L1 out to DRAM (or across
+file and buffer sizes) and yields one curve per series.
+
+Run headless with:
+
+    flatpak run --command=cpu-benchmark-cli com.pens.CpuBenchmark --reps 5 --json results.json
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+REFERENCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_profile.json")
+
+
+def bench_fibonacci(n=35):
+    def fib(n):
+        if n < 2: return n
+        return fib(n-1) + fib(n-2)
+    start = time.perf_counter()
+    fib(n)
+    return time.perf_counter() - start
+
+def bench_primes(limit=100000):
+    start = time.perf_counter()
+    sieve = [True] * (limit + 1)
+    sieve[0] = sieve[1] = False
+    for i in range(2, int(math.sqrt(limit)) + 1):
+        if sieve[i]:
+            for j in range(i*i, limit+1, i):
+                sieve[j] = False
+    return time.perf_counter() - start
+
+def bench_float(n=5_000_000):
+    start = time.perf_counter()
+    x = 0.0
+    for i in range(n):
+        x += math.sin(i) * math.cos(i)
+    return time.perf_counter() - start
+
+def bench_sort(n=500_000):
+    data = [random.random() for _ in range(n)]
+    start = time.perf_counter()
+    data.sort()
+    return time.perf_counter() - start
+
+def bench_string(n=100_000):
+    start = time.perf_counter()
+    s = ""
+    for i in range(n):
+        s += str(i)
+    return time.perf_counter() - start
+
+def bench_memory(n=1_000_000):
+    start = time.perf_counter()
+    data = list(range(n))
+    data2 = [x * 2 for x in data]
+    del data, data2
+    return time.perf_counter() - start
+
+BENCHMARKS = [
+    ("Fibonacci (n=35)", bench_fibonacci),
+    ("Prime Sieve (100k)", bench_primes),
+    ("Float Math (5M ops)", bench_float),
+    ("Sort (500k items)", bench_sort),
+    ("String concat (100k)", bench_string),
+    ("Memory alloc (1M)", bench_memory),
+]
+
+KB, MB = 1024, 1024 * 1024
+
+CACHE_SIZES = [4*KB, 16*KB, 64*KB, 256*KB, 1*MB, 4*MB, 16*MB, 64*MB]
+FILE_SIZES = [1*MB, 4*MB, 16*MB, 64*MB]
+BUFFER_SIZES = [4*KB, 64*KB, 1*MB, 16*MB]
+
+# Each sweep function sets up a working set of `size` bytes and returns a
+# callable that performs one timed measurement and returns its value.
+
+def sweep_copy(size, traffic=64*MB):
+    src = memoryview(bytearray(b"\x5a") * size)
+    dst = memoryview(bytearray(size))
+    rounds = max(1, traffic // size)
+    def measure():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            dst[:] = src
+        return size * rounds / (time.perf_counter() - start) / MB
+    return measure
+
+def sweep_latency(size, steps=1_000_000):
+    # one link per 64-byte line, visited in a single random cycle (Sattolo)
+    slots = max(2, size // 64)
+    order = list(range(slots))
+    rng = random.Random(size)
+    for i in range(slots - 1, 0, -1):
+        j = rng.randrange(i)
+        order[i], order[j] = order[j], order[i]
+    chain = array("Q", bytes(size if size >= 128 else 128))
+    for a in range(slots):
+        chain[a * 8] = order[a] * 8
+    def measure():
+        i = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            i = chain[i]
+        return (time.perf_counter() - start) / steps * 1e9
+    return measure
+
+def _mapped_file(size):
+    f = tempfile.TemporaryFile()
+    block = os.urandom(min(size, MB))
+    for _ in range(size // len(block)):
+        f.write(block)
+    f.flush()
+    return f, mmap.mmap(f.fileno(), size, prot=mmap.PROT_READ)
+
+def sweep_mmap_seq(size, chunk=64*KB):
+    f, mm = _mapped_file(size)
+    offsets = range(0, size, chunk)
+    def measure():
+        start = time.perf_counter()
+        for off in offsets:
+            mm[off:off + chunk]
+        return size / (time.perf_counter() - start) / MB
+    measure.keep = f
+    return measure
+
+def sweep_mmap_random(size, page=4*KB):
+    f, mm = _mapped_file(size)
+    offsets = list(range(0, size, page))
+    random.Random(size).shuffle(offsets)
+    def measure():
+        start = time.perf_counter()
+        for off in offsets:
+            mm[off:off + page]
+        return size / (time.perf_counter() - start) / MB
+    measure.keep = f
+    return measure
+
+def _text_buffer(size):
+    rng = random.Random(size)
+    words = [bytes(rng.choices(b"abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 9))) for _ in range(512)]
+    out = bytearray()
+    while len(out) < size:
+        out += b" ".join(rng.choices(words, k=256)) + b"\n"
+    return bytes(out[:size])
+
+def sweep_zlib(size, traffic=8*MB):
+    data = _text_buffer(size)
+    rounds = max(1, traffic // size)
+    def measure():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            zlib.compress(data, 6)
+        return size * rounds / (time.perf_counter() - start) / MB
+    return measure
+
+def sweep_sha256(size, traffic=32*MB):
+    data = _text_buffer(size)
+    rounds = max(1, traffic // size)
+    def measure():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            hashlib.sha256(data).digest()
+        return size * rounds / (time.perf_counter() - start) / MB
+    return measure
+
+# (family, unit, sizes, [(series, sweep function)])
+SWEEPS = [
+    ("Memory copy bandwidth", "MB/s", CACHE_SIZES, [("memoryview copy", sweep_copy)]),
+    ("Pointer-chase latency", "ns/load", CACHE_SIZES, [("random cycle", sweep_latency)]),
+    ("mmap read", "MB/s", FILE_SIZES, [("sequential", sweep_mmap_seq),
+                                       ("random 4K", sweep_mmap_random)]),
+    ("Compression & hashing", "MB/s", BUFFER_SIZES, [("zlib -6", sweep_zlib),
+                                                     ("sha256", sweep_sha256)]),
+]
+
+# times: timed repetitions on one core; parallel_times: per round with
+# `workers` copies running at once, the time the slowest copy reported;
+# speedup: throughput of such a round relative to a single copy (ideal ==
+# workers)
+Result = namedtuple("Result", "name times median p95 stdev score workers parallel_times speedup")
+
+CSV_FIELDS = ["name", "median", "p95", "stdev", "score", "workers", "parallel_median", "speedup"]
+
+# series: {series name: [(size, median, p95), ...]}
+SweepResult = namedtuple("SweepResult", "name unit series")
+
+SWEEP_CSV_FIELDS = ["family", "series", "size_bytes", "unit", "median", "p95"]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    k = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def load_reference(path=REFERENCE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"machine": None, "medians": {}}
+
+
+def score(name, median, reference):
+    ref = reference.get("medians", {}).get(name)
+    if not ref or median <= 0:
+        return None
+    return round(1000 * ref / median)
+
+
+def make_pool(workers):
+    # forkserver keeps the GTK process and its threads out of the children
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("forkserver"))
+
+
+def run_parallel(fn, workers, rounds, pool=None):
+    """Per round of `workers` copies of fn at once, the slowest copy's own time.
+
+    Like the serial repetitions, this is what fn() reports, so setup that
+    fn leaves out of its timing and the pool's IPC count on neither side.
+    """
+    own = pool is None
+    pool = pool or make_pool(workers)
+    try:
+        # one untimed round starts every worker process
+        list(pool.map(_call, [fn] * workers))
+        return [max(pool.map(_call, [fn] * workers)) for _ in range(rounds)]
+    finally:
+        if own:
+            pool.shutdown()
+
+
+def _call(fn):
+    return fn()
+
+
+def run_benchmark(name, fn, warmup=1, reps=5, workers=1, reference=None, pool=None):
+    for _ in range(warmup):
+        fn()
+    times = [fn() for _ in range(reps)]
+    median = statistics.median(times)
+    parallel, speedup = [], None
+    if workers > 1:
+        parallel = run_parallel(fn, workers, reps, pool)
+        speedup = workers * median / statistics.median(parallel)
+    return Result(name, times, median, percentile(times, 95),
+                  statistics.stdev(times) if len(times) > 1 else 0.0,
+                  score(name, median, reference or {}), workers, parallel, speedup)
+
+
+def run_all(benchmarks=BENCHMARKS, warmup=1, reps=5, workers=1, reference=None, progress=None):
+    """Run every benchmark in turn; progress(i, total, name) is called before each."""
+    reference = reference if reference is not None else load_reference()
+    pool = make_pool(workers) if workers > 1 else None
+    results = []
+    try:
+        for i, (name, fn) in enumerate(benchmarks):
+            if progress:
+                progress(i, len(benchmarks), name)
+            results.append(run_benchmark(name, fn, warmup, reps, workers, reference, pool))
+    finally:
+        if pool:
+            pool.shutdown()
+    return results
+
+
+def run_sweep(name, unit, sizes, series, warmup=1, reps=3, progress=None):
+    """Measure every series at every size; progress(label) is called before each point."""
+    curves = {}
+    for label, fn in series:
+        points = curves[label] = []
+        for size in sizes:
+            if progress:
+                progress(f"{name}: {label} @ {format_size(size)}")
+            measure = fn(size)
+            for _ in range(warmup):
+                measure()
+            values = [measure() for _ in range(reps)]
+            points.append((size, statistics.median(values), percentile(values, 95)))
+            del measure
+    return SweepResult(name, unit, curves)
+
+
+def run_sweeps(sweeps=SWEEPS, warmup=1, reps=3, progress=None):
+    return [run_sweep(name, unit, sizes, series, warmup, reps, progress)
+            for name, unit, sizes, series in sweeps]
+
+
+def format_size(size):
+    for unit, scale in (("M", MB), ("K", KB)):
+        if size >= scale:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+def total_score(results):
+    """Geometric mean of the per-benchmark scores, or None without a reference."""
+    scores = [r.score for r in results if r.score]
+    if not scores:
+        return None
+    return round(math.exp(sum(math.log(s) for s in scores) / len(scores)))
+
+
+def machine_info():
+    model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name") or line.startswith("Model"):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {"cpu": model, "cores": os.cpu_count(), "machine": platform.machine(),
+            "python": platform.python_version()}
+
+
+def export_json(results, path, reference=None, sweeps=()):
+    data = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": machine_info(),
+        "reference": (reference or {}).get("machine"),
+        "total_score": total_score(results),
+        "results": [r._asdict() for r in results],
+        "sweeps": [sw._asdict() for sw in sweeps],
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def export_csv(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for r in results:
+            writer.writerow([r.name, f"{r.median:.6f}", f"{r.p95:.6f}", f"{r.stdev:.6f}",
+                             r.score if r.score is not None else "", r.workers,
+                             f"{statistics.median(r.parallel_times):.6f}" if r.parallel_times else "",
+                             f"{r.speedup:.2f}" if r.speedup else ""])
+
+
+def export_sweeps_csv(sweeps, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_CSV_FIELDS)
+        for sw in sweeps:
+            for label, points in sw.series.items():
+                for size, median, p95 in points:
+                    writer.writerow([sw.name, label, size, sw.unit, f"{median:.3f}", f"{p95:.3f}"])
+
+
+def save_reference(results, path):
+    with open(path, "w") as f:
+        json.dump({"machine": machine_info(),
+                   "medians": {r.name: round(r.median, 6) for r in results}}, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless CPU benchmark runner")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--reps", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes for the all-core run (1 disables it)")
+    parser.add_argument("--only", nargs="+", metavar="NAME",
+                        help="run benchmarks whose name starts with one of these")
+    parser.add_argument("--reference", default=REFERENCE_FILE)
+    parser.add_argument("--save-reference", metavar="PATH",
+                        help="write these medians as a new reference profile")
+    parser.add_argument("--sweeps", action="store_true",
+                        help="also run the memory, cache and I/O sweeps")
+    parser.add_argument("--sweeps-only", action="store_true")
+    parser.add_argument("--json", metavar="PATH")
+    parser.add_argument("--csv", metavar="PATH")
+    parser.add_argument("--sweeps-csv", metavar="PATH")
+    args = parser.parse_args(argv)
+
+    benchmarks = [] if args.sweeps_only else BENCHMARKS
+    if args.only:
+        benchmarks = [b for b in BENCHMARKS if any(b[0].lower().startswith(o.lower()) for o in args.only)]
+    reference = load_reference(args.reference)
+    results = run_all(benchmarks, args.warmup, args.reps, args.workers, reference,
+                      lambda i, n, name: print(f"[{i + 1}/{n}] {name}", file=sys.stderr))
+
+    if results:
+        print(f"{'benchmark':<24}{'median s':>10}{'p95 s':>10}{'stdev':>9}{'score':>7}{'speedup':>9}")
+        for r in results:
+            speedup = f"{r.speedup:.2f}x" if r.speedup else "-"
+            print(f"{r.name:<24}{r.median:>10.4f}{r.p95:>10.4f}{r.stdev:>9.4f}"
+                  f"{r.score if r.score is not None else '-':>7}{speedup:>9}")
+        print(f"Total score: {total_score(results) or '-'} (reference: "
+              f"{(reference.get('machine') or {}).get('cpu', 'none')})")
+
+    sweeps = []
+    if args.sweeps or args.sweeps_only:
+        sweeps = run_sweeps(warmup=args.warmup, reps=args.reps,
+                            progress=lambda label: print(label, file=sys.stderr))
+        for sw in sweeps:
+            print(f"\n{sw.name} ({sw.unit})")
+            for label, points in sw.series.items():
+                print(f"  {label:<18}" + "".join(f"{format_size(size):>7}:{median:<9.1f}"
+                                                  for size, median, _ in points))
+
+    if args.json:
+        export_json(results, args.json, reference, sweeps)
+    if args.csv:
+        export_csv(results, args.csv)
+    if args.sweeps_csv:
+        export_sweeps_csv(sweeps, args.sweeps_csv)
+    if args.save_reference:
+        save_reference(results, args.save_reference)
+
+
+if __name__ == "__main__":
+    main()
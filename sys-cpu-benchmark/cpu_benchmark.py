@@ -3,61 +3,11 @@ import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
 import time, threading, math, os, multiprocessing
+from bench_runner import (BENCHMARKS, SWEEPS, export_csv, export_json, export_sweeps_csv,
+                          format_size, load_reference, make_pool, run_benchmark, run_sweep,
+                          total_score)
 
-def bench_fibonacci(n=35):
-    def fib(n):
-        if n < 2: return n
-        return fib(n-1) + fib(n-2)
-    start = time.perf_counter()
-    fib(n)
-    return time.perf_counter() - start
-
-def bench_primes(limit=100000):
-    start = time.perf_counter()
-    sieve = [True] * (limit + 1)
-    sieve[0] = sieve[1] = False
-    for i in range(2, int(math.sqrt(limit)) + 1):
-        if sieve[i]:
-            for j in range(i*i, limit+1, i):
-                sieve[j] = False
-    return time.perf_counter() - start
-
-def bench_float(n=5_000_000):
-    start = time.perf_counter()
-    x = 0.0
-    for i in range(n):
-        x += math.sin(i) * math.cos(i)
-    return time.perf_counter() - start
-
-def bench_sort(n=500_000):
-    import random
-    data = [random.random() for _ in range(n)]
-    start = time.perf_counter()
-    data.sort()
-    return time.perf_counter() - start
-
-def bench_string(n=100_000):
-    start = time.perf_counter()
-    s = ""
-    for i in range(n):
-        s += str(i)
-    return time.perf_counter() - start
-
-def bench_memory(n=1_000_000):
-    start = time.perf_counter()
-    data = list(range(n))
-    data2 = [x * 2 for x in data]
-    del data, data2
-    return time.perf_counter() - start
-
-BENCHMARKS = [
-    ("Fibonacci (n=35)", bench_fibonacci),
-    ("Prime Sieve (100k)", bench_primes),
-    ("Float Math (5M ops)", bench_float),
-    ("Sort (500k items)", bench_sort),
-    ("String concat (100k)", bench_string),
-    ("Memory alloc (1M)", bench_memory),
-]
+DATA_DIR = os.path.expanduser("~/.local/share/com.pens.CpuBenchmark")
 
 class CPUBenchmarkWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -65,7 +15,9 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
         self.set_title("CPU Benchmark")
         self.set_default_size(700, 580)
         self.results = {}
+        self.sweeps = {}
         self.running = False
+        self.reference = load_reference()
         self.build_ui()
         self.load_system_info()
 
@@ -88,18 +40,42 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
         self.status_label = Gtk.Label(label="Press 'Run All Benchmarks' to start", xalign=0)
         vbox.append(self.status_label)
 
+        opts = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+        opts.append(Gtk.Label(label="Warm-up:"))
+        self.warmup_spin = Gtk.SpinButton.new_with_range(0, 10, 1)
+        self.warmup_spin.set_value(1)
+        opts.append(self.warmup_spin)
+        opts.append(Gtk.Label(label="Repetitions:"))
+        self.reps_spin = Gtk.SpinButton.new_with_range(1, 50, 1)
+        self.reps_spin.set_value(3)
+        opts.append(self.reps_spin)
+        self.allcore_check = Gtk.CheckButton(label=f"All-core scaling ({os.cpu_count()} processes)")
+        opts.append(self.allcore_check)
+        ref = (self.reference.get("machine") or {}).get("cpu", "none")
+        opts.append(Gtk.Label(label=f"Reference: {ref}", css_classes=["dim-label"]))
+        vbox.append(opts)
+
         scroll = Gtk.ScrolledWindow(); scroll.set_vexpand(True)
-        self.result_store = Gtk.ListStore(str, str, str)
+        self.result_store = Gtk.ListStore(str, str, str, str, str, str)
         tree = Gtk.TreeView(model=self.result_store)
-        for i, (title, width) in enumerate([("Benchmark", 250), ("Time (s)", 120), ("Score", 120)]):
+        for i, (title, width) in enumerate([("Benchmark", 200), ("Median (s)", 90), ("p95 (s)", 90),
+                                            ("Std dev", 80), ("Score", 70), ("Scaling", 90)]):
             col = Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i)
             col.set_resizable(True); col.set_fixed_width(width)
             tree.append_column(col)
         scroll.set_child(tree)
         vbox.append(scroll)
 
+        self.chart_combo = Gtk.ComboBoxText()
+        self.chart_combo.append_text("Scores")
+        for name, unit, _, _ in SWEEPS:
+            self.chart_combo.append_text(name)
+        self.chart_combo.set_active(0)
+        self.chart_combo.connect("changed", lambda c: self.chart.queue_draw())
+        vbox.append(self.chart_combo)
+
         self.chart = Gtk.DrawingArea()
-        self.chart.set_size_request(-1, 120)
+        self.chart.set_size_request(-1, 160)
         self.chart.set_draw_func(self.draw_chart)
         vbox.append(self.chart)
 
@@ -108,12 +84,23 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
         self.run_btn = Gtk.Button(label="▶ Run All Benchmarks")
         self.run_btn.connect("clicked", self.on_run_all)
         btn_box.append(self.run_btn)
+        self.sweep_btn = Gtk.Button(label="▶ Memory / I/O Sweeps")
+        self.sweep_btn.connect("clicked", self.on_run_sweeps)
+        btn_box.append(self.sweep_btn)
         for label, fn in BENCHMARKS:
             btn = Gtk.Button(label=f"Run: {label[:20]}")
             btn.connect("clicked", self.on_run_single, label, fn)
             btn_box.append(btn)
         vbox.append(btn_box)
 
+        export_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+        export_box.set_halign(Gtk.Align.CENTER)
+        for label, fmt in (("Export JSON", "json"), ("Export CSV", "csv")):
+            btn = Gtk.Button(label=label)
+            btn.connect("clicked", self.on_export, fmt)
+            export_box.append(btn)
+        vbox.append(export_box)
+
     def load_system_info(self):
         info_parts = []
         try:
@@ -140,6 +127,10 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
             pass
         self.sys_label.set_text("  |  ".join(info_parts))
 
+    def run_options(self):
+        workers = os.cpu_count() if self.allcore_check.get_active() else 1
+        return int(self.warmup_spin.get_value()), int(self.reps_spin.get_value()), workers
+
     def on_run_all(self, btn):
         if self.running:
             return
@@ -147,46 +138,108 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
         self.run_btn.set_sensitive(False)
         self.result_store.clear()
         self.results = {}
-        threading.Thread(target=self._run_all, daemon=True).start()
+        threading.Thread(target=self._run_all, args=self.run_options(), daemon=True).start()
 
-    def _run_all(self):
+    def _run_all(self, warmup, reps, workers):
         total = len(BENCHMARKS)
-        for i, (name, fn) in enumerate(BENCHMARKS):
-            GLib.idle_add(self.status_label.set_text, f"Running: {name}...")
-            GLib.idle_add(self.progress.set_fraction, i / total)
-            t = fn()
-            score = int(100 / t) if t > 0 else 9999
-            self.results[name] = (t, score)
-            GLib.idle_add(self.result_store.append, [name, f"{t:.4f}", str(score)])
+        pool = make_pool(workers) if workers > 1 else None
+        try:
+            for i, (name, fn) in enumerate(BENCHMARKS):
+                GLib.idle_add(self.status_label.set_text, f"Running: {name}...")
+                GLib.idle_add(self.progress.set_fraction, i / total)
+                result = run_benchmark(name, fn, warmup, reps, workers, self.reference, pool)
+                GLib.idle_add(self.add_result, result)
+        finally:
+            if pool:
+                pool.shutdown()
         GLib.idle_add(self.on_done)
 
+    def add_result(self, r):
+        self.results[r.name] = r
+        self.result_store.append([r.name, f"{r.median:.4f}", f"{r.p95:.4f}", f"±{r.stdev:.4f}",
+                                  str(r.score) if r.score is not None else "-",
+                                  f"{r.speedup:.2f}x / {r.workers}" if r.speedup else "-"])
+        self.chart.queue_draw()
+        return False
+
     def on_done(self):
         self.running = False
         self.run_btn.set_sensitive(True)
-        total_score = sum(s for _, (_, s) in self.results.items())
-        self.status_label.set_text(f"Done! Total score: {total_score}")
+        total = total_score(self.results.values())
+        self.status_label.set_text(f"Done! Total score: {total if total is not None else '-'}")
         self.progress.set_fraction(1)
         self.chart.queue_draw()
         return False
 
     def on_run_single(self, btn, label, fn):
-        threading.Thread(target=self._run_single, args=(label, fn), daemon=True).start()
+        threading.Thread(target=self._run_single, args=(label, fn) + self.run_options(),
+                         daemon=True).start()
 
-    def _run_single(self, label, fn):
+    def _run_single(self, label, fn, warmup, reps, workers):
         GLib.idle_add(self.status_label.set_text, f"Running: {label}...")
-        t = fn()
-        score = int(100 / t) if t > 0 else 9999
-        self.results[label] = (t, score)
-        GLib.idle_add(self.result_store.append, [label, f"{t:.4f}", str(score)])
-        GLib.idle_add(self.status_label.set_text, f"{label}: {t:.4f}s (score: {score})")
-        GLib.idle_add(self.chart.queue_draw)
+        r = run_benchmark(label, fn, warmup, reps, workers, self.reference)
+        GLib.idle_add(self.add_result, r)
+        GLib.idle_add(self.status_label.set_text,
+                      f"{label}: median {r.median:.4f}s (score: {r.score if r.score is not None else '-'})")
+
+    def on_run_sweeps(self, btn):
+        if self.running:
+            return
+        self.running = True
+        self.run_btn.set_sensitive(False)
+        self.sweep_btn.set_sensitive(False)
+        warmup, reps, _ = self.run_options()
+        threading.Thread(target=self._run_sweeps, args=(warmup, reps), daemon=True).start()
+
+    def _run_sweeps(self, warmup, reps):
+        for i, (name, unit, sizes, series) in enumerate(SWEEPS):
+            GLib.idle_add(self.progress.set_fraction, i / len(SWEEPS))
+            result = run_sweep(name, unit, sizes, series, warmup, reps,
+                               lambda label: GLib.idle_add(self.status_label.set_text,
+                                                           f"Running: {label}..."))
+            GLib.idle_add(self.add_sweep, i + 1, result)
+        GLib.idle_add(self.on_sweeps_done)
+
+    def add_sweep(self, index, result):
+        self.sweeps[result.name] = result
+        self.chart_combo.set_active(index)
+        self.chart.queue_draw()
+        return False
+
+    def on_sweeps_done(self):
+        self.running = False
+        self.run_btn.set_sensitive(True)
+        self.sweep_btn.set_sensitive(True)
+        self.status_label.set_text("Sweeps done")
+        self.progress.set_fraction(1)
+        return False
+
+    def on_export(self, btn, fmt):
+        if not self.results and not self.sweeps:
+            self.status_label.set_text("Nothing to export yet")
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(DATA_DIR, f"results-{stamp}.{fmt}")
+        results, sweeps = list(self.results.values()), list(self.sweeps.values())
+        if fmt == "json":
+            export_json(results, path, self.reference, sweeps)
+        else:
+            export_csv(results, path)
+            if sweeps:
+                export_sweeps_csv(sweeps, os.path.join(DATA_DIR, f"sweeps-{stamp}.csv"))
+        self.status_label.set_text(f"Saved {path}")
 
     def draw_chart(self, area, cr, w, h):
         cr.set_source_rgb(0.08, 0.08, 0.12); cr.rectangle(0, 0, w, h); cr.fill()
+        sweep = self.sweeps.get(self.chart_combo.get_active_text())
+        if sweep:
+            self.draw_sweep(cr, w, h, sweep)
+            return
         if not self.results:
             return
         names = list(self.results.keys())
-        scores = [self.results[n][1] for n in names]
+        scores = [self.results[n].score or 0 for n in names]
         mx = max(scores) or 1
         bw = w / len(names)
         colors = [(0.3,0.6,0.9),(0.9,0.4,0.3),(0.3,0.8,0.4),(0.9,0.7,0.2),(0.7,0.3,0.9),(0.3,0.9,0.9)]
@@ -201,6 +254,36 @@ class CPUBenchmarkWindow(Gtk.ApplicationWindow):
             cr.move_to(i*bw + 4, h - 24 - bh)
             cr.show_text(str(score))
 
+    def draw_sweep(self, cr, w, h, sweep):
+        """Size (log scale) against throughput or latency, one line per series."""
+        colors = [(0.3,0.6,0.9),(0.9,0.4,0.3),(0.3,0.8,0.4),(0.9,0.7,0.2)]
+        sizes = sorted({size for pts in sweep.series.values() for size, _, _ in pts})
+        top = max(v for pts in sweep.series.values() for _, v, _ in pts) or 1
+        left, bottom = 50, 20
+        lo, hi = math.log2(sizes[0]), math.log2(sizes[-1])
+        def px(size):
+            return left + (math.log2(size) - lo) / ((hi - lo) or 1) * (w - left - 10)
+        def py(value):
+            return h - bottom - value / top * (h - bottom - 20)
+
+        cr.set_font_size(8)
+        cr.set_source_rgb(0.6, 0.6, 0.6)
+        for size in sizes:
+            cr.move_to(px(size) - 8, h - 6); cr.show_text(format_size(size))
+        for frac in (0, 0.5, 1):
+            cr.move_to(4, py(top * frac) + 3); cr.show_text(f"{top * frac:.0f}")
+        cr.move_to(4, 10); cr.show_text(sweep.unit)
+
+        for i, (label, points) in enumerate(sweep.series.items()):
+            cr.set_source_rgb(*colors[i % len(colors)])
+            cr.set_line_width(2)
+            for j, (size, value, _) in enumerate(points):
+                (cr.line_to if j else cr.move_to)(px(size), py(value))
+            cr.stroke()
+            for size, value, _ in points:
+                cr.arc(px(size), py(value), 2.5, 0, 2 * math.pi); cr.fill()
+            cr.move_to(w - 110, 12 + i * 11); cr.show_text(label)
+
 class CPUBenchmarkApp(Gtk.Application):
     def __init__(self):
         super().__init__(application_id="com.pens.CPUBenchmark")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Directory sizing for the Disk Usage app.
+
+Trees are walked with os.scandir, one worker thread per top-level
+subdirectory. The entry type comes from the directory listing itself, so
+only files and directories are stat()ed. Hard links are counted once per
+scan, keyed by (st_dev, st_ino). The walk stays on the filesystem it starts
+on, like du -x, and there is no cap on the number of files.
+
+What each directory holds directly (bytes of its own files, its hard links
+and the names of its subdirectories) is cached on disk, keyed by the
+directory's mtime. Adding, removing or renaming an entry changes that
+mtime, so an unchanged directory costs one lstat instead of a listing, and
+re-opening a path or going up a level only lists what changed. A file
+growing in place does not touch its directory's mtime; its new size shows
+once something else in that directory changes. The cache is read by the
+first scan, on the scanning thread.
+
+scan() can report progress while it runs: on_progress receives the listing
+with partial totals for the subdirectories still being walked, at most once
+per interval, so the biggest entries show up long before a large mount is
+fully counted.
+
+Run this file with a path to time a cold and a cached scan.
+"""
+import json
+import os
+import stat
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+CACHE_DIR = os.path.expanduser("~/.cache/com.pens.DiskUsage")
+CACHE_FILE = os.path.join(CACHE_DIR, "scan-cache.json")
+WORKERS = 8
+PROGRESS_INTERVAL = 0.1   # seconds between on_progress calls
+# directories modified this recently may change again within the same mtime tick
+SETTLE_NS = 2 * 10**9
+
+
+class _Links:
+    """(st_dev, st_ino) pairs already counted in one scan."""
+
+    def __init__(self):
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def claim(self, links):
+        """Bytes of the hard-linked files in links not yet counted."""
+        total = 0
+        with self.lock:
+            for dev, ino, size in links:
+                if (dev, ino) not in self.seen:
+                    self.seen.add((dev, ino))
+                    total += size
+        return total
+
+
+class DirScanner:
+    def __init__(self, cache_file=CACHE_FILE, workers=WORKERS):
+        self.cache_file = cache_file
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._cache = None    # dir path -> [mtime_ns, own bytes, links, subdir names]
+        self._visited = set()
+        self._roots = set()
+        self._dirty = False
+
+    def _load(self):
+        with self._lock:
+            if self._cache is not None:
+                return
+            try:
+                with open(self.cache_file) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+
+    def _walk(self, path, mtime, dev, links, partial=None, cancelled=None):
+        """Total bytes under path, listing only directories whose mtime moved.
+
+        The running total is published in partial[path] after each directory.
+        """
+        cache, visited = self._cache, self._visited
+        settled = time.time_ns() - SETTLE_NS
+        total = 0
+        stack = [(path, mtime)]
+        while stack:
+            if partial is not None:
+                partial[path] = total
+            if cancelled is not None and cancelled():
+                break
+            d, mtime = stack.pop()
+            visited.add(d)
+            cached = cache.get(d)
+            if cached is not None and cached[0] == mtime:
+                _, own, hard, subdirs = cached
+                total += own + links.claim(hard)
+                for name in subdirs:
+                    sub = os.path.join(d, name)
+                    try:
+                        st = os.lstat(sub)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(st.st_mode) and st.st_dev == dev:
+                        stack.append((sub, st.st_mtime_ns))
+                continue
+            own, hard, subdirs = 0, [], []
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                if st.st_dev == dev:
+                                    subdirs.append(entry.name)
+                                    stack.append((entry.path, st.st_mtime_ns))
+                            elif entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                if st.st_nlink > 1:
+                                    hard.append((st.st_dev, st.st_ino, st.st_size))
+                                else:
+                                    own += st.st_size
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+            if mtime < settled:
+                # save() may be iterating the cache: walkers of a cancelled scan run on
+                with self._lock:
+                    cache[d] = [mtime, own, hard, subdirs]
+                    self._dirty = True
+            total += own + links.claim(hard)
+        return total
+
+    def scan(self, path, on_progress=None, cancelled=None, interval=PROGRESS_INTERVAL):
+        """[(entry path, size, is_dir)] for the entries of path, largest first.
+
+        on_progress(entries, pending) is called from this thread at most once
+        per interval with the same kind of list, unsorted, where the sizes of
+        the directories in the set pending are still growing. Returns None
+        once cancelled() is true.
+        """
+        self._load()
+        root = os.stat(path)
+        links = _Links()
+        files, dirs = [], []
+        futures = {}
+        partial = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_dev == root.st_dev:
+                            partial[entry.path] = 0
+                            futures[self._pool.submit(self._walk, entry.path, st.st_mtime_ns,
+                                                      root.st_dev, links, partial,
+                                                      cancelled)] = entry.path
+                        else:
+                            dirs.append((entry.path, 0, True))   # another filesystem
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        size = st.st_size
+                        if st.st_nlink > 1:
+                            size = links.claim([(st.st_dev, st.st_ino, size)])
+                        files.append((entry.path, size, False))
+                except OSError:
+                    pass
+        pending = set(futures)
+        last = time.monotonic()
+        while pending:
+            finished, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+            if cancelled is not None and cancelled():
+                for f in pending:
+                    f.cancel()
+                return None
+            for f in finished:
+                dirs.append((futures[f], f.result(), True))
+                del partial[futures[f]]
+            now = time.monotonic()
+            if on_progress is not None and pending and now - last >= interval:
+                last = now
+                growing = list(partial.items())
+                on_progress(files + dirs + [(p, size, True) for p, size in growing],
+                            {p for p, _ in growing})
+        with self._lock:
+            self._roots.add(os.path.abspath(path))
+        self.save()
+        return sorted(files + dirs, key=lambda e: e[1], reverse=True)
+
+    def save(self):
+        """Write the cache, dropping directories under scanned paths that are gone."""
+        with self._lock:
+            if not self._dirty:
+                return
+            prefixes = tuple(r.rstrip("/") + "/" for r in self._roots)
+            visited = self._visited
+            stale = [d for d in self._cache if d.startswith(prefixes) and d not in visited]
+            for d in stale:
+                del self._cache[d]
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                tmp = self.cache_file + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self._cache, f, separators=(",", ":"))
+                os.replace(tmp, self.cache_file)
+                self._dirty = False
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.expanduser("~")
+    cache = os.path.join(tempfile.mkdtemp(), "scan-cache.json")
+    for label in ("cold", "cached"):
+        scanner = DirScanner(cache)
+        start = time.perf_counter()
+        results = scanner.scan(target)
+        elapsed = time.perf_counter() - start
+        scanner.shutdown()
+        print(f"{label}: {sum(r[1] for r in results):,} bytes in {len(results)} entries, "
+              f"{elapsed * 1000:.0f} ms")
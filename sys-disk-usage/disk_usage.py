@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib
-import os, threading
+from gi.repository import Gtk, GLib, GObject
+import os, sys, threading
+from dir_scanner import DirScanner
+
+try:
+    import keyed_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import keyed_store
+
+MAX_ROWS = 200
 
 def get_disk_usage(path):
     try:
@@ -21,6 +30,50 @@ def fmt_size(n):
         n /= 1024
     return f"{n:.1f} PB"
 
+def _worst(total, largest, smallest, side):
+    """Worst aspect ratio in a treemap row of the given total area laid along side."""
+    t2, s2 = total * total, side * side
+    return max(s2 * largest / t2, t2 / (s2 * smallest))
+
+def squarify(items, x, y, w, h):
+    """Squarified treemap layout (Bruls, Huizing and van Wijk).
+
+    items is [(key, size)] sorted largest first with positive sizes; returns
+    [(key, x, y, w, h)]. Rows grow along the shorter side of the remaining
+    rectangle while that keeps their worst aspect ratio from getting worse.
+    """
+    rects = []
+    total = sum(size for _, size in items)
+    if total <= 0 or w <= 0 or h <= 0:
+        return rects
+    scale = w * h / total
+    areas = [(key, size * scale) for key, size in items]
+    i = 0
+    while i < len(areas):
+        side = min(w, h)
+        largest = row_sum = areas[i][1]
+        worst = _worst(row_sum, largest, row_sum, side)
+        j = i + 1
+        while j < len(areas):
+            grown = _worst(row_sum + areas[j][1], largest, areas[j][1], side)
+            if grown > worst:
+                break
+            row_sum += areas[j][1]; worst = grown; j += 1
+        if w >= h:
+            col_w = row_sum / h
+            yy = y
+            for key, area in areas[i:j]:
+                rects.append((key, x, yy, col_w, area / col_w)); yy += area / col_w
+            x += col_w; w -= col_w
+        else:
+            row_h = row_sum / w
+            xx = x
+            for key, area in areas[i:j]:
+                rects.append((key, xx, y, area / row_h, row_h)); xx += area / row_h
+            y += row_h; h -= row_h
+        i = j
+    return rects
+
 def get_mounts():
     mounts = []
     try:
@@ -35,41 +88,6 @@ def get_mounts():
         pass
     return mounts
 
-def scan_dir(path, depth=0, max_depth=2):
-    entries = []
-    if depth > max_depth:
-        return entries
-    try:
-        with os.scandir(path) as it:
-            for entry in it:
-                try:
-                    if entry.is_file(follow_symlinks=False):
-                        entries.append((entry.path, entry.stat(follow_symlinks=False).st_size, False))
-                    elif entry.is_dir(follow_symlinks=False):
-                        size = dir_size(entry.path)
-                        entries.append((entry.path, size, True))
-                except Exception:
-                    pass
-    except Exception:
-        pass
-    return sorted(entries, key=lambda e: e[1], reverse=True)
-
-def dir_size(path, max_files=500):
-    total = 0
-    count = 0
-    for dirpath, dirnames, filenames in os.walk(path):
-        for f in filenames:
-            if count >= max_files:
-                break
-            try:
-                total += os.path.getsize(os.path.join(dirpath, f))
-                count += 1
-            except Exception:
-                pass
-        if count >= max_files:
-            break
-    return total
-
 class DiskUsageWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         super().__init__(application=app)
@@ -77,6 +95,14 @@ class DiskUsageWindow(Gtk.ApplicationWindow):
         self.set_default_size(900, 640)
         self.current_path = os.path.expanduser("~")
         self.scan_results = []
+        self.scan_pending = set()
+        self.scan_gen = 0
+        self.posted = None          # latest scan update waiting for the main loop
+        self.post_lock = threading.Lock()
+        self.treemap_rects = []
+        self.treemap_size = None
+        self.scanner = DirScanner()
+        self.connect("close-request", self.on_close_request)
         self.build_ui()
         self.refresh_mounts()
         self.scan_directory(self.current_path)
@@ -122,16 +148,36 @@ class DiskUsageWindow(Gtk.ApplicationWindow):
         vbox.append(self.gauge)
 
         files_frame = Gtk.Frame(label="Directory Contents (by size)")
+        files_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        self.view_stack = Gtk.Stack()
+        switcher = Gtk.StackSwitcher(stack=self.view_stack)
+        switcher.set_halign(Gtk.Align.CENTER)
+        files_box.append(switcher)
+
         scroll_f = Gtk.ScrolledWindow(); scroll_f.set_vexpand(True)
-        self.files_store = Gtk.ListStore(str, str, str)
-        files_tree = Gtk.TreeView(model=self.files_store)
+        # column 3 holds the size in bytes for sorting
+        self.files_rows = keyed_store.KeyedStore((str, str, str, GObject.TYPE_INT64), key=0,
+                                                 name="entries")
+        self.files_rows.model.set_sort_column_id(3, Gtk.SortType.DESCENDING)
+        files_tree = Gtk.TreeView(model=self.files_rows.model)
         files_tree.get_selection().connect("changed", self.on_entry_selected)
-        for i, title in enumerate(["Name", "Size", "Type"]):
+        for i, (title, sort_col) in enumerate([("Name", 0), ("Size", 3), ("Type", 2)]):
             col = Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i)
-            col.set_resizable(True); col.set_sort_column_id(i)
+            col.set_resizable(True); col.set_sort_column_id(sort_col)
             files_tree.append_column(col)
         scroll_f.set_child(files_tree)
-        files_frame.set_child(scroll_f)
+        self.view_stack.add_titled(scroll_f, "list", "List")
+
+        self.treemap = Gtk.DrawingArea()
+        self.treemap.set_vexpand(True)
+        self.treemap.set_draw_func(self.draw_treemap)
+        click = Gtk.GestureClick()
+        click.connect("pressed", self.on_treemap_click)
+        self.treemap.add_controller(click)
+        self.view_stack.add_titled(self.treemap, "treemap", "Treemap")
+
+        files_box.append(self.view_stack)
+        files_frame.set_child(files_box)
         vbox.append(files_frame)
 
         self.status_label = Gtk.Label(label="Scanning...", xalign=0)
@@ -139,6 +185,10 @@ class DiskUsageWindow(Gtk.ApplicationWindow):
 
         self.mount_total = 0; self.mount_used = 0; self.mount_free = 0
 
+    def on_close_request(self, win):
+        self.scanner.shutdown()
+        return False
+
     def refresh_mounts(self):
         self.mounts_store.clear()
         for dev, mp, fstype in get_mounts():
@@ -151,25 +201,94 @@ class DiskUsageWindow(Gtk.ApplicationWindow):
         self.gauge.queue_draw()
 
     def scan_directory(self, path):
+        self.scan_gen += 1
+        gen = self.scan_gen
         self.status_label.set_text(f"Scanning {path}...")
         def worker():
-            results = scan_dir(path)
-            GLib.idle_add(self.show_results, results, path)
+            try:
+                results = self.scanner.scan(
+                    path, lambda entries, pending: self.post_results(gen, path, entries, pending),
+                    lambda: gen != self.scan_gen)
+            except OSError as e:
+                GLib.idle_add(self.status_label.set_text, f"Cannot scan {path}: {e.strerror}")
+                return
+            if results is not None:
+                self.post_results(gen, path, results, set())
         threading.Thread(target=worker, daemon=True).start()
 
-    def show_results(self, results, path):
+    def post_results(self, gen, path, entries, pending):
+        """Hand a scan update to the main loop; updates that arrive before it runs replace each other."""
+        with self.post_lock:
+            queued = self.posted is not None
+            self.posted = (gen, path, entries, pending)
+        if not queued:
+            GLib.idle_add(self.flush_results)
+
+    def flush_results(self):
+        with self.post_lock:
+            gen, path, entries, pending = self.posted
+            self.posted = None
+        if gen == self.scan_gen:
+            self.show_results(entries, path, pending)
+        return False
+
+    def show_results(self, results, path, pending=()):
+        results = sorted(results, key=lambda e: e[1], reverse=True)
         self.scan_results = results
-        self.files_store.clear()
-        for entry_path, size, is_dir in results[:200]:
-            name = os.path.basename(entry_path)
-            kind = "Directory" if is_dir else "File"
-            self.files_store.append([name, fmt_size(size), kind])
-        self.status_label.set_text(f"{path}  |  {len(results)} entries")
-        total, used, free = get_disk_usage(path)
-        self.mount_total = total; self.mount_used = used; self.mount_free = free
-        self.gauge.queue_draw()
+        self.scan_pending = pending
+        self.files_rows.update(
+            [os.path.basename(p), fmt_size(size), "Directory" if is_dir else "File", size]
+            for p, size, is_dir in results[:MAX_ROWS])
+        if pending:
+            counted = sum(size for _, size, _ in results)
+            self.status_label.set_text(f"Scanning {path}...  |  {fmt_size(counted)} so far, "
+                                       f"{len(pending)} directories still counting")
+        else:
+            self.status_label.set_text(f"{path}  |  {len(results)} entries")
+            total, used, free = get_disk_usage(path)
+            self.mount_total = total; self.mount_used = used; self.mount_free = free
+            self.gauge.queue_draw()
+        self.treemap_size = None   # re-layout on the next draw
+        self.treemap.queue_draw()
         return False
 
+    def layout_treemap(self, w, h):
+        items = [((p, size, is_dir), size) for p, size, is_dir in self.scan_results[:MAX_ROWS] if size > 0]
+        self.treemap_rects = squarify(items, 0, 0, w, h)
+        self.treemap_size = (w, h)
+
+    def draw_treemap(self, area, cr, w, h):
+        cr.set_source_rgb(0.12, 0.12, 0.16); cr.rectangle(0, 0, w, h); cr.fill()
+        if self.treemap_size != (w, h):
+            self.layout_treemap(w, h)
+        cr.set_font_size(11)
+        for i, ((path, size, is_dir), x, y, rw, rh) in enumerate(self.treemap_rects):
+            if is_dir:
+                shade = 0.55 + 0.25 * ((i * 7) % 5) / 4
+                color = (0.25, 0.45 * shade + 0.1, 0.8 * shade)
+            else:
+                color = (0.45, 0.45, 0.5)
+            if path in self.scan_pending:
+                color = tuple(c * 0.6 for c in color)
+            cr.set_source_rgb(*color)
+            cr.rectangle(x + 1, y + 1, max(rw - 2, 0), max(rh - 2, 0)); cr.fill()
+            if rw > 60 and rh > 28:
+                cr.set_source_rgb(0.95, 0.95, 0.95)
+                cr.save(); cr.rectangle(x, y, rw, rh); cr.clip()
+                cr.move_to(x + 5, y + 15); cr.show_text(os.path.basename(path))
+                cr.move_to(x + 5, y + 28); cr.show_text(fmt_size(size))
+                cr.restore()
+
+    def on_treemap_click(self, gesture, n_press, px, py):
+        for (path, _, is_dir), x, y, rw, rh in self.treemap_rects:
+            if x <= px < x + rw and y <= py < y + rh:
+                if is_dir:
+                    self.current_path = path
+                    self.path_entry.set_text(path)
+                    self.scan_directory(path)
+                    self.refresh_mounts()
+                return
+
     def draw_gauge(self, area, cr, w, h):
         cr.set_source_rgb(0.15, 0.15, 0.2); cr.rectangle(0, 0, w, h); cr.fill()
         if self.mount_total == 0:
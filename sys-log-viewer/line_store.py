@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Compact line storage and incremental filtering for the Log Viewer.
+
+Lines are kept UTF-8 encoded in one bytearray, with an array of start
+offsets, so a million lines cost their bytes plus eight bytes each instead
+of a Python string apiece. Each line's level (error, warn, info, debug) is
+classified once, when it is appended, and stored as a byte: the batch is
+lowercased in one call and each line is tested with substring checks,
+which are several times faster here than a case-insensitive regex.
+
+LineFilter evaluates a query in steps of bounded size so the caller can
+spread a scan over several main-loop iterations. A query that only narrows
+the previous one (the old text is contained in the new one, same level)
+re-checks just the previous matches, and lines appended later are checked
+on their own.
+
+Text matching is case-insensitive for ASCII letters.
+
+Run this file to time ingest and filtering on a million synthetic lines.
+"""
+import re
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, compress
+
+NONE, DEBUG, INFO, WARN, ERROR = range(5)
+LEVEL_NAMES = {"All": NONE, "ERROR": ERROR, "WARN": WARN, "INFO": INFO, "DEBUG": DEBUG}
+
+_NEWLINE = re.compile(rb"\n")
+
+STEP_LINES = 50000   # lines examined per LineFilter step
+
+
+def classify(lower):
+    """Level of a lowercased line; when it names several, the most severe wins."""
+    if b"error" in lower or b"critical" in lower or b"fatal" in lower:
+        return ERROR
+    if b"warn" in lower:
+        return WARN
+    if b"info" in lower:
+        return INFO
+    if b"debug" in lower:
+        return DEBUG
+    return NONE
+
+
+class LineStore:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])   # line i is data[offsets[i]:offsets[i + 1] - 1]
+        self.levels = bytearray()
+
+    def __len__(self):
+        return len(self.levels)
+
+    def clear(self):
+        self.__init__()
+
+    def append(self, lines):
+        """Add lines (str); returns the index of the first one.
+
+        A line with newlines in it, such as a journal message holding a
+        traceback, is stored as one line per part.
+        """
+        first = len(self.levels)
+        if not lines:
+            return first
+        text = "\n".join(lines)
+        if text.count("\n") != len(lines) - 1:
+            lines = text.split("\n")
+        blob = (text + "\n").encode("utf-8", "replace")
+        base = len(self.data)
+        if blob.isascii():
+            starts = accumulate((len(line) + 1 for line in lines), initial=base)
+            next(starts)
+            self.offsets.extend(starts)
+        else:
+            self.offsets.extend(m.end() + base for m in _NEWLINE.finditer(blob))
+        self.data += blob
+        self.levels += bytearray(map(classify, blob.lower().split(b"\n")[:-1]))
+        return first
+
+    def line(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1] - 1].decode("utf-8", "replace")
+
+    def level(self, i):
+        return self.levels[i]
+
+
+class LineFilter:
+    """Line indices of a LineStore matching a text query and a level.
+
+    Call set(query, level), then run step() until it returns False;
+    matches grows as steps complete. After the store grows, calling step()
+    again checks just the new lines. An empty query and level NONE means
+    every line, with matches left as None.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.query = b""
+        self.level = NONE
+        self.matches = None
+        self._source = None      # candidate indices when narrowing, else None
+        self._pos = 0            # next candidate (or line) to examine
+        self._scanned = 0        # lines of the store covered by matches
+
+    @property
+    def active(self):
+        return bool(self.query) or self.level != NONE
+
+    def set(self, query, level):
+        """Start evaluating a new query; returns False when nothing changed."""
+        query = query.lower().encode("utf-8")
+        if query == self.query and level == self.level:
+            return False
+        narrowing = (self.matches is not None and self._source is None
+                     and self._scanned == len(self.store) and query.find(self.query) >= 0
+                     and (level == self.level or self.level == NONE))
+        self._source = self.matches if narrowing else None
+        self.query, self.level = query, level
+        self.matches = array("L") if self.active else None
+        self._pos = 0
+        self._scanned = 0 if self._source is None else len(self.store)
+        self._pattern = re.compile(re.escape(query), re.IGNORECASE) if query else None
+        return True
+
+    def pending(self):
+        return self.active and (self._source is not None or self._scanned < len(self.store))
+
+    def step(self):
+        """Examine up to STEP_LINES more lines; returns True while work remains."""
+        if not self.active:
+            self._scanned = len(self.store)
+            return False
+        if self._source is not None:
+            source = self._source
+            chunk = source[self._pos:self._pos + STEP_LINES]
+            self._pos += len(chunk)
+            self.matches.extend(self._check(chunk))
+            if self._pos >= len(source):
+                self._source = None
+            return self.pending()
+        start = self._scanned
+        stop = min(start + STEP_LINES, len(self.store))
+        if start < stop:
+            self.matches.extend(self._scan(start, stop))
+            self._scanned = stop
+        return self.pending()
+
+    def _check(self, indices):
+        """The given lines that match."""
+        store, level, pattern = self.store, self.level, self._pattern
+        data, offsets, levels = store.data, store.offsets, store.levels
+        out = []
+        for i in indices:
+            if level != NONE and levels[i] != level:
+                continue
+            if pattern is not None and not pattern.search(data, offsets[i], offsets[i + 1] - 1):
+                continue
+            out.append(i)
+        return out
+
+    def _scan(self, start, stop):
+        """Matching lines in [start, stop), found by searching the buffer itself."""
+        store, level = self.store, self.level
+        if self._pattern is None:
+            mask = store.levels[start:stop].translate(_LEVEL_MASKS[level])
+            return compress(range(start, stop), mask)
+        data, offsets, levels = store.data, store.offsets, store.levels
+        search = self._pattern.search
+        out = []
+        pos, end = offsets[start], offsets[stop]
+        while True:
+            m = search(data, pos, end)
+            if m is None:
+                return out
+            i = bisect_right(offsets, m.start(), start, stop) - 1
+            if level == NONE or levels[i] == level:
+                out.append(i)
+            pos = offsets[i + 1]
+            start = i + 1
+
+
+_LEVEL_MASKS = {level: bytes(1 if b == level else 0 for b in range(256))
+                for level in range(5)}
+
+
+if __name__ == "__main__":
+    words = ["ssh: session opened", "kernel: usb 1-1 reset", "app: WARNING disk low",
+             "app: error writing cache", "cron: INFO job done", "daemon: debug tick"]
+    lines = [f"Oct 17 12:00:{i % 60:02d} host {words[i % len(words)]} #{i}"
+             for i in range(1_000_000)]
+    store = LineStore()
+    start = time.perf_counter()
+    for k in range(0, len(lines), 10000):
+        store.append(lines[k:k + 10000])
+    print(f"ingest {len(store)} lines: {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(store.data) / 2**20:.0f} MiB text")
+    store.append(["app: error\nTraceback (most recent call last):\n  boom", "app: info done"])
+    assert len(store.levels) == len(store.offsets) - 1
+    assert store.line(len(store) - 1) == "app: info done" and store.level(len(store) - 4) == ERROR
+    flt = LineFilter(store)
+    for query, level in (("", ERROR), ("disk", NONE), ("disk l", NONE), ("disk lo", WARN),
+                         ("#99", NONE), ("#999", NONE)):
+        start = time.perf_counter()
+        flt.set(query, level)
+        steps = 1
+        while flt.step():
+            steps += 1
+        print(f"{query!r:10} level {level}: {len(flt.matches)} matches in "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms over {steps} steps")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Tail and follow engine for the Log Viewer.
+
+The last N lines of a file are found by reading backwards from EOF in large
+blocks, so opening a multi-gigabyte log costs about N lines of I/O. The file
+is then followed from that offset: inotify (through libc, no extra modules)
+wakes the follower when the file or its directory changes, with stat
+polling as the fallback where inotify is unavailable. Each wake-up reads
+only the bytes appended since the last one. Rotation (the path now names a
+different inode) and truncation (the file shrank below the read offset) are
+detected and followed.
+
+The journal is streamed from `journalctl -f -o json`. The cursor of the last
+entry seen is kept, so a restarted follower resumes right after it instead
+of replaying the tail.
+
+Callbacks run on the follower's thread and receive lists of complete lines.
+"""
+import ctypes
+import json
+import os
+import select
+import struct
+import subprocess
+import threading
+import time
+
+BLOCK = 64 * 1024
+POLL_INTERVAL = 0.5    # seconds between stat checks without inotify
+WAKE_INTERVAL = 2.0    # safety re-check while waiting on inotify
+
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _libc.inotify_init1
+except (OSError, AttributeError):
+    _libc = None
+
+
+def tail(f, n, block=BLOCK):
+    """Last n complete lines of the binary file f and the offset just past them.
+
+    A trailing line without its newline is left unread; following resumes at
+    its start so it is delivered once complete.
+    """
+    end = f.seek(0, os.SEEK_END)
+    pos = end
+    chunks = []
+    newlines = 0
+    while pos > 0 and newlines <= n:
+        step = min(block, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step)
+        chunks.append(chunk)
+        newlines += chunk.count(b"\n")
+    data = b"".join(reversed(chunks))
+    cut = data.rfind(b"\n") + 1
+    lines = data[:cut].decode("utf-8", "replace").split("\n")[:-1]
+    return lines[-n:] if n else [], pos + cut
+
+
+class _Inotify:
+    """Wake-ups for changes to one file, including it being replaced."""
+
+    def __init__(self, path):
+        self.fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC) if _libc else -1
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify unavailable")
+        self.name = os.path.basename(path).encode()
+        self.path = path
+        self.file_wd = -1
+        self.dir_wd = _libc.inotify_add_watch(
+            self.fd, os.path.dirname(os.path.abspath(path)).encode(), _IN_CREATE | _IN_MOVED_TO)
+        self.watch_file()
+
+    def watch_file(self):
+        self.file_wd = _libc.inotify_add_watch(
+            self.fd, self.path.encode(),
+            _IN_MODIFY | _IN_ATTRIB | _IN_MOVE_SELF | _IN_DELETE_SELF)
+
+    def wait(self, timeout):
+        """True when something relevant to the file happened."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                # the directory watch reports every file in it; keep ours
+                if wd != self.dir_wd or name == self.name:
+                    relevant = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileFollower(threading.Thread):
+    """Deliver the last n lines of path, then every line appended to it."""
+
+    def __init__(self, path, n, on_lines):
+        super().__init__(daemon=True)
+        self.path = path
+        self.n = n
+        self.on_lines = on_lines
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        try:
+            f = open(self.path, "rb")
+            lines, offset = tail(f, self.n)
+        except OSError as e:
+            self.on_lines([f"Error: {e}"])
+            return
+        self.on_lines(lines)
+        fd = f.fileno()
+        os.lseek(fd, offset, os.SEEK_SET)
+        ino = os.fstat(fd).st_ino
+        partial = b""
+        try:
+            notify = _Inotify(self.path)
+        except OSError:
+            notify = None
+        try:
+            while not self._stopping.is_set():
+                if notify is not None:
+                    notify.wait(WAKE_INTERVAL)
+                else:
+                    self._stopping.wait(POLL_INTERVAL)
+                if self._stopping.is_set():
+                    break
+                if os.fstat(fd).st_size < offset:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    offset, partial = 0, b""
+                    self.on_lines(["-- log truncated --"])
+                partial, lines, offset = self._read_new(fd, partial, offset)
+                if lines:
+                    self.on_lines(lines)
+                try:
+                    st = os.stat(self.path)
+                except OSError:
+                    continue        # rotated away; wait for the new file
+                if st.st_ino != ino:
+                    try:
+                        new = open(self.path, "rb")
+                    except OSError:
+                        continue
+                    # the old file may have got its last lines after our read
+                    partial, lines, _ = self._read_new(fd, partial, offset)
+                    f.close()
+                    f = new
+                    fd = f.fileno()
+                    ino, offset, partial = os.fstat(fd).st_ino, 0, b""
+                    self.on_lines(lines + ["-- log rotated --"])
+                    if notify is not None:
+                        notify.watch_file()
+                    partial, lines, offset = self._read_new(fd, partial, offset)
+                    if lines:
+                        self.on_lines(lines)
+        finally:
+            f.close()
+            if notify is not None:
+                notify.close()
+
+    @staticmethod
+    def _read_new(fd, partial, offset):
+        """Read from fd to EOF; returns (unfinished line, complete lines, new offset)."""
+        chunks = [partial]
+        while True:
+            data = os.read(fd, BLOCK)
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+        data = b"".join(chunks)
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            return data, [], offset
+        return data[cut:], data[:cut].decode("utf-8", "replace").split("\n")[:-1], offset
+
+
+def format_entry(entry):
+    """A journal JSON entry as a `journalctl -o short` line."""
+    msg = entry.get("MESSAGE", "")
+    if isinstance(msg, list):           # non-UTF-8 messages come as byte arrays
+        msg = bytes(msg).decode("utf-8", "replace")
+    try:
+        stamp = time.strftime("%b %d %H:%M:%S",
+                              time.localtime(int(entry["__REALTIME_TIMESTAMP"]) / 1e6))
+    except (KeyError, ValueError):
+        stamp = "-"
+    ident = entry.get("SYSLOG_IDENTIFIER") or entry.get("_COMM") or "?"
+    pid = entry.get("_PID")
+    host = entry.get("_HOSTNAME", "")
+    return f"{stamp} {host} {ident}[{pid}]: {msg}" if pid else f"{stamp} {host} {ident}: {msg}"
+
+
+class JournalFollower(threading.Thread):
+    """Stream journal entries; resumes after cursor when one is given."""
+
+    def __init__(self, n, on_lines, cursor=None):
+        super().__init__(daemon=True)
+        self.n = n
+        self.on_lines = on_lines
+        self.cursor = cursor
+        self._stopping = threading.Event()
+        self._proc = None
+
+    def stop(self):
+        self._stopping.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+    def run(self):
+        while not self._stopping.is_set():
+            cmd = ["journalctl", "-f", "-o", "json", "--no-pager"]
+            cmd += [f"--after-cursor={self.cursor}"] if self.cursor else ["-n", str(self.n)]
+            try:
+                self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                self.on_lines([f"journalctl error: {e}"])
+                return
+            if self._stopping.is_set():
+                self._proc.terminate()
+            self._pump(self._proc.stdout.fileno())
+            self._proc.wait()
+            # journalctl exits when the journal is vacuumed or rotated away; resume
+            self._stopping.wait(1.0)
+
+    def _pump(self, fd):
+        partial = b""
+        while True:
+            data = os.read(fd, BLOCK)
+            if not data:
+                return
+            data = partial + data
+            cut = data.rfind(b"\n") + 1
+            partial = data[cut:]
+            lines = []
+            for raw in data[:cut].splitlines():
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self.cursor = entry.get("__CURSOR", self.cursor)
+                lines.append(format_entry(entry))
+            if lines:
+                self.on_lines(lines)
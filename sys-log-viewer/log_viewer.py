@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib
-import os, subprocess, threading, re
+from gi.repository import Gtk, GLib, GObject, Gio
+import os, threading, time
+from log_tail import FileFollower, JournalFollower
+from line_store import LineStore, LineFilter, LEVEL_NAMES, ERROR, WARN, INFO, DEBUG
+
+LEVEL_COLORS = {ERROR: "#e06c75", WARN: "#e5c07b", INFO: "#98c379", DEBUG: "#61afef"}
+FILTER_BUDGET = 0.008   # seconds of filtering per main-loop iteration
 
 LOG_FILES = [
     ("/var/log/syslog", "Syslog"),
@@ -14,14 +19,63 @@ LOG_FILES = [
     ("/var/log/dpkg.log", "DPKG"),
 ]
 
+class LineItem(GObject.Object):
+    index = GObject.Property(type=GObject.TYPE_INT64, default=0)
+
+class LineModel(GObject.Object, Gio.ListModel):
+    """The lines passing the window's filter, as a list model the ListView reads on demand."""
+
+    def __init__(self, win):
+        super().__init__()
+        self.win = win
+        self.reported = 0
+
+    def count(self):
+        matches = self.win.filter.matches
+        return len(self.win.store) if matches is None else len(matches)
+
+    def line_index(self, position):
+        matches = self.win.filter.matches
+        return position if matches is None else matches[position]
+
+    def do_get_item_type(self):
+        return LineItem.__gtype__
+
+    def do_get_n_items(self):
+        return self.reported
+
+    def do_get_item(self, position):
+        if position >= self.reported:
+            return None
+        return LineItem(index=self.line_index(position))
+
+    def sync(self, reset=False):
+        """Announce rows added at the end since the last sync, or replace them all."""
+        old, new = self.reported, self.count()
+        self.reported = new
+        if reset:
+            self.items_changed(0, old, new)
+        elif new > old:
+            self.items_changed(old, 0, new - old)
+
 class LogViewerWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         super().__init__(application=app)
         self.set_title("Log Viewer")
         self.set_default_size(1000, 660)
         self.current_file = None
-        self.all_lines = []
+        self.source = ""
+        self.store = LineStore()
+        self.filter = LineFilter(self.store)
+        self.line_model = LineModel(self)
+        self.filter_source = None
+        self.follower = None
+        self.follow_gen = 0
+        self.posted = []            # lines from the follower waiting for the main loop
+        self.post_lock = threading.Lock()
+        self.journal_saved = None   # (store, cursor) while another source is shown
         self.build_ui()
+        self.connect("close-request", self.on_close_request)
         self.load_journalctl()
 
     def build_ui(self):
@@ -81,12 +135,13 @@ class LogViewerWindow(Gtk.ApplicationWindow):
         filter_box.append(Gtk.Label(label="Filter:"))
         self.filter_entry = Gtk.SearchEntry()
         self.filter_entry.set_hexpand(True)
+        self.filter_entry.set_search_delay(250)
         self.filter_entry.connect("search-changed", self.on_filter)
         filter_box.append(self.filter_entry)
         level_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=4)
         level_box.append(Gtk.Label(label="Level:"))
         self.level_combo = Gtk.ComboBoxText()
-        for lvl in ["All", "ERROR", "WARN", "INFO"]:
+        for lvl in LEVEL_NAMES:
             self.level_combo.append_text(lvl)
         self.level_combo.set_active(0)
         self.level_combo.connect("changed", self.on_filter)
@@ -98,15 +153,12 @@ class LogViewerWindow(Gtk.ApplicationWindow):
         right.append(self.status_label)
 
         scroll2 = Gtk.ScrolledWindow(); scroll2.set_vexpand(True)
-        self.log_view = Gtk.TextView()
-        self.log_view.set_editable(False)
-        self.log_view.set_monospace(True)
-        self.log_buf = self.log_view.get_buffer()
-        tt = self.log_buf.get_tag_table()
-        for name, color in [("error", "#e06c75"), ("warn", "#e5c07b"), ("info", "#98c379"), ("debug", "#61afef")]:
-            tag = Gtk.TextTag.new(name)
-            tag.set_property("foreground", color)
-            tt.add(tag)
+        self.log_scroll = scroll2
+        # only the rows on screen exist as widgets; they are rebound while scrolling
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_row_setup)
+        factory.connect("bind", self.on_row_bind)
+        self.log_view = Gtk.ListView(model=Gtk.NoSelection(model=self.line_model), factory=factory)
         scroll2.set_child(self.log_view)
         right.append(scroll2)
 
@@ -120,18 +172,50 @@ class LogViewerWindow(Gtk.ApplicationWindow):
 
         hpaned.set_end_child(right)
 
-    def load_journalctl(self):
-        threading.Thread(target=self._load_journal, daemon=True).start()
+    def on_close_request(self, win):
+        self.stop_follower()
+        return False
+
+    def stop_follower(self):
+        if self.follower is not None:
+            if isinstance(self.follower, JournalFollower):
+                self.journal_saved = (self.store, self.follower.cursor)
+            self.follower.stop()
+            self.follower = None
+
+    def start_follower(self, make, source, store=None):
+        """Show store, then append whatever the follower built by make(n, on_lines) delivers."""
+        self.stop_follower()
+        self.follow_gen += 1
+        gen = self.follow_gen
+        with self.post_lock:
+            self.posted = []
+        self.show_store(store or LineStore(), source)
+        self.follower = make(int(self.lines_spin.get_value()),
+                             lambda new: self.post_lines(gen, new))
+        self.follower.start()
 
-    def _load_journal(self):
-        try:
-            n = int(self.lines_spin.get_value())
-            result = subprocess.run(["journalctl", "-n", str(n), "--no-pager", "--output=short"],
-                                    capture_output=True, text=True, timeout=10)
-            lines = result.stdout.split('\n')
-            GLib.idle_add(self.show_lines, lines, "journalctl")
-        except Exception as e:
-            GLib.idle_add(self.show_lines, [f"journalctl error: {e}"], "journalctl")
+    def post_lines(self, gen, lines):
+        """Queue lines for the main loop; one idle callback drains everything queued."""
+        with self.post_lock:
+            queued = bool(self.posted)
+            self.posted.append((gen, lines))
+        if not queued:
+            GLib.idle_add(self.flush_lines)
+
+    def flush_lines(self):
+        with self.post_lock:
+            posted, self.posted = self.posted, []
+        lines = [line for gen, batch in posted if gen == self.follow_gen for line in batch]
+        if lines:
+            self.append_lines(lines)
+        return False
+
+    def load_journalctl(self, resume=True):
+        self.stop_follower()
+        store, cursor = self.journal_saved if resume and self.journal_saved else (None, None)
+        self.start_follower(lambda n, on_lines: JournalFollower(n, on_lines, cursor),
+                            "journalctl", store)
 
     def on_source_selected(self, listbox, row):
         if row:
@@ -149,61 +233,88 @@ class LogViewerWindow(Gtk.ApplicationWindow):
             self.load_file(path)
 
     def load_file(self, path):
-        threading.Thread(target=self._load_file, args=(path,), daemon=True).start()
-
-    def _load_file(self, path):
-        try:
-            n = int(self.lines_spin.get_value())
-            result = subprocess.run(["tail", "-n", str(n), path],
-                                    capture_output=True, text=True, timeout=10)
-            lines = result.stdout.split('\n')
-            GLib.idle_add(self.show_lines, lines, path)
-        except Exception as e:
-            GLib.idle_add(self.show_lines, [f"Error: {e}"], path)
-
-    def show_lines(self, lines, source):
-        self.all_lines = lines
-        q = self.filter_entry.get_text().lower()
-        level = self.level_combo.get_active_text()
-        self.render_lines(lines, q, level)
-        self.status_label.set_text(f"{source}  |  {len(lines)} lines")
-        return False
+        self.start_follower(lambda n, on_lines: FileFollower(path, n, on_lines), path)
 
-    def render_lines(self, lines, q, level):
-        self.log_buf.set_text("")
-        for line in lines:
-            if q and q not in line.lower():
-                continue
-            if level != "All":
-                if level.lower() not in line.lower():
-                    continue
-            end = self.log_buf.get_end_iter()
-            line_lower = line.lower()
-            if "error" in line_lower or "critical" in line_lower or "fatal" in line_lower:
-                self.log_buf.insert_with_tags_by_name(end, line + "\n", "error")
-            elif "warn" in line_lower:
-                self.log_buf.insert_with_tags_by_name(end, line + "\n", "warn")
-            elif "info" in line_lower:
-                self.log_buf.insert_with_tags_by_name(end, line + "\n", "info")
-            elif "debug" in line_lower:
-                self.log_buf.insert_with_tags_by_name(end, line + "\n", "debug")
-            else:
-                self.log_buf.insert(end, line + "\n")
+    def show_store(self, store, source):
+        self.store = store
+        self.source = source
+        self.filter = LineFilter(store)
+        self.filter.set(self.filter_entry.get_text(), LEVEL_NAMES[self.level_combo.get_active_text()])
+        self.line_model.sync(reset=True)
+        self.run_filter_soon()
+        self.update_status()
+
+    def append_lines(self, lines):
+        adj = self.log_scroll.get_vadjustment()
+        at_bottom = adj.get_value() >= adj.get_upper() - adj.get_page_size() - 1
+        self.store.append(lines)
+        if self.filter.pending():
+            self.run_filter_soon()
+        else:
+            self.line_model.sync()
+        self.update_status()
+        if at_bottom:
+            GLib.idle_add(self.scroll_to_bottom)
+
+    def update_status(self):
+        shown = self.line_model.reported
+        total = len(self.store)
+        text = f"{self.source}  |  {total} lines"
+        if self.filter.active:
+            text += f"  |  {shown} shown" + ("  (filtering…)" if self.filter.pending() else "")
+        if self.follower is not None:
+            text += "  |  following"
+        self.status_label.set_text(text)
+
+    def on_row_setup(self, factory, item):
+        label = Gtk.Label(xalign=0)
+        label.add_css_class("monospace")
+        item.set_child(label)
+
+    def on_row_bind(self, factory, item):
+        i = item.get_item().index
+        label = item.get_child()
+        line = self.store.line(i)
+        color = LEVEL_COLORS.get(self.store.level(i))
+        if color:
+            label.set_markup(f'<span foreground="{color}">{GLib.markup_escape_text(line)}</span>')
+        else:
+            label.set_text(line)
+
+    def run_filter_soon(self):
+        if self.filter_source is None and self.filter.pending():
+            self.filter_source = GLib.idle_add(self.run_filter)
+
+    def run_filter(self):
+        """Advance the filter for a bounded slice of time, showing matches as they come."""
+        deadline = time.perf_counter() + FILTER_BUDGET
+        while self.filter.step() and time.perf_counter() < deadline:
+            pass
+        self.line_model.sync()
+        self.update_status()
+        if self.filter.pending():
+            return True
+        self.filter_source = None
+        return False
 
     def on_filter(self, widget):
-        q = self.filter_entry.get_text().lower()
-        level = self.level_combo.get_active_text()
-        self.render_lines(self.all_lines, q, level)
+        if self.filter.set(self.filter_entry.get_text(),
+                           LEVEL_NAMES[self.level_combo.get_active_text()]):
+            self.line_model.sync(reset=True)
+            self.run_filter_soon()
+            self.update_status()
 
     def reload_current(self):
         if self.current_file == "journalctl":
-            self.load_journalctl()
+            self.load_journalctl(resume=False)
         elif self.current_file:
             self.load_file(self.current_file)
 
     def scroll_to_bottom(self):
-        end = self.log_buf.get_end_iter()
-        self.log_view.scroll_to_iter(end, 0, False, 0, 1)
+        n = self.line_model.reported
+        if n:
+            self.log_view.scroll_to(n - 1, Gtk.ListScrollFlags.NONE, None)
+        return False
 
 class LogViewerApp(Gtk.Application):
     def __init__(self):
@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import os, threading
+import os, sys, threading
+
+try:
+    import procsnap, keyed_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import procsnap, keyed_store
 
 def fmt_kb(n):
     try:
@@ -27,28 +33,26 @@ def get_meminfo():
         pass
     return info
 
-def get_process_memory():
-    procs = []
+def read_swap_kb(pid):
     try:
-        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmSwap:"):
+                    return int(line.split()[1])
     except Exception:
-        return []
-    for pid in pids:
-        try:
-            with open(f"/proc/{pid}/status") as f:
-                status = {}
-                for line in f:
-                    if ":\t" in line:
-                        k, v = line.split(":\t", 1)
-                        status[k] = v.strip()
-            name = status.get("Name", "?")
-            vm_rss = int(status.get("VmRSS", "0 kB").split()[0])
-            vm_virt = int(status.get("VmSize", "0 kB").split()[0])
-            vm_swap = int(status.get("VmSwap", "0 kB").split()[0])
-            procs.append({"pid": int(pid), "name": name, "rss": vm_rss, "virt": vm_virt, "swap": vm_swap})
-        except Exception:
-            continue
-    return sorted(procs, key=lambda p: p["rss"], reverse=True)[:50]
+        pass
+    return 0
+
+_snapshot = procsnap.ProcSnapshot()
+_snapshot_lock = threading.Lock()
+
+def get_process_memory():
+    with _snapshot_lock:
+        table = _snapshot.refresh()
+    # swap is only in status, so read it for the rows that are shown
+    return [{"pid": table.pid[i], "name": table.name[i], "rss": table.rss_kb[i],
+             "virt": table.vsize_kb[i], "swap": read_swap_kb(table.pid[i])}
+            for i in table.order_by("rss_kb")[:50]]
 
 class MemoryMapWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -104,13 +108,17 @@ class MemoryMapWindow(Gtk.ApplicationWindow):
         # Process list
         proc_frame = Gtk.Frame(label="Top Processes by RSS")
         scroll = Gtk.ScrolledWindow(); scroll.set_vexpand(True)
-        self.proc_store = Gtk.ListStore(int, str, str, str, str)
-        tree = Gtk.TreeView(model=self.proc_store)
+        # the sizes are shown formatted; columns 5-7 hold them in kB for sorting
+        self.proc_rows = keyed_store.KeyedStore((int, str, str, str, str, int, int, int),
+                                                key=0, name="memory")
+        self.proc_rows.model.set_sort_column_id(5, Gtk.SortType.DESCENDING)
+        tree = Gtk.TreeView(model=self.proc_rows.model)
         tree.get_selection().connect("changed", self.on_proc_selected)
-        for i, (title, width) in enumerate([("PID", 70), ("Name", 180), ("RSS", 100), ("Virtual", 100), ("Swap", 80)]):
+        for i, (title, width, sort_col) in enumerate([("PID", 70, 0), ("Name", 180, 1), ("RSS", 100, 5),
+                                                      ("Virtual", 100, 6), ("Swap", 80, 7)]):
             col = Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i)
             col.set_resizable(True); col.set_fixed_width(width)
-            col.set_sort_column_id(i)
+            col.set_sort_column_id(sort_col)
             tree.append_column(col)
         scroll.set_child(tree)
         proc_frame.set_child(scroll)
@@ -134,9 +142,8 @@ class MemoryMapWindow(Gtk.ApplicationWindow):
         for key, lbl in self.stat_labels.items():
             val = meminfo.get(key, "N/A")
             lbl.set_text(fmt_kb(val) if isinstance(val, int) else str(val))
-        self.proc_store.clear()
-        for p in procs:
-            self.proc_store.append([p["pid"], p["name"], fmt_kb(p["rss"]), fmt_kb(p["virt"]), fmt_kb(p["swap"])])
+        self.proc_rows.update([p["pid"], p["name"], fmt_kb(p["rss"]), fmt_kb(p["virt"]), fmt_kb(p["swap"]),
+                               p["rss"], p["virt"], p["swap"]] for p in procs)
         self.gauge.queue_draw()
         return False
 
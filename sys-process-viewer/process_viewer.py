@@ -2,50 +2,42 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import os, threading, time
-
-def read_proc_status(pid):
-    try:
-        with open(f"/proc/{pid}/status") as f:
-            return dict(line.split(':\t', 1) for line in f if ':\t' in line)
-    except Exception:
-        return {}
-
-def read_proc_stat(pid):
-    try:
-        with open(f"/proc/{pid}/stat") as f:
-            return f.read().split()
-    except Exception:
-        return []
+import os, sys, threading, time
+
+try:
+    import procsnap, keyed_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import procsnap, keyed_store
+
+HISTORY_LEN = 60
+
+_snapshot = procsnap.ProcSnapshot(io=True)
+_history = procsnap.ProcHistory(HISTORY_LEN)
+
+# ListStore columns
+COL_PID, COL_NAME, COL_STATE, COL_CPU, COL_RSS, COL_GROWTH, COL_READ, COL_WRITE, \
+    COL_PPID, COL_THREADS, COL_CMD = range(11)
+
+def fmt_rate(bps):
+    if bps < 0: return "—"
+    if bps >= 1048576: return f"{bps/1048576:.1f} MB/s"
+    if bps >= 1024: return f"{bps/1024:.1f} kB/s"
+    return f"{bps:.0f} B/s"
 
 def get_processes():
+    table = _history.update(_snapshot.refresh())
     procs = []
-    try:
-        pids = [p for p in os.listdir("/proc") if p.isdigit()]
-    except Exception:
-        return []
-    for pid in pids:
-        try:
-            status = read_proc_status(pid)
-            name = status.get("Name", "").strip()
-            state = status.get("State", "?").strip()
-            ppid = status.get("PPid", "0").strip()
-            vm_rss = status.get("VmRSS", "0 kB").strip().split()[0]
-            threads = status.get("Threads", "1").strip()
-            try:
-                with open(f"/proc/{pid}/cmdline") as f:
-                    cmdline = f.read().replace('\x00', ' ').strip()[:80]
-            except Exception:
-                cmdline = name
-            procs.append({
-                "pid": int(pid), "name": name, "state": state,
-                "ppid": int(ppid), "rss_kb": int(vm_rss) if vm_rss.isdigit() else 0,
-                "threads": int(threads) if threads.isdigit() else 1,
-                "cmdline": cmdline,
-            })
-        except Exception:
-            continue
-    return sorted(procs, key=lambda p: p["rss_kb"], reverse=True)
+    for i in table.order_by("cpu_pct"):
+        p = table.row(i)
+        p["cpu_pct"] = table.cpu_pct[i]
+        p["rss_growth"] = table.rss_growth[i]
+        # -1 marks an unreadable /proc/<pid>/io (another user's process)
+        io = table.read_bytes[i] >= 0
+        p["read_bps"] = table.read_bps[i] if io else -1
+        p["write_bps"] = table.write_bps[i] if io else -1
+        procs.append(p)
+    return procs
 
 class ProcessViewerWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -53,8 +45,8 @@ class ProcessViewerWindow(Gtk.ApplicationWindow):
         self.set_title("Process Viewer")
         self.set_default_size(1000, 640)
         self.all_procs = []
-        self.sort_col = "rss_kb"
-        self.sort_asc = False
+        self.selected = None   # (pid, starttime)
+        self.query = ""
         self.build_ui()
         self.refresh_procs()
         GLib.timeout_add(3000, self.refresh_procs)
@@ -87,22 +79,34 @@ class ProcessViewerWindow(Gtk.ApplicationWindow):
         scroll = Gtk.ScrolledWindow()
         scroll.set_vexpand(True)
 
-        self.store = Gtk.ListStore(int, str, str, int, int, str, str)
-        self.tree = Gtk.TreeView(model=self.store)
+        self.rows = keyed_store.KeyedStore(
+            (int, str, str, float, int, float, float, float, int, str, str),
+            key=COL_PID, visible=self.row_visible, name="processes")
+        # the hot process is what this tool is opened for
+        self.rows.model.set_sort_column_id(COL_CPU, Gtk.SortType.DESCENDING)
+        self.tree = Gtk.TreeView(model=self.rows.model)
         self.tree.set_headers_clickable(True)
 
         cols = [
-            ("PID", 0, True),
-            ("Name", 1, True),
-            ("State", 2, True),
-            ("PPID", 3, True),
-            ("RSS (kB)", 4, True),
-            ("Cmdline", 5, False),
-            ("Threads", 6, False),
+            ("PID", COL_PID, True, None),
+            ("Name", COL_NAME, True, None),
+            ("State", COL_STATE, True, None),
+            ("CPU %", COL_CPU, True, lambda v: f"{v:.1f}"),
+            ("RSS (kB)", COL_RSS, True, None),
+            ("RSS Δ", COL_GROWTH, True, lambda v: f"{v:+.0f} kB/s" if v else ""),
+            ("Read", COL_READ, True, fmt_rate),
+            ("Write", COL_WRITE, True, fmt_rate),
+            ("PPID", COL_PPID, True, None),
+            ("Threads", COL_THREADS, False, None),
+            ("Cmdline", COL_CMD, False, None),
         ]
-        for title, col_idx, clickable in cols:
+        for title, col_idx, clickable, fmt in cols:
             renderer = Gtk.CellRendererText()
-            col = Gtk.TreeViewColumn(title, renderer, text=col_idx)
+            if fmt is None:
+                col = Gtk.TreeViewColumn(title, renderer, text=col_idx)
+            else:
+                col = Gtk.TreeViewColumn(title, renderer)
+                col.set_cell_data_func(renderer, self.format_cell, (col_idx, fmt))
             col.set_resizable(True)
             col.set_sort_column_id(col_idx) if clickable else None
             self.tree.append_column(col)
@@ -113,54 +117,113 @@ class ProcessViewerWindow(Gtk.ApplicationWindow):
         vbox.append(scroll)
 
         info_frame = Gtk.Frame(label="Process Details")
+        info_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         self.info_label = Gtk.Label(label="Select a process to see details")
         self.info_label.set_xalign(0)
+        self.info_label.set_hexpand(True)
         self.info_label.set_margin_top(4); self.info_label.set_margin_start(6)
         self.info_label.set_margin_bottom(4); self.info_label.set_margin_end(6)
         self.info_label.set_wrap(True)
-        info_frame.set_child(self.info_label)
+        info_box.append(self.info_label)
+        self.spark = Gtk.DrawingArea()
+        self.spark.set_size_request(260, 70)
+        self.spark.set_draw_func(self.draw_sparklines)
+        info_box.append(self.spark)
+        info_frame.set_child(info_box)
         vbox.append(info_frame)
 
+    def format_cell(self, column, renderer, model, iter_, data):
+        col_idx, fmt = data
+        renderer.set_property("text", fmt(model[iter_][col_idx]))
+
     def refresh_procs(self):
         procs = get_processes()
         self.all_procs = procs
-        q = self.filter_entry.get_text().lower()
-        self.populate_store(procs, q)
+        self.populate_store(procs)
         total_mem = sum(p["rss_kb"] for p in procs)
-        self.count_label.set_text(f"{len(procs)} processes | Total RSS: {total_mem//1024} MB")
+        total_cpu = sum(p["cpu_pct"] for p in procs)
+        self.count_label.set_text(f"{len(procs)} processes | CPU: {total_cpu:.0f}% | "
+                                  f"Total RSS: {total_mem//1024} MB")
+        self.show_details()
         return True
 
-    def populate_store(self, procs, q=""):
-        self.store.clear()
-        for p in procs:
-            if q and q not in p["name"].lower() and q not in str(p["pid"]) and q not in p["cmdline"].lower():
-                continue
-            self.store.append([
-                p["pid"], p["name"], p["state"], p["ppid"],
-                p["rss_kb"], p["cmdline"][:80], str(p["threads"])
-            ])
+    def populate_store(self, procs):
+        self.rows.update([
+            p["pid"], p["name"], p["state"], p["cpu_pct"], p["rss_kb"],
+            p["rss_growth"], p["read_bps"], p["write_bps"], p["ppid"],
+            str(p["threads"]), p["cmdline"][:80]
+        ] for p in procs)
+
+    def row_visible(self, row):
+        q = self.query
+        return (not q or q in row[COL_NAME].lower() or q in str(row[COL_PID])
+                or q in row[COL_CMD].lower())
 
     def on_filter(self, entry):
-        q = entry.get_text().lower()
-        self.populate_store(self.all_procs, q)
+        self.query = entry.get_text().lower()
+        self.rows.refilter()
 
     def on_selection_changed(self, selection):
         model, iter_ = selection.get_selected()
         if iter_ is None:
             return
-        pid = model[iter_][0]
+        pid = model[iter_][COL_PID]
         proc = next((p for p in self.all_procs if p["pid"] == pid), None)
         if proc:
-            text = (f"PID: {proc['pid']}  |  Name: {proc['name']}  |  State: {proc['state']}\n"
-                    f"Parent PID: {proc['ppid']}  |  RSS: {proc['rss_kb']} kB  |  Threads: {proc['threads']}\n"
-                    f"Command: {proc['cmdline']}")
-            self.info_label.set_text(text)
-            try:
-                with open(f"/proc/{pid}/environ", 'rb') as f:
-                    env_count = f.read().count(b'\x00')
-                self.info_label.set_text(text + f"\nEnv vars: {env_count}")
-            except Exception:
-                pass
+            self.selected = (proc["pid"], proc["starttime"])
+            self.show_details()
+
+    def show_details(self):
+        if self.selected is None:
+            return
+        pid, start = self.selected
+        proc = next((p for p in self.all_procs
+                     if p["pid"] == pid and p["starttime"] == start), None)
+        if proc is None:
+            self.info_label.set_text(f"PID {pid} has exited")
+            self.selected = None
+            self.spark.queue_draw()
+            return
+        text = (f"PID: {proc['pid']}  |  Name: {proc['name']}  |  State: {proc['state']}\n"
+                f"Parent PID: {proc['ppid']}  |  RSS: {proc['rss_kb']} kB  |  Threads: {proc['threads']}\n"
+                f"CPU: {proc['cpu_pct']:.1f}%  |  Read: {fmt_rate(proc['read_bps'])}  |  "
+                f"Write: {fmt_rate(proc['write_bps'])}  |  RSS Δ: {proc['rss_growth']:+.0f} kB/s\n"
+                f"Command: {proc['cmdline']}")
+        self.info_label.set_text(text)
+        try:
+            with open(f"/proc/{pid}/environ", 'rb') as f:
+                env_count = f.read().count(b'\x00')
+            self.info_label.set_text(text + f"\nEnv vars: {env_count}")
+        except Exception:
+            pass
+        self.spark.queue_draw()
+
+    def draw_sparklines(self, area, cr, w, h):
+        cr.set_source_rgb(0.1, 0.1, 0.15); cr.rectangle(0, 0, w, h); cr.fill()
+        if self.selected is None:
+            return
+        pid, start = self.selected
+        cpu = _history.samples(pid, start, "cpu_pct")
+        io = [r + w_ for r, w_ in zip(_history.samples(pid, start, "read_bps"),
+                                      _history.samples(pid, start, "write_bps"))]
+        half = h / 2
+        step = w / max(HISTORY_LEN - 1, 1)
+        for values, top, peak, color, label in (
+                (cpu, 0, max(100.0, max(cpu, default=0)), (0.3, 0.8, 0.4), "CPU"),
+                (io, half, max(io, default=0) or 1.0, (0.3, 0.6, 0.9), "I/O")):
+            cr.set_source_rgb(0.6, 0.6, 0.7); cr.set_font_size(10)
+            cr.move_to(4, top + 12); cr.show_text(label)
+            if len(values) < 2:
+                continue
+            x0 = w - (len(values) - 1) * step
+            cr.set_source_rgb(*color); cr.set_line_width(1.5)
+            for k, v in enumerate(values):
+                y = top + half - 2 - v / peak * (half - 4)
+                if k == 0:
+                    cr.move_to(x0, y)
+                else:
+                    cr.line_to(x0 + k * step, y)
+            cr.stroke()
 
 class ProcessViewerApp(Gtk.Application):
     def __init__(self):
@@ -2,7 +2,13 @@
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
-import subprocess, threading
+import os, sys, subprocess, threading
+
+try:
+    import keyed_store
+except ImportError:  # running from a source checkout
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+    import keyed_store
 
 def run_cmd(cmd, timeout=5):
     try:
@@ -36,6 +42,7 @@ class ServiceMonitorWindow(Gtk.ApplicationWindow):
         self.set_title("Service Monitor")
         self.set_default_size(1000, 660)
         self.all_services = []
+        self.query = ""
         self.build_ui()
         self.refresh_services()
         GLib.timeout_add(10000, self.refresh_services)
@@ -64,7 +71,7 @@ class ServiceMonitorWindow(Gtk.ApplicationWindow):
         for s in ["All", "active", "inactive", "failed"]:
             state_combo.append_text(s)
         state_combo.set_active(0)
-        state_combo.connect("changed", lambda c: setattr(self, "state_filter", c.get_active_text()) or self.on_filter(None))
+        state_combo.connect("changed", lambda c: setattr(self, "state_filter", c.get_active_text()) or self.rows.refilter())
         filter_box.append(state_combo)
         self.state_filter = "All"
 
@@ -74,8 +81,10 @@ class ServiceMonitorWindow(Gtk.ApplicationWindow):
         vbox.append(filter_box)
 
         scroll = Gtk.ScrolledWindow(); scroll.set_vexpand(True)
-        self.store = Gtk.ListStore(str, str, str, str, str)
-        self.tree = Gtk.TreeView(model=self.store)
+        self.rows = keyed_store.KeyedStore((str, str, str, str, str), key=0,
+                                           visible=self.row_visible, name="services")
+        self.rows.model.set_sort_column_id(0, Gtk.SortType.ASCENDING)
+        self.tree = Gtk.TreeView(model=self.rows.model)
         self.tree.get_selection().connect("changed", self.on_selection_changed)
 
         for i, (title, width) in enumerate([("Name", 200), ("Load", 80), ("Active", 90), ("Sub", 90), ("Description", 300)]):
@@ -118,25 +127,24 @@ class ServiceMonitorWindow(Gtk.ApplicationWindow):
 
     def _show_services(self, svcs):
         self.all_services = svcs
-        q = self.filter_entry.get_text().lower()
-        self.populate_store(svcs, q, self.state_filter)
+        self.populate_store(svcs)
         active = sum(1 for s in svcs if s["active"] == "active")
         failed = sum(1 for s in svcs if s["active"] == "failed")
         self.count_label.set_text(f"{len(svcs)} services  |  {active} active  |  {failed} failed")
         return False
 
-    def populate_store(self, svcs, q="", state_filter="All"):
-        self.store.clear()
-        for s in svcs:
-            if q and q not in s["name"].lower() and q not in s["desc"].lower():
-                continue
-            if state_filter != "All" and s["active"] != state_filter:
-                continue
-            self.store.append([s["name"], s["load"], s["active"], s["sub"], s["desc"]])
+    def populate_store(self, svcs):
+        self.rows.update([s["name"], s["load"], s["active"], s["sub"], s["desc"]] for s in svcs)
+
+    def row_visible(self, row):
+        q = self.query
+        if q and q not in row[0].lower() and q not in row[4].lower():
+            return False
+        return self.state_filter == "All" or row[2] == self.state_filter
 
     def on_filter(self, widget):
-        q = self.filter_entry.get_text().lower()
-        self.populate_store(self.all_services, q, self.state_filter)
+        self.query = self.filter_entry.get_text().lower()
+        self.rows.refilter()
 
     def on_selection_changed(self, selection):
         model, iter_ = selection.get_selected()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""SQLite storage for Focus Quest.
+
+One connection is opened when the window starts and kept until it closes.
+The database runs in WAL mode with synchronous=NORMAL, so a commit appends
+to the log instead of rewriting and syncing a rollback journal. A crash of
+the app loses nothing; a power cut can lose the last commits, never
+consistency. Statements are fixed SQL strings, so sqlite3 compiles each
+once and reuses it from its statement cache.
+
+Checkbox toggles and XP changes are written behind: set_task_done() and
+set_xp() only record the new value, and repeated changes to one row
+collapse into one. flush() writes everything pending in one transaction.
+The window calls it shortly after the last change and on close. Every
+other read or write flushes first, so callers never see stale rows.
+
+History is read a page at a time with keyset queries (WHERE id < the
+last id shown), so opening it costs the same however long the archive
+is. The history_stats table keeps quest counts and XP per status. It is
+updated in the same transaction that archives a quest, so the summary
+never needs a scan of history.
+
+Run this file to time task toggles against the old connect-per-call
+helpers, and the first history page against reading the whole archive. Pass a directory on slow storage (an SD card, eMMC, a dm-delay
+device) to time them there; the default is a temporary directory.
+"""
+import datetime
+import sqlite3
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS active_quest (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        companion_type TEXT,
+        xp INTEGER,
+        start_date TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY,
+        quest_id INTEGER,
+        history_id INTEGER,
+        text TEXT,
+        is_done INTEGER
+    )''',
+    '''CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        companion_type TEXT,
+        final_xp INTEGER,
+        status TEXT,
+        end_date TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS history_stats (
+        status TEXT PRIMARY KEY,
+        quests INTEGER,
+        xp INTEGER
+    )''',
+)
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS tasks_quest ON tasks(quest_id)",
+    "CREATE INDEX IF NOT EXISTS tasks_history ON tasks(history_id)",
+)
+HISTORY_PAGE = 100
+
+
+class QuestStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.pending_tasks = {}     # task id -> is_done
+        self.pending_xp = {}        # quest id -> xp
+        with self.conn:
+            for sql in SCHEMA:
+                self.conn.execute(sql)
+            try:
+                self.conn.execute("ALTER TABLE tasks ADD COLUMN history_id INTEGER")
+            except sqlite3.OperationalError:
+                pass
+            for sql in INDEXES:
+                self.conn.execute(sql)
+            if self.conn.execute("SELECT 1 FROM history_stats LIMIT 1").fetchone() is None:
+                # first run with the stats table: count what was archived before it
+                self.conn.execute('''INSERT INTO history_stats (status, quests, xp)
+                                     SELECT status, COUNT(*), COALESCE(SUM(final_xp), 0) FROM history
+                                     GROUP BY status''')
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # --- Write-behind ---
+
+    def set_task_done(self, task_id, is_done):
+        self.pending_tasks[task_id] = 1 if is_done else 0
+
+    def set_xp(self, quest_id, xp):
+        self.pending_xp[quest_id] = xp
+
+    def dirty(self):
+        return bool(self.pending_tasks or self.pending_xp)
+
+    def flush(self):
+        """Write pending toggles and XP in one transaction."""
+        if not self.dirty():
+            return
+        tasks, self.pending_tasks = self.pending_tasks, {}
+        xp, self.pending_xp = self.pending_xp, {}
+        with self.conn:
+            self.conn.executemany("UPDATE tasks SET is_done=? WHERE id=?",
+                                  [(done, task_id) for task_id, done in tasks.items()])
+            self.conn.executemany("UPDATE active_quest SET xp=? WHERE id=?",
+                                  [(value, quest_id) for quest_id, value in xp.items()])
+
+    # --- Quests ---
+
+    def active_quests(self):
+        self.flush()
+        return [dict(r) for r in self.conn.execute("SELECT * FROM active_quest")]
+
+    def load_quest(self, quest_id):
+        self.flush()
+        row = self.conn.execute("SELECT * FROM active_quest WHERE id=?", (quest_id,)).fetchone()
+        if row is None:
+            return None
+        data = dict(row)
+        data['tasks'] = [dict(t) for t in
+                         self.conn.execute("SELECT * FROM tasks WHERE quest_id=?", (quest_id,))]
+        return data
+
+    def create_quest(self, name, companion):
+        self.flush()
+        with self.conn:
+            c = self.conn.execute(
+                "INSERT INTO active_quest (name, companion_type, xp, start_date) VALUES (?, ?, ?, ?)",
+                (name, companion, 0, datetime.datetime.now().isoformat()))
+        return c.lastrowid
+
+    def add_task(self, quest_id, text):
+        self.flush()
+        with self.conn:
+            c = self.conn.execute("INSERT INTO tasks (quest_id, text, is_done) VALUES (?, ?, 0)",
+                                  (quest_id, text))
+        return {"id": c.lastrowid, "quest_id": quest_id, "text": text, "is_done": 0}
+
+    def archive_quest(self, quest_id, status):
+        """Moves a quest and its tasks to history."""
+        quest = self.load_quest(quest_id)
+        if not quest:
+            return None
+        with self.conn:
+            c = self.conn.execute(
+                '''INSERT INTO history (name, companion_type, final_xp, status, end_date)
+                   VALUES (?, ?, ?, ?, ?)''',
+                (quest['name'], quest['companion_type'], quest['xp'], status,
+                 datetime.datetime.now().strftime("%Y-%m-%d %H:%M")))
+            history_id = c.lastrowid
+            self.conn.execute("UPDATE tasks SET history_id=?, quest_id=NULL WHERE quest_id=?",
+                              (history_id, quest_id))
+            self.conn.execute("DELETE FROM active_quest WHERE id=?", (quest_id,))
+            self.conn.execute('''INSERT INTO history_stats (status, quests, xp) VALUES (?, 1, ?)
+                                 ON CONFLICT(status) DO UPDATE
+                                 SET quests = quests + 1, xp = xp + excluded.xp''',
+                              (status, quest['xp']))
+        return history_id
+
+    # --- History ---
+
+    def history_page(self, before_id=None, limit=HISTORY_PAGE):
+        """Up to limit archived quests, newest first, older than before_id if given."""
+        self.flush()
+        if before_id is None:
+            rows = self.conn.execute("SELECT * FROM history ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            rows = self.conn.execute("SELECT * FROM history WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                     (before_id, limit))
+        return [dict(r) for r in rows]
+
+    def history_stats(self):
+        """{status: (quests, total final XP)}, kept up to date by archive_quest."""
+        return {r['status']: (r['quests'], r['xp'])
+                for r in self.conn.execute("SELECT * FROM history_stats")}
+
+    def history_details(self, history_id):
+        self.flush()
+        row = self.conn.execute("SELECT * FROM history WHERE id=?", (history_id,)).fetchone()
+        if row is None:
+            return None
+        data = dict(row)
+        data['tasks'] = [dict(t) for t in
+                         self.conn.execute("SELECT text, is_done FROM tasks WHERE history_id=? ORDER BY id",
+                                           (history_id,))]
+        return data
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    import time
+
+    def old_toggle(path, task_id, quest_id, is_done, xp):
+        """update_task_db + update_xp_db as they were: a connection and a commit each."""
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE tasks SET is_done=? WHERE id=?", (1 if is_done else 0, task_id))
+        conn.commit()
+        conn.close()
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE active_quest SET xp=? WHERE id=?", (xp, quest_id))
+        conn.commit()
+        conn.close()
+
+    parent = sys.argv[1] if len(sys.argv) > 1 else "/var/tmp"
+    toggles = 200
+    burst = 10          # toggles the user makes before pausing long enough for a flush
+    with tempfile.TemporaryDirectory(dir=parent) as tmp:
+        old_path = os.path.join(tmp, "old.sqlite")
+        new_path = os.path.join(tmp, "new.sqlite")
+        for path in (old_path, new_path):
+            store = QuestStore(path)
+            quest_id = store.create_quest("Benchmark", "dragon")
+            task_ids = [store.add_task(quest_id, f"task {i}")["id"] for i in range(50)]
+            store.close()
+        # the old helpers ran on a rollback-journal database
+        conn = sqlite3.connect(old_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+        start = time.perf_counter()
+        for i in range(toggles):
+            old_toggle(old_path, task_ids[i % 50], quest_id, i % 2 == 0, i * 25)
+        old = (time.perf_counter() - start) / toggles
+
+        store = QuestStore(new_path)
+        toggle_time = flush_time = 0.0
+        for i in range(toggles):
+            start = time.perf_counter()
+            store.set_task_done(task_ids[i % 50], i % 2 == 0)
+            store.set_xp(quest_id, i * 25)
+            toggle_time += time.perf_counter() - start
+            if (i + 1) % burst == 0:
+                start = time.perf_counter()
+                store.flush()
+                flush_time += time.perf_counter() - start
+        store.close()
+        store = QuestStore(new_path)
+        assert store.load_quest(quest_id)["xp"] == (toggles - 1) * 25
+        archived = 20000
+        with store.conn:
+            store.conn.executemany(
+                "INSERT INTO history (name, companion_type, final_xp, status, end_date) VALUES (?, ?, ?, ?, ?)",
+                ((f"quest {i}", "tree", i % 500, "completed", "2024-01-01 12:00") for i in range(archived)))
+        start = time.perf_counter()
+        store.conn.execute("SELECT * FROM history ORDER BY id DESC").fetchall()
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        page = store.history_page()
+        store.history_page(page[-1]["id"])
+        paged = (time.perf_counter() - start) / 2
+        start = time.perf_counter()
+        store.history_stats()
+        stats = time.perf_counter() - start
+        store.close()
+    print(f"{toggles} toggles in {parent}: old helpers {old * 1000:.2f} ms each; "
+          f"store {toggle_time / toggles * 1e6:.1f} us on the UI thread plus "
+          f"{flush_time / (toggles // burst) * 1000:.2f} ms per flush of {burst} "
+          f"({(toggle_time + flush_time) / toggles * 1000:.3f} ms per toggle overall)")
+    print(f"history of {archived}: whole archive {full * 1000:.1f} ms, "
+          f"one page of {HISTORY_PAGE} {paged * 1000:.2f} ms, stats {stats * 1e6:.0f} us")
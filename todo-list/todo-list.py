@@ -1,12 +1,59 @@
 #!/usr/bin/env python3
 import sys
-import sqlite3
 import os
 import gi
-import datetime
 
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib, Gdk, Pango
+from gi.repository import Gtk, GLib, Gdk, Gio, GObject, Pango
+from quest_store import QuestStore, HISTORY_PAGE
+
+FLUSH_DELAY_MS = 500
+
+class HistoryItem(GObject.Object):
+    def __init__(self, row):
+        super().__init__()
+        self.row = row
+
+class HistoryModel(GObject.Object, Gio.ListModel):
+    """Archived quests, newest first, fetched from the store a page at a time."""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.rows = []
+        self.complete = False
+
+    def do_get_item_type(self):
+        return HistoryItem.__gtype__
+
+    def do_get_n_items(self):
+        return len(self.rows)
+
+    def do_get_item(self, position):
+        if position >= len(self.rows):
+            return None
+        return HistoryItem(self.rows[position])
+
+    def reload(self):
+        old = len(self.rows)
+        self.rows = []
+        self.complete = False
+        self.rows = self.fetch()
+        self.items_changed(0, old, len(self.rows))
+
+    def load_more(self):
+        if self.complete:
+            return
+        old = len(self.rows)
+        page = self.fetch()
+        self.rows.extend(page)
+        self.items_changed(old, 0, len(page))
+
+    def fetch(self):
+        page = self.store.history_page(self.rows[-1]['id'] if self.rows else None)
+        if len(page) < HISTORY_PAGE:
+            self.complete = True
+        return page
 
 class GamifiedTodoWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
@@ -19,7 +66,9 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
         self.db_path = os.path.join(self.data_dir, "quest_db.sqlite")
-        self.init_db()
+        self.store = QuestStore(self.db_path)
+        self.flush_source = None
+        self.connect("close-request", self.on_close_request)
         
         # --- State ---
         self.selected_quest = None # Currently viewed quest in Dashboard
@@ -72,154 +121,22 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
     #               DATABASE LOGIC
     # ==========================================
 
-    def init_db(self):
-        """Initialize SQLite tables."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS active_quest (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            companion_type TEXT,
-            xp INTEGER,
-            start_date TEXT
-        )''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY,
-            quest_id INTEGER,
-            history_id INTEGER,
-            text TEXT,
-            is_done INTEGER
-        )''')
-        
-        try:
-            c.execute("ALTER TABLE tasks ADD COLUMN history_id INTEGER")
-        except sqlite3.OperationalError:
-            pass 
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            companion_type TEXT,
-            final_xp INTEGER,
-            status TEXT,
-            end_date TEXT
-        )''')
-        
-        conn.commit()
-        conn.close()
-
-    def get_all_active_quests(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM active_quest")
-        rows = [dict(r) for r in c.fetchall()]
-        conn.close()
-        return rows
-
-    def load_quest_data(self, quest_id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM active_quest WHERE id=?", (quest_id,))
-        row = c.fetchone()
-        
-        data = None
-        if row:
-            data = dict(row)
-            c.execute("SELECT * FROM tasks WHERE quest_id=?", (quest_id,))
-            data['tasks'] = [dict(t) for t in c.fetchall()]
-            
-        conn.close()
-        return data
-
-    def create_new_quest_in_db(self, name, companion):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # MULTI-TASK UPDATE: Do NOT delete old quests here.
-        
-        c.execute("INSERT INTO active_quest (name, companion_type, xp, start_date) VALUES (?, ?, ?, ?)",
-                  (name, companion, 0, datetime.datetime.now().isoformat()))
-        quest_id = c.lastrowid
-        
-        conn.commit()
-        conn.close()
-        return quest_id
-
-    def add_task_db(self, quest_id, text):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("INSERT INTO tasks (quest_id, text, is_done) VALUES (?, ?, 0)", 
-                  (quest_id, text))
-        task_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        return {"id": task_id, "quest_id": quest_id, "text": text, "is_done": 0}
-
-    def update_task_db(self, task_id, is_done):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("UPDATE tasks SET is_done=? WHERE id=?", (1 if is_done else 0, task_id))
-        conn.commit()
-        conn.close()
-
-    def update_xp_db(self, quest_id, new_xp):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("UPDATE active_quest SET xp=? WHERE id=?", (new_xp, quest_id))
-        conn.commit()
-        conn.close()
-
-    def archive_quest(self, quest_id, status):
-        """Moves a specific quest to history."""
-        quest_data = self.load_quest_data(quest_id)
-        if not quest_data: return
-
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # 1. Create History Record
-        c.execute('''INSERT INTO history (name, companion_type, final_xp, status, end_date) 
-                     VALUES (?, ?, ?, ?, ?)''',
-                  (quest_data['name'], 
-                   quest_data['companion_type'], 
-                   quest_data['xp'], 
-                   status, 
-                   datetime.datetime.now().strftime("%Y-%m-%d %H:%M")))
-        history_id = c.lastrowid
-        
-        # 2. Update Tasks
-        c.execute("UPDATE tasks SET history_id=?, quest_id=NULL WHERE quest_id=?", 
-                  (history_id, quest_id))
-        
-        # 3. Delete from active
-        c.execute("DELETE FROM active_quest WHERE id=?", (quest_id,))
-        
-        conn.commit()
-        conn.close()
-
-    def get_history_details(self, history_id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM history WHERE id=?", (history_id,))
-        quest_row = c.fetchone()
-        
-        c.execute("SELECT * FROM tasks WHERE history_id=?", (history_id,))
-        tasks = [dict(t) for t in c.fetchall()]
-        
-        conn.close()
-        
-        if quest_row:
-            data = dict(quest_row)
-            data['tasks'] = tasks
-            return data
-        return None
+    def schedule_flush(self):
+        """Write pending toggles once the user pauses."""
+        if self.flush_source is None:
+            self.flush_source = GLib.timeout_add(FLUSH_DELAY_MS, self.on_flush_timeout)
+
+    def on_flush_timeout(self):
+        self.flush_source = None
+        self.store.flush()
+        return False
+
+    def on_close_request(self, win):
+        if self.flush_source is not None:
+            GLib.source_remove(self.flush_source)
+            self.flush_source = None
+        self.store.close()
+        return False
 
     # ==========================================
     #               UI CREATION
@@ -448,15 +365,27 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
         lbl_hint.add_css_class("history-hint")
         box.append(lbl_hint)
 
+        self.history_summary = Gtk.Label()
+        self.history_summary.add_css_class("status-label")
+        box.append(self.history_summary)
+
         scrolled = Gtk.ScrolledWindow()
         scrolled.set_vexpand(True)
+        scrolled.get_vadjustment().connect("value-changed", self.on_history_scrolled)
         box.append(scrolled)
 
-        self.history_list_box = Gtk.ListBox()
-        self.history_list_box.add_css_class("history-list")
-        self.history_list_box.set_selection_mode(Gtk.SelectionMode.SINGLE)
-        self.history_list_box.connect("row-activated", self.on_history_item_clicked)
-        scrolled.set_child(self.history_list_box)
+        # Rows are built only for the quests on screen; more are fetched
+        # from the store as the list nears its end.
+        self.history_model = HistoryModel(self.store)
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_history_row_setup)
+        factory.connect("bind", self.on_history_row_bind)
+        self.history_list_view = Gtk.ListView(model=Gtk.SingleSelection(model=self.history_model),
+                                              factory=factory)
+        self.history_list_view.add_css_class("history-list")
+        self.history_list_view.set_single_click_activate(True)
+        self.history_list_view.connect("activate", self.on_history_item_clicked)
+        scrolled.set_child(self.history_list_view)
         
         return box
 
@@ -515,7 +444,7 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
             if row is None: break
             self.active_quests_listbox.remove(row)
         
-        quests = self.get_all_active_quests()
+        quests = self.store.active_quests()
         if not quests:
             # Show placeholder?
             pass
@@ -560,7 +489,7 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
     def on_active_quest_clicked(self, listbox, row):
         quest_id = row.quest_id
         # Load this quest into dashboard
-        self.selected_quest = self.load_quest_data(quest_id)
+        self.selected_quest = self.store.load_quest(quest_id)
         self.refresh_dashboard()
         self.stack.set_visible_child_name("dashboard")
 
@@ -568,9 +497,9 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
         goal = self.quest_entry.get_text().strip()
         if not goal: return
         
-        new_id = self.create_new_quest_in_db(goal, type_name)
+        new_id = self.store.create_quest(goal, type_name)
         # Load the new quest directly
-        self.selected_quest = self.load_quest_data(new_id)
+        self.selected_quest = self.store.load_quest(new_id)
         self.refresh_dashboard()
         self.stack.set_visible_child_name("dashboard")
         
@@ -597,7 +526,7 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
     def on_add_task(self, widget):
         text = self.entry.get_text().strip()
         if text and self.selected_quest:
-            new_task = self.add_task_db(self.selected_quest['id'], text)
+            new_task = self.store.add_task(self.selected_quest['id'], text)
             # Add to local state
             self.selected_quest['tasks'].append(new_task)
             
@@ -609,7 +538,7 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
     def on_task_toggled(self, check, row):
         is_done = check.get_active()
         task_id = row.task_data['id']
-        self.update_task_db(task_id, is_done)
+        self.store.set_task_done(task_id, is_done)
         
         # Update local state
         for t in self.selected_quest['tasks']:
@@ -622,7 +551,8 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
         else:
             new_xp = max(0, current_xp - 25)
             
-        self.update_xp_db(self.selected_quest['id'], new_xp)
+        self.store.set_xp(self.selected_quest['id'], new_xp)
+        self.schedule_flush()
         self.selected_quest['xp'] = new_xp
         self.refresh_companion()
         
@@ -632,62 +562,63 @@ class GamifiedTodoWindow(Gtk.ApplicationWindow):
 
     def on_complete_quest(self, btn):
         if self.selected_quest:
-            self.archive_quest(self.selected_quest['id'], "completed")
+            self.store.archive_quest(self.selected_quest['id'], "completed")
             self.selected_quest = None
             self.refresh_quest_list()
             self.stack.set_visible_child_name("quest_list")
 
     def on_give_up_quest(self, btn):
         if self.selected_quest:
-            self.archive_quest(self.selected_quest['id'], "abandoned")
+            self.store.archive_quest(self.selected_quest['id'], "abandoned")
             self.selected_quest = None
             self.refresh_quest_list()
             self.stack.set_visible_child_name("quest_list")
 
     # --- History Logic ---
     def load_history(self):
-        while True:
-            row = self.history_list_box.get_row_at_index(0)
-            if row is None: break
-            self.history_list_box.remove(row)
-            
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM history ORDER BY id DESC")
-        rows = c.fetchall()
-        conn.close()
-        
-        for item in rows:
-            row = Gtk.ListBoxRow()
-            row.history_id = item['id']
-            
-            box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
-            box.add_css_class("history-row")
-            
-            status_icon = "🏆" if item['status'] == 'completed' else "💀"
-            icon_lbl = Gtk.Label(label=status_icon)
-            box.append(icon_lbl)
-            
-            vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-            name_lbl = Gtk.Label(label=item['name'])
-            name_lbl.set_halign(Gtk.Align.START)
-            name_lbl.add_css_class("history-name")
-            
-            date_lbl = Gtk.Label(label=f"{item['end_date']} | XP: {item['final_xp']}")
-            date_lbl.set_halign(Gtk.Align.START)
-            date_lbl.add_css_class("history-date")
-            
-            vbox.append(name_lbl)
-            vbox.append(date_lbl)
-            box.append(vbox)
-            
-            row.set_child(box)
-            self.history_list_box.append(row)
-
-    def on_history_item_clicked(self, listbox, row):
-        history_id = row.history_id
-        details = self.get_history_details(history_id)
+        stats = self.store.history_stats()
+        completed, completed_xp = stats.get("completed", (0, 0))
+        abandoned, abandoned_xp = stats.get("abandoned", (0, 0))
+        self.history_summary.set_label(f"🏆 {completed} completed | 💀 {abandoned} abandoned | "
+                                       f"Total XP: {completed_xp + abandoned_xp}")
+        self.history_model.reload()
+
+    def on_history_scrolled(self, adj):
+        if adj.get_value() + 2 * adj.get_page_size() >= adj.get_upper():
+            self.history_model.load_more()
+
+    def on_history_row_setup(self, factory, list_item):
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        box.add_css_class("history-row")
+        box.append(Gtk.Label())
+
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        name_lbl = Gtk.Label()
+        name_lbl.set_halign(Gtk.Align.START)
+        name_lbl.add_css_class("history-name")
+
+        date_lbl = Gtk.Label()
+        date_lbl.set_halign(Gtk.Align.START)
+        date_lbl.add_css_class("history-date")
+
+        vbox.append(name_lbl)
+        vbox.append(date_lbl)
+        box.append(vbox)
+        list_item.set_child(box)
+
+    def on_history_row_bind(self, factory, list_item):
+        item = list_item.get_item().row
+        box = list_item.get_child()
+        icon_lbl = box.get_first_child()
+        name_lbl = icon_lbl.get_next_sibling().get_first_child()
+        date_lbl = name_lbl.get_next_sibling()
+        icon_lbl.set_label("🏆" if item['status'] == 'completed' else "💀")
+        name_lbl.set_label(item['name'])
+        date_lbl.set_label(f"{item['end_date']} | XP: {item['final_xp']}")
+
+    def on_history_item_clicked(self, list_view, position):
+        history_id = self.history_model.rows[position]['id']
+        details = self.store.history_details(history_id)
         
         if details:
             self.details_title.set_label(f"Quest: {details['name']}")